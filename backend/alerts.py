@@ -1,60 +1,237 @@
 # alerts.py
+# Budget alerts fire once per (user, category, month, kind): whoever first
+# claims the alert_state row queues the email, later crossings are silent.
+# evaluate_budget() is the incremental path used right after writes;
+# sweep_month() checks every budget of a month with one grouped query per
+# shard (cron), and warns about budgets the forecast says will be exceeded.
+import argparse
 import os
-import smtplib
-from email.message import EmailMessage
-from backend.models import Budget, Expense, User
-from backend.db import db
-from sqlalchemy import func
-
-def send_email(to_email, subject, body):
-    host = os.getenv("SMTP_HOST")
-    user = os.getenv("SMTP_USER")
-    password = os.getenv("SMTP_PASS")
-    port = int(os.getenv("SMTP_PORT", 587))
-    from_email = os.getenv("FROM_EMAIL")
-
-    if not host or not user or not password or not from_email:
-        print("SMTP not configured!")
-        return
+import time
+from datetime import date
+
+import numpy as np
+from sqlalchemy import and_, func
+
+from backend.models import AlertState, Budget, SpendRollup, User
+from backend.db import db, upsert, write_transaction, shard_indexes, on_shard
+from backend import forecast, rollup
+from backend.mailer import enqueue_email
+from backend.user_resolver import IN_CHUNK_SIZE
+
+LOW_BUDGET = "low_budget"
+OVER_BUDGET = "over_budget"
+FORECAST_OVER = "forecast_over"  # still under the low-budget line, but on pace to exceed
+REJECTED_EXPENSE = "rejected_expense"  # an add_expense refused for the budget; not a real overspend
+SWEEP_BATCH_SIZE = 500
+
+def send_email(to_email, subject, body, html=None):
+    """Queue an alert in the email outbox; committed with the caller's transaction"""
+    enqueue_email([to_email], subject, html=html, body=body)
+
+def low_budget_percent(percent):
+    """Per-budget low_budget_percent, else DEFAULT_LOW_BUDGET_PERCENT"""
+    return percent or int(os.getenv("DEFAULT_LOW_BUDGET_PERCENT", 10))
+
+def classify(amount, percent, total):
+    """over_budget, low_budget or ok for spend against a budget amount"""
+    if total > amount:
+        return OVER_BUDGET
+    if total >= amount * (1 - low_budget_percent(percent)/100):
+        return LOW_BUDGET
+    return "ok"
+
+def classify_forecast(amount, percent, total, projected):
+    """classify(), plus forecast_over when only the projection crosses the budget"""
+    status = classify(amount, percent, total)
+    if status == "ok" and projected > amount:
+        return FORECAST_OVER
+    return status
+
+def low_budget_lines(amounts, percents):
+    """Vectorized low-budget thresholds; None percents take the default"""
+    percents = np.array([np.nan if p is None else p for p in percents], dtype=float)
+    percents = np.where(np.isnan(percents), low_budget_percent(None), percents)
+    return np.asarray(amounts, dtype=float) * (1 - percents/100)
+
+def claim_alert(user_id, category, month, kind, total):
+    """Record an alert as fired. False if it already was. Caller's transaction."""
+    stmt = upsert(AlertState).values(
+        user_id=user_id, category=category, month=month, kind=kind, spent=total, fired_at=time.time()
+    ).on_conflict_do_nothing(index_elements=["month", "user_id", "category", "kind"])
+    return db.session.execute(stmt).rowcount == 1
+
+def alert_message(kind, name, category, month, amount, total):
+    """(subject, plain body, html) for an alert"""
+    if kind == OVER_BUDGET:
+        subject = f"[Expense Tracker] Budget Exceeded ({category})"
+        body = f"Hello {name},\nYou exceeded your {category} budget for {month}!\nBudget: {amount}\nSpent: {total}"
+        html = f"""
+        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
+        <h2 style='color:#E74C3C;'>Budget Limit Exceeded</h2>
+        <p>Hi {name},</p>
+        <p>You have spent <strong>{total}</strong> of your <strong>{amount}</strong> <strong>{category}</strong> budget for <strong>{month}</strong>.</p>
+        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
+        </div>
+        """
+    elif kind == FORECAST_OVER:
+        subject = f"[Expense Tracker] On Pace To Exceed ({category})"
+        body = (f"Hello {name},\nAt your current pace you will spend about {total} "
+                f"of your {amount} {category} budget for {month}.")
+        html = f"""
+        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
+        <h2 style='color:#F39C12;'>Budget Forecast</h2>
+        <p>Hi {name},</p>
+        <p>At your current pace you will spend about <strong>{total}</strong> of your <strong>{amount}</strong> <strong>{category}</strong> budget for <strong>{month}</strong>.</p>
+        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
+        </div>
+        """
+    else:
+        used_percent = total / amount * 100 if amount else 100.0
+        subject = f"[Expense Tracker] Low Budget Alert ({category})"
+        body = f"Hello {name},\nYou are close to your {category} budget for {month}.\nSpent: {total}\nBudget: {amount}"
+        html = f"""
+        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
+        <h2 style='color:#F39C12;'>Budget Usage Warning</h2>
+        <p>Hi {name},</p>
+        <p>You've used <strong>{used_percent:.2f}%</strong> of your <strong>{category}</strong> budget for <strong>{month}</strong>.</p>
+        <p>Total spent: <strong>{total}</strong> / Budget: <strong>{amount}</strong>.</p>
+        <p>Be mindful of remaining funds.</p>
+        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
+        </div>
+        """
+    return subject, body, html
+
+def fire(user, category, month, amount, kind, total):
+    """Queue the alert unless it has fired before. Returns True if queued."""
+    if not claim_alert(user.id, category, month, kind, total):
+        return False
+    subject, body, html = alert_message(kind, user.name or user.email, category, month, amount, total)
+    send_email(user.email, subject, body, html)
+    return True
 
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg.set_content(body)
-
-    try:
-        with smtplib.SMTP(host, port) as smtp:
-            smtp.starttls()
-            smtp.login(user, password)
-            smtp.send_message(msg)
-        print(f"✅ Email sent to: {to_email}")
-    except Exception as e:
-        print(f"Error sending email: {e}")
-
-def check_budget(user_id, category, month):
-    total = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id==user_id,
-        Expense.category==category,
-        Expense.date.like(f"{month}%")
-    ).scalar() or 0.0
+def evaluate_budget(user, budget, total, notify=True):
+    """Classify spend against a loaded budget, queueing the alert once"""
+    status = classify(budget.amount, budget.low_budget_percent, total)
+    if notify and status != "ok":
+        fire(user, budget.category, budget.month, budget.amount, status, total)
+    return {"status":status, "spent":total, "budget":budget.amount}
+
+def check_budget(user_id, category, month, as_of=None):
+    total = rollup.spent(user_id, category, month)
 
     budget = Budget.query.filter_by(user_id=user_id, category=category, month=month).first()
     if not budget:
         return {"status":"no_budget", "spent":total}
 
-    if total > budget.amount:
-        user = User.query.get(user_id)
-        send_email(user.email, f"[Expense Tracker] Budget Exceeded ({category})",
-                   f"Hello {user.name},\nYou exceeded your {category} budget for {month}!\nBudget: {budget.amount}\nSpent: {total}")
-        return {"status":"over_budget", "spent":total, "budget":budget.amount}
-
-    percent = budget.low_budget_percent or int(os.getenv("DEFAULT_LOW_BUDGET_PERCENT", 10))
-    threshold = budget.amount * (1 - percent/100)
-    if total >= threshold:
-        user = User.query.get(user_id)
-        send_email(user.email, f"[Expense Tracker] Low Budget Alert ({category})",
-                   f"Hello {user.name},\nYou are close to your {category} budget for {month}.\nSpent: {total}\nBudget: {budget.amount}")
-        return {"status":"low_budget", "spent":total, "budget":budget.amount}
-
-    return {"status":"ok", "spent":total, "budget":budget.amount}
\ No newline at end of file
+    user = db.session.get(User, user_id)
+    result = evaluate_budget(user, budget, total)
+    projected = forecast.forecast_budgets(month, [user_id], [category], as_of, user_id=user_id)["forecast"][0]
+    result["forecast"] = round(float(projected), 2)
+    result["status"] = classify_forecast(budget.amount, budget.low_budget_percent, total, projected)
+    if result["status"] == FORECAST_OVER:
+        fire(user, category, month, budget.amount, FORECAST_OVER, result["forecast"])
+    return result
+
+def check_budgets(user, keys, notify=True):
+    """check_budget for many (category, month) pairs using two queries"""
+    months = {month for _, month in keys}
+    budgets = {
+        (b.category, b.month): b
+        for b in Budget.query.filter(Budget.user_id==user.id, Budget.month.in_(months))
+    }
+    totals = {
+        (r.category, r.month): r.total
+        for r in SpendRollup.query.filter(SpendRollup.user_id==user.id, SpendRollup.month.in_(months))
+    }
+
+    results = {}
+    for key in keys:
+        total = totals.get(key, 0.0)
+        budget = budgets.get(key)
+        if budget:
+            results[key] = evaluate_budget(user, budget, total, notify)
+        else:
+            results[key] = {"status":"no_budget", "spent":total}
+    return results
+
+def sweep_month(month, notify=True, batch_size=SWEEP_BATCH_SIZE, as_of=None):
+    """Evaluate every budget of a month and queue the alerts not sent yet.
+    Budgets still under their low-budget line are scored with the month-end
+    forecast as of as_of (default today) in one vectorized pass."""
+    summary = {"month":month, "budgets":0, LOW_BUDGET:0, OVER_BUDGET:0, FORECAST_OVER:0, "queued":0}
+    for shard in shard_indexes():
+        with on_shard(shard):
+            _sweep_shard(month, notify, batch_size, summary, as_of)
+    return summary
+
+def _statuses(rows, month, as_of):
+    """Status of every row: over/low from spend, forecast_over from the projection"""
+    if not rows:
+        return []
+    amounts = np.array([r.amount for r in rows], dtype=float)
+    spent = np.array([r.spent for r in rows], dtype=float)
+    low_line = low_budget_lines(amounts, [r.low_budget_percent for r in rows])
+    projected = forecast.forecast_budgets(month, [r.user_id for r in rows], [r.category for r in rows], as_of)
+    statuses = np.select(
+        [spent > amounts, spent >= low_line, projected["forecast"] > amounts],
+        [OVER_BUDGET, LOW_BUDGET, FORECAST_OVER], default="ok",
+    )
+    return list(zip(statuses.tolist(), np.round(projected["forecast"], 2).tolist()))
+
+def _sweep_shard(month, notify, batch_size, summary, as_of):
+    rows = db.session.query(
+        Budget.user_id, Budget.category, Budget.amount, Budget.low_budget_percent,
+        func.coalesce(SpendRollup.total, 0.0).label("spent"),
+    ).outerjoin(SpendRollup, and_(
+        SpendRollup.user_id == Budget.user_id,
+        SpendRollup.category == Budget.category,
+        SpendRollup.month == Budget.month,
+    )).filter(Budget.month == month).all()
+    fired = {
+        (s.user_id, s.category, s.kind)
+        for s in db.session.query(AlertState.user_id, AlertState.category, AlertState.kind)
+        .filter(AlertState.month == month)
+    }
+
+    summary["budgets"] += len(rows)
+    due = []
+    for row, (status, projected) in zip(rows, _statuses(rows, month, as_of)):
+        if status == "ok":
+            continue
+        summary[status] += 1
+        if (row.user_id, row.category, status) not in fired:
+            due.append((row, status, projected if status == FORECAST_OVER else row.spent))
+    # Users live in the main database, which may be a different file from the budgets
+    users = {}
+    user_ids = sorted({row.user_id for row, _, _ in due})
+    for start in range(0, len(user_ids), IN_CHUNK_SIZE):
+        chunk = user_ids[start:start + IN_CHUNK_SIZE]
+        users.update((u.id, u) for u in db.session.query(User.id, User.name, User.email).filter(User.id.in_(chunk)))
+    # End the read transaction; batches below start as writers
+    db.session.commit()
+    if not notify:
+        return
+
+    for start in range(0, len(due), batch_size):
+        with write_transaction():
+            for row, status, total in due[start:start + batch_size]:
+                user = users.get(row.user_id)
+                # Still checked per row: a request may have fired it meanwhile
+                if user and fire(user, row.category, month, row.amount, status, total):
+                    summary["queued"] += 1
+            db.session.commit()
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Send pending budget alerts (e.g. from cron)")
+    parser.add_argument("command", choices=["sweep"])
+    parser.add_argument("--month", default=date.today().strftime("%Y-%m"), help="YYYY-MM (default: this month)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would fire without queueing")
+    args = parser.parse_args()
+
+    app = create_app({"OUTBOX_WORKERS": 0})
+    with app.app_context():
+        s = sweep_month(args.month, notify=not args.dry_run)
+    print(f"✅ {s['month']}: {s['budgets']} budgets, {s[LOW_BUDGET]} low, {s[OVER_BUDGET]} over, "
+          f"{s[FORECAST_OVER]} on pace to exceed, {s['queued']} alerts queued")
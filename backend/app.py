@@ -1,45 +1,46 @@
 import os
 import random
-import time
 import calendar
-from datetime import datetime
+from datetime import date, datetime
 from functools import wraps
-from threading import Thread
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_mail import Mail, Message
 from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
 
-import bcrypt
-import jwt
-from sqlalchemy import func
-
-from backend.db import db
+from backend.db import (db, database_uri, is_sqlite_file, sqlite_engine_options, init_engines, route_request,
+                        end_read_transaction)
 from backend.models import User, Budget, Expense
-from backend.reports import monthly_total, spending_vs_budget
+from backend.migrate import ensure_schema
+from backend.sharding import shard_binds, check_layout
+from backend.reports import month_report, range_report, parse_month, month_range, MAX_REPORT_MONTHS
+from backend.forecast import user_forecast
+from backend import rollup
+from backend import alerts
+from backend import auth
+from backend import ledger
+from backend import mailer
+from backend import metrics
+from backend import passwords
+from backend import ratelimit
+from backend import otp_store as otp
+from backend.passwords import HashingBusy
+from backend.tokens import SECRET_KEY, issue_token, decode_token
+from backend.user_cache import AuthUser, user_cache, load_auth_user, init_app as init_user_cache
+from backend.report_cache import report_cache, bump_version, current_version, etag_for, init_app as init_report_cache
+from backend.user_resolver import user_resolver, normalize_email, unique_addresses, init_app as init_user_resolver
+from backend.mailer import enqueue_email
+from backend.export import expense_filters, render, gzip_stream, CONTENT_TYPES
+from backend.archive import iter_export_chunks
+from backend.pagination import list_expenses, count_expenses, list_budgets, count_budgets, page_size, CursorError
+from backend.importer import detect_format, iter_records, import_expenses, ImportFormatError, DEFAULT_BATCH_SIZE
 
 # Load environment variables
 load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "secret123")
-otp_store = {}  # Temporary in-memory OTP store
-
-# Global Mail instance
-mail = Mail()
 
 
 # ------------- Helper functions ----------------
-def send_async_email(app, msg):
-    """Send email asynchronously in a thread"""
-    with app.app_context():
-        mail.send(msg)
-
-
-def send_email(msg, app):
-    """Start a thread to send email"""
-    Thread(target=send_async_email, args=(app, msg)).start()
-
-
 def token_required(f):
     """JWT authentication decorator"""
     @wraps(f)
@@ -53,26 +54,73 @@ def token_required(f):
         if not token:
             return jsonify({"error": "Token is missing"}), 401
         try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.get(data["user_id"])
+            data = decode_token(token)
+            if "email" in data:
+                # Claims-carrying token: no lookup needed
+                current_user = AuthUser(data["user_id"], data.get("name"), data["email"])
+            else:
+                current_user = user_cache.get(data["user_id"], load_auth_user)
             if not current_user:
                 return jsonify({"error": "User not found"}), 404
         except Exception:
             return jsonify({"error": "Token is invalid"}), 401
+        route_request(current_user.id)
         return f(current_user, *args, **kwargs)
     return decorated
 
 
+def split_expense(current_user, expense_id, split_emails, amount, category):
+    """Record the shares of registered users in the ledger and tell everyone
+    the expense was split with. Addresses are deduplicated and resolved in one
+    batch so registered users can be greeted by name."""
+    recipients = unique_addresses(split_emails)
+    if not recipients:
+        return
+    resolved = user_resolver.resolve(recipients)
+    split_amount = round(amount / (len(recipients) + 1), 2)
+    ledger.record_shares(current_user.id, expense_id, {
+        user.id: split_amount for user in (resolved.get(email) for email in recipients) if user
+    })
+    for email in recipients:
+        user = resolved.get(email)
+        greeting = f"Hi {user.name}," if user and user.name else "Hi,"
+        html_split = f"""
+        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
+        <h2>Split Expense Notification</h2>
+        <p>{greeting}</p>
+        <p>{current_user.name or current_user.email} added an expense of <strong>{amount}</strong> in <strong>{category}</strong>.</p>
+        <p>You owe: <strong>{split_amount}</strong>.</p>
+        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
+        </div>
+        """
+        enqueue_email([email], f"💰 Split Expense — {category}", html=html_split)
+
+
+def listing_args():
+    """Shared filters for list endpoints: month or from/to, category, cursor, limit"""
+    start = request.args.get("month") or request.args.get("from")
+    end = request.args.get("month") or request.args.get("to")
+    return {
+        "start_month": parse_month(start) if start else None,
+        "end_month": parse_month(end) if end else None,
+        "category": request.args.get("category"),
+    }
+
+
+def list_response(items, next_cursor, count_fn, filters):
+    body = {"items": items, "next_cursor": next_cursor}
+    if request.args.get("count", "").lower() == "true":
+        body["total_count"] = count_fn(**filters)
+    return jsonify(body)
+
+
 # ------------- Flask App Factory ----------------
-def create_app():
+def create_app(config=None):
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))  # backend/
     INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
     TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
     STATIC_DIR = os.path.join(BASE_DIR, "static")
 
-    # Ensure instance folder exists
-    os.makedirs(INSTANCE_DIR, exist_ok=True)
-
     app = Flask(
         __name__,
         template_folder=TEMPLATE_DIR,
@@ -82,9 +130,12 @@ def create_app():
 
     # --- Database setup ---
     DB_PATH = os.path.join(INSTANCE_DIR, "expenses.db")
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri(os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}"))
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-    db.init_app(app)
+    app.config["SQLITE_PROFILE"] = os.getenv("SQLITE_PROFILE", "production")
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    app.config["SHARD_COUNT"] = int(os.getenv("SHARD_COUNT", 1))  # see backend.sharding
+    app.config["SHARD_URL_TEMPLATE"] = os.getenv("SHARD_URL_TEMPLATE")  # default: <main db>-shard{n}.db
 
     # --- Mail setup ---
     app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER")
@@ -95,11 +146,77 @@ def create_app():
     app.config["MAIL_DEFAULT_SENDER"] = os.getenv(
         "MAIL_DEFAULT_SENDER", app.config["MAIL_USERNAME"]
     )
-    mail.init_app(app)
-
-    # --- Ensure DB tables ---
+    app.config["OUTBOX_WORKERS"] = int(os.getenv("OUTBOX_WORKERS", 2))
+
+    # --- Auth ---
+    app.config["AUTH_CLAIMS_IN_TOKEN"] = os.getenv("AUTH_CLAIMS_IN_TOKEN", "False") == "True"
+    app.config["USER_CACHE_TTL"] = float(os.getenv("USER_CACHE_TTL", 60))
+    app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", 10000))
+    app.config["EMAIL_CACHE_TTL"] = float(os.getenv("EMAIL_CACHE_TTL", 30))
+    app.config["EMAIL_CACHE_SIZE"] = int(os.getenv("EMAIL_CACHE_SIZE", 50000))
+    app.config["REPORT_CACHE_SIZE"] = int(os.getenv("REPORT_CACHE_SIZE", 2048))
+    app.config["REPORT_CACHE_TTL"] = float(os.getenv("REPORT_CACHE_TTL", 0))  # 0 = until evicted
+    app.config["BCRYPT_ROUNDS"] = int(os.getenv("BCRYPT_ROUNDS", 12))
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+    app.config["OTP_STORE"] = os.getenv("OTP_STORE", "sqlite")
+    app.config["OTP_TTL"] = float(os.getenv("OTP_TTL", 300))
+    app.config["GOOGLE_CLIENT_ID"] = os.getenv("GOOGLE_CLIENT_ID")  # unset = Google sign-in off
+    app.config["GOOGLE_CERTS_TTL"] = float(os.getenv("GOOGLE_CERTS_TTL", 3600))  # when Google sends no max-age
+
+    # --- Rate limiting and load shedding (see backend.ratelimit) ---
+    app.config["RATE_LIMIT_STORE"] = os.getenv("RATE_LIMIT_STORE", "memory")  # memory | sqlite | off
+    app.config["RATE_LIMIT_SQLITE_PATH"] = os.getenv("RATE_LIMIT_SQLITE_PATH")  # default: <main db>-ratelimit.db
+    app.config["RATE_LIMITS"] = os.getenv("RATE_LIMITS")  # overrides, e.g. "login=ip:20/60;add_expense=user:120/60"
+    # True behind a reverse proxy (set in the Dockerfile); otherwise every client shares the proxy's IP bucket
+    app.config["RATE_LIMIT_FORWARDED_FOR"] = os.getenv("RATE_LIMIT_FORWARDED_FOR", "False") == "True"
+    app.config["MAX_IN_FLIGHT"] = int(os.getenv("MAX_IN_FLIGHT", 0))  # per process, 0 = no shedding
+
+    # --- Archival of old months (see backend.archive) ---
+    app.config["ARCHIVE_DIR"] = os.getenv("ARCHIVE_DIR")  # default: <main db>-archive/
+    app.config["ARCHIVE_KEEP_MONTHS"] = int(os.getenv("ARCHIVE_KEEP_MONTHS", 24))
+
+    # --- Schema: auto | check | off (see backend.migrate.ensure_schema) ---
+    app.config["SCHEMA_MIGRATE"] = os.getenv("SCHEMA_MIGRATE", "auto")
+
+    # --- Instrumentation ---
+    app.config["SLOW_REQUEST_MS"] = os.getenv("SLOW_REQUEST_MS")  # unset = slow log off
+
+    # Explicit overrides (tests, scripts) win over the environment
+    app.config.update(config or {})
+    if app.config["SQLALCHEMY_DATABASE_URI"] == f"sqlite:///{DB_PATH}":
+        # Only the default database lives in the instance folder
+        os.makedirs(INSTANCE_DIR, exist_ok=True)
+    if is_sqlite_file(app.config["SQLALCHEMY_DATABASE_URI"]) and app.config["SQLITE_PROFILE"] == "production":
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", sqlite_engine_options(app))
+    app.config["SQLALCHEMY_BINDS"] = {**app.config.get("SQLALCHEMY_BINDS", {}), **shard_binds(app)}
+    db.init_app(app)
+    init_engines(app)
+    with app.app_context():
+        metrics.init_app(app, db.engines.values())
+    ratelimit.init_app(app)
+    mailer.init_app(app)
+    init_user_cache(app)
+    init_user_resolver(app)
+    init_report_cache(app)
+    passwords.init_app(app)
+    otp.init_app(app)
+    auth.init_app(app)
+    otp_store = app.extensions["otp_store"]
+    hasher = app.extensions["passwords"]
+
+    # --- Ensure DB schema (a version check unless the database is behind) ---
     with app.app_context():
-        db.create_all()
+        ensure_schema(app)
+        if app.config["SCHEMA_MIGRATE"] != "off":
+            check_layout(app)
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(e):
+        response = jsonify({"error": "Server busy, please retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
 
     # ------------- Routes ----------------
 
@@ -107,14 +224,15 @@ def create_app():
     @app.route("/test-email")
     def test_email():
         try:
-            msg = Message(
-                subject="Test Email",
-                recipients=[os.getenv("MAIL_USERNAME")],
+            enqueue_email(
+                [app.config["MAIL_USERNAME"]],
+                "Test Email",
                 body="This is a test email from Budget Tracker."
             )
-            send_email(msg, app)
+            db.session.commit()
             return "Email sent (check inbox/spam)"
         except Exception as e:
+            db.session.rollback()
             return f"Email failed: {e}"
 
     # ---------- OTP Signup Request ----------
@@ -128,26 +246,30 @@ def create_app():
         if User.query.filter_by(email=email).first():
             return jsonify({"error": "User already exists"}), 400
 
-        otp = str(random.randint(100000, 999999))
-        otp_store[email] = {"otp": otp, "time": time.time()}
+        code = str(random.randint(100000, 999999))
+        try:
+            otp_store.issue(email, code)
+        except otp.OTPThrottled as e:
+            response = jsonify({"error": "OTP already sent. Please wait before requesting again."})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response
 
         try:
             html_content = f"""
             <div style="font-family: Arial, sans-serif; padding: 20px; border-radius: 10px;">
               <h2>Budget Tracker — OTP</h2>
               <p>Your signup OTP is:</p>
-              <h1 style="color:#2E86C1;">{otp}</h1>
-              <p>This OTP expires in 5 minutes.</p>
+              <h1 style="color:#2E86C1;">{code}</h1>
+              <p>This OTP expires in {int(otp_store.ttl // 60)} minutes.</p>
             </div>
             """
-            msg = Message(
-                subject="Your OTP Code for Budget Tracker",
-                recipients=[email],
-                html=html_content,
-            )
-            send_email(msg, app)
+            enqueue_email([email], "Your OTP Code for Budget Tracker", html=html_content)
+            db.session.commit()
             return jsonify({"message": "OTP sent to email"}), 200
         except Exception as e:
+            db.session.rollback()
+            otp_store.discard(email)
             print("Email send error:", e)
             return jsonify({"error": "Failed to send OTP"}), 500
 
@@ -163,24 +285,27 @@ def create_app():
         if not all([name, email, password, user_otp]):
             return jsonify({"error": "All fields are required"}), 400
 
-        if email not in otp_store:
+        status = otp_store.verify(email, user_otp)
+        if status == otp.MISSING:
             return jsonify({"error": "No OTP found. Please request again."}), 400
-
-        saved = otp_store[email]
-        if time.time() - saved["time"] > 300:  # 5 minutes
-            del otp_store[email]
+        if status == otp.EXPIRED:
             return jsonify({"error": "OTP expired"}), 400
-
-        if saved["otp"] != user_otp:
+        if status == otp.LOCKED:
+            return jsonify({"error": "Too many attempts. Please request a new OTP."}), 429
+        if status != otp.OK:
             return jsonify({"error": "Invalid OTP"}), 400
 
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-        new_user = User(name=name, email=email, password=hashed_password.decode("utf-8"))
+        end_read_transaction()
+        new_user = User(name=name, email=email, password=hasher.hash(password))
         db.session.add(new_user)
-        db.session.commit()
-        del otp_store[email]
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "User already exists"}), 400
+        otp_store.discard(email)
 
-        token = jwt.encode({"user_id": new_user.id}, SECRET_KEY, algorithm="HS256")
+        token = issue_token(new_user)
         return jsonify({"user_id": new_user.id, "email": new_user.email, "access_token": token})
 
     # ---------- Traditional Signup ----------
@@ -197,12 +322,17 @@ def create_app():
         if User.query.filter_by(email=email).first():
             return jsonify({"error": "User already exists"}), 400
 
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-        new_user = User(name=name, email=email, password=hashed_password.decode("utf-8"))
+        end_read_transaction()
+        new_user = User(name=name, email=email, password=hasher.hash(password))
         db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Signed up concurrently while the password was hashing
+            db.session.rollback()
+            return jsonify({"error": "User already exists"}), 400
 
-        token = jwt.encode({"user_id": new_user.id}, SECRET_KEY, algorithm="HS256")
+        token = issue_token(new_user)
         return jsonify({"user_id": new_user.id, "email": new_user.email, "access_token": token})
 
     # ---------- Login ----------
@@ -216,14 +346,22 @@ def create_app():
         if not user:
             return jsonify({"error": "Invalid credentials"}), 401
 
+        end_read_transaction()
         try:
-            if not bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+            if not hasher.check(password, user.password):
                 return jsonify({"error": "Invalid credentials"}), 401
+        except HashingBusy:
+            raise
         except Exception as e:
             print("bcrypt error:", e)
             return jsonify({"error": "Invalid credentials"}), 401
 
-        token = jwt.encode({"user_id": user.id}, SECRET_KEY, algorithm="HS256")
+        # Upgrade the stored hash when BCRYPT_ROUNDS has changed
+        if hasher.needs_rehash(user.password):
+            user.password = hasher.hash(password)
+            db.session.commit()
+
+        token = issue_token(user)
         return jsonify({"user_id": user.id, "email": user.email, "access_token": token})
 
     # ---------- Add Budget ----------
@@ -236,6 +374,10 @@ def create_app():
         amount = data.get("amount")
         if not all([category, month, amount]):
             return jsonify({"error": "category, month and amount required"}), 400
+        try:
+            month = parse_month(month)
+        except (TypeError, ValueError):
+            return jsonify({"error": "month must be YYYY-MM"}), 400
 
         existing = Budget.query.filter_by(user_id=current_user.id, category=category, month=month).first()
         if existing:
@@ -244,8 +386,25 @@ def create_app():
         b = Budget(user_id=current_user.id, category=category, month=month, amount=float(amount),
                    low_budget_percent=data.get("low_budget_percent"))
         db.session.add(b)
+        rollup.ensure_row(current_user.id, category, month)
+        bump_version(current_user.id)
+        db.session.flush()
+        budget_id = b.id
         db.session.commit()
-        return jsonify({"budget_id": b.id})
+        return jsonify({"budget_id": budget_id})
+
+    # ---------- List Budgets ----------
+    @app.route("/users/budgets", methods=["GET"])
+    @token_required
+    def get_budgets(current_user):
+        try:
+            filters = listing_args()
+            limit = page_size(request.args.get("limit"))
+            items, next_cursor = list_budgets(current_user.id, **filters,
+                                              cursor=request.args.get("cursor"), limit=limit)
+        except ValueError as e:
+            return jsonify({"error": str(e) if isinstance(e, CursorError) else "Invalid filters"}), 400
+        return list_response(items, next_cursor, lambda **f: count_budgets(current_user.id, **f), filters)
 
     # ---------- Add Expense ----------
     @app.route("/users/expenses", methods=["POST"])
@@ -276,37 +435,37 @@ def create_app():
             month_name = calendar.month_name[date_obj.month]
             return jsonify({"error": f"Please set the budget for {month_name} before adding expenses in {category}."}), 400
 
-        total_spent_before = db.session.query(func.coalesce(func.sum(Expense.amount), 0.0)).filter(
-            Expense.user_id == current_user.id,
-            Expense.category == category,
-            Expense.date.like(f"{month_str}%")
-        ).scalar() or 0.0
-
-        new_total = total_spent_before + amount
+        # Check and reserve in one conditional UPDATE; None means it would not fit
         budget_limit = budget.amount
+        new_total = rollup.reserve(current_user.id, category, month_str, amount, budget_limit)
+        reserved = new_total is not None
+        if not reserved:
+            new_total = rollup.spent(current_user.id, category, month_str) + amount
         used_percent = (new_total / budget_limit) * 100
+        status = alerts.classify(budget_limit, budget.low_budget_percent, new_total)
 
         # --- Case 1: exceeds budget ---
-        if new_total > budget_limit:
+        if not reserved:
+            # Alert email, only for the first rejected expense of this budget-month.
+            # Its own kind: nothing was spent, so the over_budget alert stays unclaimed.
             try:
-                html_content = f"""
-                <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
-                <h2 style='color:#E74C3C;'>Budget Limit Exceeded</h2>
-                <p>Hi {current_user.name or current_user.email},</p>
-                <p>Your <strong>{category}</strong> budget for <strong>{month_str}</strong> is <strong>{budget.amount}</strong>.</p>
-                <p>Attempted expense: <strong>{amount}</strong>.</p>
-                <p>Total if added: <strong>{new_total}</strong> — this exceeds your budget.</p>
-                <p>Please review before proceeding.</p>
-                <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
-                </div>
-                """
-                msg = Message(
-                    subject=f"⚠️ Budget Exceeded — {category} ({month_str})",
-                    recipients=[current_user.email],
-                    html=html_content
-                )
-                send_email(msg, app)
+                if alerts.claim_alert(current_user.id, category, month_str, alerts.REJECTED_EXPENSE, new_total):
+                    html_content = f"""
+                    <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
+                    <h2 style='color:#E74C3C;'>Budget Limit Exceeded</h2>
+                    <p>Hi {current_user.name or current_user.email},</p>
+                    <p>Your <strong>{category}</strong> budget for <strong>{month_str}</strong> is <strong>{budget.amount}</strong>.</p>
+                    <p>Attempted expense: <strong>{amount}</strong>.</p>
+                    <p>Total if added: <strong>{new_total}</strong> — this exceeds your budget.</p>
+                    <p>Please review before proceeding.</p>
+                    <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
+                    </div>
+                    """
+                    enqueue_email([current_user.email], f"⚠️ Budget Exceeded — {category} ({month_str})",
+                                  html=html_content)
+                db.session.commit()
             except Exception as e:
+                db.session.rollback()
                 print("Email alert error:", e)
 
             return jsonify({
@@ -314,96 +473,106 @@ def create_app():
                 "status": "exceeded"
             }), 400
 
-        # --- Case 2: between 90% and 100% ---
-        elif 90 <= used_percent <= 100:
-            e = Expense(user_id=current_user.id, category=category, amount=amount, date=date_str)
+        # --- Case 2: within low_budget_percent of the limit (90% by default) ---
+        elif status == alerts.LOW_BUDGET:
+            e = Expense(user_id=current_user.id, category=category, amount=amount, date=date_obj.date())
             db.session.add(e)
-            db.session.commit()
+            bump_version(current_user.id)
 
-            # 90% warning email
-            try:
-                html_content = f"""
-                <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
-                <h2 style='color:#F39C12;'>Budget Usage Warning</h2>
-                <p>Hi {current_user.name or current_user.email},</p>
-                <p>You've used <strong>{used_percent:.2f}%</strong> of your <strong>{category}</strong> budget for <strong>{month_str}</strong>.</p>
-                <p>Total spent: <strong>{new_total}</strong> / Budget: <strong>{budget_limit}</strong>.</p>
-                <p>Be mindful of remaining funds.</p>
-                <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
-                </div>
-                """
-                msg = Message(
-                    subject=f"⚠️ 90% Budget Warning — {category} ({month_str})",
-                    recipients=[current_user.email],
-                    html=html_content
-                )
-                send_email(msg, app)
-            except Exception as e:
-                print("Email 90% alert error:", e)
+            # Warning email, only the first time this budget crosses the threshold
+            alerts.fire(current_user, category, month_str, budget_limit, alerts.LOW_BUDGET, new_total)
 
-            # Split emails
+            db.session.flush()
+            expense_id = e.id
+
+            # Split ledger and emails
             if split_emails:
-                split_amount = round(amount / (len(split_emails) + 1), 2)
-                for email in split_emails:
-                    try:
-                        html_split = f"""
-                        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
-                        <h2>Split Expense Notification</h2>
-                        <p>Hi,</p>
-                        <p>{current_user.name or current_user.email} added an expense of <strong>{amount}</strong> in <strong>{category}</strong>.</p>
-                        <p>You owe: <strong>{split_amount}</strong>.</p>
-                        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
-                        </div>
-                        """
-                        msg_split = Message(
-                            subject=f"💰 Split Expense — {category}",
-                            recipients=[email],
-                            html=html_split
-                        )
-                        send_email(msg_split, app)
-                    except Exception as e:
-                        print("Split email error:", e)
+                split_expense(current_user, expense_id, split_emails, amount, category)
+            db.session.commit()
 
             return jsonify({
                 "message": f"Expense added successfully, but you've used {used_percent:.2f}% of your {category} budget.",
                 "status": "warning_90",
-                "expense_id": e.id
+                "expense_id": expense_id
             }), 200
 
-        # --- Case 3: normal <90% ---
+        # --- Case 3: normal ---
         else:
-            e = Expense(user_id=current_user.id, category=category, amount=amount, date=date_str)
+            e = Expense(user_id=current_user.id, category=category, amount=amount, date=date_obj.date())
             db.session.add(e)
-            db.session.commit()
+            bump_version(current_user.id)
+
+            db.session.flush()
+            expense_id = e.id
 
             if split_emails:
-                split_amount = round(amount / (len(split_emails) + 1), 2)
-                for email in split_emails:
-                    try:
-                        html_split = f"""
-                        <div style='font-family:Arial,sans-serif;padding:18px;border-radius:8px;'>
-                        <h2>Split Expense Notification</h2>
-                        <p>Hi,</p>
-                        <p>{current_user.name or current_user.email} added an expense of <strong>{amount}</strong> in <strong>{category}</strong>.</p>
-                        <p>You owe: <strong>{split_amount}</strong>.</p>
-                        <p style='font-size:12px;color:#666;'>— Budget Tracker</p>
-                        </div>
-                        """
-                        msg_split = Message(
-                            subject=f"💰 Split Expense — {category}",
-                            recipients=[email],
-                            html=html_split
-                        )
-                        send_email(msg_split, app)
-                    except Exception as e:
-                        print("Split email error:", e)
+                split_expense(current_user, expense_id, split_emails, amount, category)
+            db.session.commit()
 
             return jsonify({
                 "message": "Expense added successfully.",
                 "status": "success",
-                "expense_id": e.id
+                "expense_id": expense_id
             }), 200
 
+    # ---------- List Expenses ----------
+    @app.route("/users/expenses", methods=["GET"])
+    @token_required
+    def get_expenses(current_user):
+        try:
+            filters = listing_args()
+            limit = page_size(request.args.get("limit"))
+            items, next_cursor = list_expenses(current_user.id, **filters,
+                                               cursor=request.args.get("cursor"), limit=limit)
+        except ValueError as e:
+            return jsonify({"error": str(e) if isinstance(e, CursorError) else "Invalid filters"}), 400
+        return list_response(items, next_cursor, lambda **f: count_expenses(current_user.id, **f), filters)
+
+    # ---------- Bulk Import Expenses ----------
+    @app.route("/users/expenses/import", methods=["POST"])
+    @token_required
+    def import_expenses_bulk(current_user):
+        try:
+            fmt = detect_format(request.mimetype, request.args.get("format"))
+            batch_size = max(1, min(int(request.args.get("batch_size", DEFAULT_BATCH_SIZE)), 50000))
+        except ImportFormatError as e:
+            return jsonify({"error": str(e)}), 400
+        except ValueError:
+            return jsonify({"error": "batch_size must be a number"}), 400
+
+        notify = request.args.get("notify", "true").lower() != "false"
+        try:
+            summary = import_expenses(current_user, iter_records(request.stream, fmt), batch_size, notify)
+        except ImportFormatError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 400
+        return jsonify(summary), 200
+
+    # ---------- Export Expenses ----------
+    @app.route("/users/expenses/export", methods=["GET"])
+    @token_required
+    def export_expenses(current_user):
+        fmt = request.args.get("format", "csv").lower()
+        if fmt not in CONTENT_TYPES:
+            return jsonify({"error": "format must be csv or ndjson"}), 400
+
+        start = request.args.get("month") or request.args.get("from")
+        end = request.args.get("month") or request.args.get("to")
+        try:
+            start = parse_month(start) if start else None
+            end = parse_month(end) if end else None
+        except ValueError:
+            return jsonify({"error": "Months must be YYYY-MM"}), 400
+
+        category = request.args.get("category")
+        filters = expense_filters(current_user.id, start, end, category)
+        blocks = render(iter_export_chunks(current_user.id, filters, start, end, category), fmt)
+        headers = {"Content-Disposition": f'attachment; filename="expenses.{fmt}"', "Vary": "Accept-Encoding"}
+        if "gzip" in request.accept_encodings:
+            blocks = gzip_stream(blocks)
+            headers["Content-Encoding"] = "gzip"
+        return Response(stream_with_context(blocks), mimetype=CONTENT_TYPES[fmt], headers=headers)
+
     # ---------- Verify Emails ----------
     @app.route("/users/verify_emails", methods=["POST"])
     @token_required
@@ -412,11 +581,14 @@ def create_app():
         emails = data.get("emails", [])
         if not emails:
             return jsonify({"error": "No emails provided"}), 400
+        if not isinstance(emails, list):
+            return jsonify({"error": "emails must be a list"}), 400
 
+        resolved = user_resolver.resolve(emails)
         verified = []
         invalid = []
         for email in emails:
-            user = User.query.filter_by(email=email).first()
+            user = resolved.get(normalize_email(email))
             if user:
                 verified.append({"email": email, "user_id": user.id})
             else:
@@ -424,18 +596,141 @@ def create_app():
 
         return jsonify({"verified": verified, "invalid": invalid})
 
+    # ---------- Split Ledger ----------
+    @app.route("/users/balances", methods=["GET"])
+    @token_required
+    def get_balances(current_user):
+        items = [
+            {"user_id": user_id, "name": name, "email": email, "amount": amount}
+            for user_id, name, email, amount in ledger.balances(current_user.id)
+        ]
+        return jsonify({
+            "items": items,
+            "owed_to_you": round(sum(i["amount"] for i in items if i["amount"] > 0), 2),
+            "you_owe": round(-sum(i["amount"] for i in items if i["amount"] < 0), 2),
+        })
+
+    @app.route("/users/settle", methods=["POST"])
+    @token_required
+    def settle_group(current_user):
+        data = request.json or {}
+        members = data.get("members", [])
+        if not isinstance(members, list) or not members:
+            return jsonify({"error": "members must be a non-empty list of emails"}), 400
+
+        addresses = unique_addresses(members)
+        resolved = user_resolver.resolve(addresses)
+        unknown = [email for email in addresses if not resolved.get(email)]
+        users = {user.id: user for user in resolved.values() if user}
+        users[current_user.id] = current_user
+
+        transfers = ledger.settle(ledger.net_positions(users))
+        return jsonify({
+            "transfers": [
+                {"from": users[debtor].email, "to": users[creditor].email, "amount": amount}
+                for debtor, creditor, amount in transfers
+            ],
+            "unknown": unknown,
+        })
+
     # ---------- Reports ----------
+    def cached_report(user_id, key, builder):
+        # The version covers every report of this user, so it doubles as the ETag
+        version = current_version(user_id)
+        etag = etag_for(user_id, version)
+        if etag in request.if_none_match:
+            report_cache.record_not_modified()
+            response = Response(status=304)
+        else:
+            response = jsonify(report_cache.get(user_id, key, version, builder))
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
     @app.route("/users/reports", methods=["GET"])
     @token_required
     def report(current_user):
         month = request.args.get("month")
-        if not month:
-            return jsonify({"error": "month required"}), 400
+        year = request.args.get("year")
+        start = request.args.get("from")
+        end = request.args.get("to")
+
+        if month:
+            return cached_report(current_user.id, ("month", month), lambda: month_report(current_user.id, month))
+
+        if year:
+            start, end = f"{year}-01", f"{year}-12"
+        if not start or not end:
+            return jsonify({"error": "month, year or from/to required"}), 400
+
+        try:
+            start, end = parse_month(start), parse_month(end)
+        except ValueError:
+            return jsonify({"error": "Months must be YYYY-MM"}), 400
+        if start > end:
+            return jsonify({"error": "from must not be after to"}), 400
+        if len(month_range(start, end)) > MAX_REPORT_MONTHS:
+            return jsonify({"error": f"At most {MAX_REPORT_MONTHS} months per report"}), 400
+
+        return cached_report(current_user.id, ("range", start, end), lambda: range_report(current_user.id, start, end))
+
+    # ---------- Forecast ----------
+    @app.route("/users/forecast", methods=["GET"])
+    @token_required
+    def forecast_report(current_user):
+        try:
+            month = parse_month(request.args.get("month") or date.today().strftime("%Y-%m"))
+            as_of = datetime.strptime(request.args["as_of"], "%Y-%m-%d").date() \
+                if request.args.get("as_of") else date.today()
+        except ValueError:
+            return jsonify({"error": "month must be YYYY-MM and as_of YYYY-MM-DD"}), 400
+
+        def build():
+            categories = {}
+            for f in user_forecast(current_user.id, month, as_of):
+                category = f.pop("category")
+                f["status"] = alerts.classify_forecast(f["budget"], f.pop("low_budget_percent"),
+                                                       f["spent"], f["forecast"])
+                categories[category] = f
+            return {
+                "month": month,
+                "as_of": as_of.isoformat(),
+                "budget": sum(f["budget"] for f in categories.values()),
+                "spent": round(sum(f["spent"] for f in categories.values()), 2),
+                "forecast": round(sum(f["forecast"] for f in categories.values()), 2),
+                "categories": categories,
+            }
+
+        # Depends on the date as well as the data, so no ETag; cached per day
+        key = ("forecast", month, as_of.isoformat())
+        return jsonify(report_cache.get(current_user.id, key, current_version(current_user.id), build))
+
+    # ---------- Internal stats ----------
+    @app.route("/internal/stats", methods=["GET"])
+    def internal_stats():
         return jsonify({
-            "total": monthly_total(current_user.id, month),
-            "breakdown": spending_vs_budget(current_user.id, month)
+            "outbox": app.extensions["outbox"].stats(),
+            "user_cache": user_cache.stats(),
+            "user_resolver": user_resolver.stats(),
+            "report_cache": report_cache.stats(),
+            "passwords": hasher.stats(),
+            "ratelimit": app.extensions["ratelimit"].stats(),
+            "google_certs": app.extensions["google_certs"].stats(),
         })
 
+    # ---------- Prometheus metrics ----------
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        lines = app.extensions["metrics"].render()
+        lines += metrics.render_gauges("outbox", app.extensions["outbox"].stats())
+        lines += metrics.render_gauges("user_cache", user_cache.stats())
+        lines += metrics.render_gauges("user_resolver", user_resolver.stats())
+        lines += metrics.render_gauges("report_cache", report_cache.stats())
+        lines += metrics.render_gauges("password_hash", hasher.stats())
+        lines += metrics.render_gauges("ratelimit", app.extensions["ratelimit"].stats())
+        lines += metrics.render_gauges("google_certs", app.extensions["google_certs"].stats())
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
     return app
 
 
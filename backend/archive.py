@@ -0,0 +1,257 @@
+# archive.py
+# Cold-data archival. Expenses in months older than ARCHIVE_KEEP_MONTHS move
+# out of the hot expense table into gzipped NDJSON files, one per user and
+# month, under ARCHIVE_DIR/<user_id>/, sorted by (date, id). Left behind:
+#   archive_summary  (user, category, month) total and count of the archived
+#                    rows, so rollup.rebuild() and verify() still add up
+#   archived_month   which file holds a user's archived month
+# Reports, budgets and alerts already read the spend rollup, which archiving
+# leaves untouched; export merges archive files back in by (date, id). The
+# paginated expense listing shows hot rows only, and its total_count matches.
+#
+# Users are archived one at a time: a complete new file per month (rows
+# already archived plus the hot ones) is written first, then the hot rows are
+# deleted and archived_month pointed at the new files in one transaction, then
+# the old files are removed. A crash leaves the old or the new state and at
+# most some unreferenced files. Expenses added to an archived month later stay
+# hot until the next run.
+#
+#   python -m backend.archive run [--keep-months 24] [--vacuum]
+#   python -m backend.archive status
+import argparse
+import gzip
+import heapq
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import date
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from backend.db import db, upsert, write_transaction, is_sqlite_file, shard_indexes, on_shard
+from backend.export import DEFAULT_CHUNK_SIZE, iter_expense_chunks
+from backend.forecast import HISTORY_MONTHS, shift_month
+from backend.models import ArchivedMonth, ArchiveSummary, Expense
+from backend.user_resolver import IN_CHUNK_SIZE
+
+DEFAULT_KEEP_MONTHS = 24
+# Forecasts read daily history for the month and HISTORY_MONTHS before it
+MIN_KEEP_MONTHS = HISTORY_MONTHS + 1
+
+ExpenseRow = namedtuple("ExpenseRow", ["id", "date", "category", "amount"])
+
+
+def archive_dir(app):
+    """ARCHIVE_DIR, else a directory next to the main SQLite database"""
+    if app.config.get("ARCHIVE_DIR"):
+        return app.config["ARCHIVE_DIR"]
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not is_sqlite_file(uri):
+        raise ValueError("ARCHIVE_DIR is required when the database is not a SQLite file")
+    return f"{os.path.splitext(uri[len('sqlite:///'):])[0]}-archive"
+
+
+def cutoff_month(keep_months, today=None):
+    """First month that stays hot: this month and the keep_months - 1 before it"""
+    if keep_months < MIN_KEEP_MONTHS:
+        raise ValueError(f"Keep at least {MIN_KEEP_MONTHS} months hot for forecasts")
+    return shift_month((today or date.today()).strftime("%Y-%m"), -(keep_months - 1))
+
+
+def _sort_key(row):
+    return row.date, row.id
+
+
+def read_rows(root, path):
+    """ExpenseRows of one archive file, in (date, id) order"""
+    with gzip.open(os.path.join(root, path), "rt", encoding="utf-8") as f:
+        for line in f:
+            r = json.loads(line)
+            yield ExpenseRow(r["id"], date.fromisoformat(r["date"]), r["category"], r["amount"])
+
+
+def _write_rows(root, path, rows):
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    tmp = full + ".tmp"
+    count = 0
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        for r in rows:
+            f.write(json.dumps({"id": r.id, "date": r.date.isoformat(), "category": r.category,
+                                "amount": r.amount}) + "\n")
+            count += 1
+    os.replace(tmp, full)
+    return count
+
+
+def _hot_rows(user_id, cutoff):
+    expense = Expense.__table__.c
+    return [ExpenseRow(*r) for r in db.session.execute(
+        select(expense.id, expense.date, expense.category, expense.amount).where(
+            expense.user_id == user_id,
+            expense.date < date.fromisoformat(f"{cutoff}-01"),
+        ).order_by(expense.date, expense.id)
+    )]
+
+
+def archive_user(root, user_id, cutoff):
+    """Move a user's hot expenses before cutoff into their monthly archive
+    files, in one transaction. Runs on the current shard and commits.
+    Returns (months, rows) moved."""
+    hot = _hot_rows(user_id, cutoff)
+    if not hot:
+        db.session.commit()
+        return 0, 0
+    by_month = {month: list(rows) for month, rows in groupby(hot, key=lambda r: r.date.isoformat()[:7])}
+    old_paths = dict(db.session.query(ArchivedMonth.month, ArchivedMonth.path).filter(
+        ArchivedMonth.user_id == user_id, ArchivedMonth.month.in_(list(by_month))))
+
+    written = {}
+    try:
+        for month, rows in by_month.items():
+            old_rows = read_rows(root, old_paths[month]) if month in old_paths else ()
+            path = os.path.join(str(user_id), f"{month}-{time.time_ns()}.ndjson.gz")
+            written[month] = (path, _write_rows(root, path, heapq.merge(old_rows, rows, key=_sort_key)))
+        db.session.commit()  # end the read transaction before taking the write lock
+
+        totals = {}
+        for r in hot:
+            key = (r.category, r.date.isoformat()[:7])
+            total, count = totals.get(key, (0.0, 0))
+            totals[key] = (total + r.amount, count + 1)
+        summary = upsert(ArchiveSummary)
+        archived = upsert(ArchivedMonth)
+        now = time.time()
+        with write_transaction():
+            ids = [r.id for r in hot]
+            for start in range(0, len(ids), IN_CHUNK_SIZE):
+                db.session.execute(delete(Expense).where(Expense.id.in_(ids[start:start + IN_CHUNK_SIZE])))
+            db.session.execute(summary.on_conflict_do_update(
+                index_elements=["user_id", "category", "month"],
+                set_={"total": ArchiveSummary.total + summary.excluded.total,
+                      "count": ArchiveSummary.count + summary.excluded.count},
+            ), [{"user_id": user_id, "category": c, "month": m, "total": t, "count": n}
+                for (c, m), (t, n) in totals.items()])
+            db.session.execute(archived.on_conflict_do_update(
+                index_elements=["user_id", "month"],
+                set_={"path": archived.excluded.path, "rows": archived.excluded.rows,
+                      "archived_at": archived.excluded.archived_at},
+            ), [{"user_id": user_id, "month": m, "path": path, "rows": n, "archived_at": now}
+                for m, (path, n) in written.items()])
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for path, _ in written.values():
+            os.remove(os.path.join(root, path))
+        raise
+    for path in old_paths.values():
+        os.remove(os.path.join(root, path))
+    return len(by_month), len(hot)
+
+
+def pending_users(cutoff):
+    """Users with hot expenses before cutoff, on the current shard"""
+    return db.session.execute(
+        select(Expense.user_id).where(Expense.date < date.fromisoformat(f"{cutoff}-01"))
+        .group_by(Expense.user_id).order_by(Expense.user_id)
+    ).scalars().all()
+
+
+def run(root, keep_months=DEFAULT_KEEP_MONTHS, today=None, log=print):
+    """Archive every month before the cutoff on every shard"""
+    cutoff = cutoff_month(keep_months, today)
+    summary = {"cutoff": cutoff, "users": 0, "months": 0, "rows": 0}
+    for shard in shard_indexes():
+        with on_shard(shard):
+            users = pending_users(cutoff)
+            db.session.commit()
+            for user_id in users:
+                months, rows = archive_user(root, user_id, cutoff)
+                summary["months"] += months
+                summary["rows"] += rows
+            summary["users"] += len(users)
+            log(f"  {'main' if shard is None else f'shard{shard}'}: {len(users)} users")
+    return summary
+
+
+def status(root):
+    """Hot and archived row counts and archive size on disk"""
+    report = {"hot_rows": 0, "archived_months": 0, "archived_rows": 0, "archive_bytes": 0}
+    for shard in shard_indexes():
+        with on_shard(shard):
+            report["hot_rows"] += db.session.query(func.count(Expense.id)).scalar()
+            months, rows = db.session.query(func.count(), func.coalesce(func.sum(ArchivedMonth.rows), 0)).one()
+            report["archived_months"] += months
+            report["archived_rows"] += rows
+            for (path,) in db.session.query(ArchivedMonth.path):
+                report["archive_bytes"] += os.path.getsize(os.path.join(root, path))
+    return report
+
+
+def _archived_rows(root, user_id, start_month, end_month, category):
+    query = db.session.query(ArchivedMonth.path).filter(ArchivedMonth.user_id == user_id)
+    if start_month or end_month:
+        query = query.filter(ArchivedMonth.month.between(start_month or end_month, end_month or start_month))
+    paths = [path for (path,) in query.order_by(ArchivedMonth.month)]
+    for path in paths:
+        for row in read_rows(root, path):
+            if category is None or row.category == category:
+                yield row
+
+
+def iter_export_chunks(user_id, filters, start_month=None, end_month=None, category=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+    """iter_expense_chunks() with archived months merged back in by (date, id)"""
+    query = db.session.query(ArchivedMonth.month).filter(ArchivedMonth.user_id == user_id)
+    if start_month or end_month:
+        query = query.filter(ArchivedMonth.month.between(start_month or end_month, end_month or start_month))
+    if query.first() is None:
+        yield from iter_expense_chunks(filters, chunk_size)
+        return
+
+    root = archive_dir(current_app)
+    hot = (row for chunk in iter_expense_chunks(filters, chunk_size) for row in chunk)
+    archived = _archived_rows(root, user_id, start_month, end_month, category)
+    chunk = []
+    for row in heapq.merge(archived, hot, key=_sort_key):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Move old expenses to compressed archive files")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--keep-months", type=int, help="Months kept hot, this one included "
+                        "(default: ARCHIVE_KEEP_MONTHS)")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM SQLite files afterwards to return the space")
+    args = parser.parse_args()
+
+    app = create_app({"OUTBOX_WORKERS": 0})
+    root = archive_dir(app)
+    with app.app_context():
+        if args.command == "run":
+            s = run(root, args.keep_months or app.config["ARCHIVE_KEEP_MONTHS"])
+            print(f"✅ Archived {s['rows']} expenses in {s['months']} user-months before {s['cutoff']}")
+            if args.vacuum:
+                db.session.remove()
+                for engine in db.engines.values():
+                    if engine.dialect.name == "sqlite":
+                        # Outside any transaction, which VACUUM requires
+                        raw = engine.raw_connection()
+                        try:
+                            raw.cursor().execute("VACUUM")
+                            raw.cursor().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                        finally:
+                            raw.close()
+        else:
+            for key, value in status(root).items():
+                print(f"{key}: {value}")
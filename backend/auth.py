@@ -1,27 +1,205 @@
-from flask import Blueprint, request, jsonify
-from google.oauth2 import id_token
-from google.auth.transport import requests as grequests
+# auth.py
+# Google sign-in. ID tokens are verified locally against Google's signing
+# certificates, which are cached for as long as Google's Cache-Control allows
+# and refreshed by a background thread shortly before they expire, so a login
+# never waits on the network once the cache is warm. A token signed with a key
+# the cache has not seen yet triggers one early refresh (Google rotates keys
+# with an overlap, so this is rare).
+#
+# The Google account is matched to a user by its verified email; new users get
+# an unusable password, so they can only sign in through Google.
+import json
 import os
+import re
+import threading
+import time
+
+import jwt
+from flask import Blueprint, current_app, request, jsonify
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
+from google.auth.transport import requests as grequests
+from sqlalchemy.exc import IntegrityError
+
+from backend.db import db
+from backend.models import User
+from backend.tokens import issue_token
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Never a bcrypt hash, so password login always fails for these accounts
+UNUSABLE_PASSWORD = "!google"
 
 auth_bp = Blueprint("auth", __name__)
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+
+
+class CertificateFetchError(Exception):
+    pass
+
+
+def http_fetch(url, timeout=5):
+    """Google's certs as {kid: PEM certificate}, plus their max-age if given"""
+    response = grequests.Request()(url, method="GET", timeout=timeout)
+    if response.status != 200:
+        raise CertificateFetchError(f"Fetching {url} returned HTTP {response.status}")
+    match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+    return json.loads(response.data.decode("utf-8")), int(match.group(1)) if match else None
+
+
+class CertificateCache:
+    def __init__(self, url=GOOGLE_CERTS_URL, fetch=http_fetch, ttl=3600, refresh_margin=300,
+                 retry_interval=30, min_refetch_interval=60):
+        self.url = url
+        self.fetch = fetch
+        self.ttl = ttl                      # when the response has no max-age
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.fetches = 0
+        self.failures = 0
+        self._certs = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._stopped = False
+
+    def get(self):
+        """Current certs; only blocks on the network when none are usable"""
+        self._ensure_refresher()
+        certs, seen = self._certs, self._fetched_at
+        if certs is not None and time.time() < self._expires_at:
+            return certs
+        return self.refresh(seen)
+
+    def certs_for(self, kid):
+        """Certs including kid, refreshing early once if it is unknown"""
+        certs, seen = self.get(), self._fetched_at
+        if kid not in certs and time.time() - seen >= self.min_refetch_interval:
+            certs = self.refresh(seen)
+        return certs
+
+    def refresh(self, seen=None):
+        """Fetch the certs, unless another thread has since the caller's seen fetch time"""
+        with self._lock:
+            if seen is not None and self._fetched_at > seen:
+                return self._certs
+            try:
+                certs, max_age = self.fetch(self.url)
+            except Exception as e:
+                self.failures += 1
+                # Expired certs still beat failing every login while Google is unreachable
+                if self._certs is not None:
+                    print("Google certs refresh failed:", e)
+                    return self._certs
+                raise CertificateFetchError(str(e)) from e
+            now = time.time()
+            self.fetches += 1
+            self._certs = certs
+            self._fetched_at = now
+            lifetime = max_age if max_age is not None else self.ttl
+            self._expires_at = now + lifetime
+            self._refresh_at = now + lifetime - min(self.refresh_margin, lifetime / 2)
+        self._wake.set()
+        return certs
+
+    def _ensure_refresher(self):
+        # Started on first use, so a preloaded app forks without the thread
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                self._thread = threading.Thread(target=self._refresh_loop, name="google-certs", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _refresh_loop(self):
+        while not self._stopped:
+            self._wake.clear()
+            # Nothing to keep fresh until the first fetch
+            wait = None if self._certs is None else self._refresh_at - time.time()
+            if wait is None or wait > 0:
+                self._wake.wait(wait)
+                continue
+            try:
+                self.refresh()
+            except CertificateFetchError as e:
+                print("Google certs refresh failed:", e)
+            if self._refresh_at <= time.time():
+                self._wake.wait(self.retry_interval)
+
+    def stats(self):
+        return {
+            "keys": len(self._certs or {}),
+            "expires_in": round(max(self._expires_at - time.time(), 0), 1),
+            "fetches": self.fetches,
+            "failures": self.failures,
+        }
+
+
+def verify_id_token(token, certs, client_id):
+    """Claims of a Google ID token for client_id; raises ValueError if invalid"""
+    kid = jwt.get_unverified_header(token).get("kid")
+    claims = google_jwt.decode(token, certs=certs.certs_for(kid), audience=client_id)
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+    if not claims.get("email") or not claims.get("email_verified"):
+        raise ValueError("Email missing or not verified")
+    return claims
+
+
+def google_user(claims):
+    """The user with the token's email, created on first sign-in"""
+    email = claims["email"]
+    user = User.query.filter_by(email=email).first()
+    if user is not None:
+        return user
+    user = User(name=claims.get("name") or email.split("@")[0], email=email, password=UNUSABLE_PASSWORD)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Signed up concurrently
+        db.session.rollback()
+        user = User.query.filter_by(email=email).first()
+    return user
+
 
 @auth_bp.route("/auth/google", methods=["POST"])
 def google_auth():
-    token = request.json.get("token")
+    token = (request.json or {}).get("token")
+    if not token:
+        return jsonify({"error": "Token required"}), 400
+    client_id = current_app.config.get("GOOGLE_CLIENT_ID")
+    if not client_id:
+        return jsonify({"error": "Google sign-in is not configured"}), 503
+
     try:
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
-            token, grequests.Request(), GOOGLE_CLIENT_ID
-        )
-        userid = idinfo["sub"]
-        email = idinfo["email"]
-        name = idinfo.get("name", "User")
-
-        # Example: Save/fetch user from DB
-        user = {"id": userid, "email": email, "name": name}
-
-        return jsonify({"message": "Google login successful", "user": user})
-    except Exception as e:
+        claims = verify_id_token(token, current_app.extensions["google_certs"], client_id)
+    except CertificateFetchError as e:
+        print("Google Auth Error:", e)
+        response = jsonify({"error": "Google sign-in unavailable, please retry shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    except (ValueError, jwt.PyJWTError, google_exceptions.GoogleAuthError) as e:
         print("Google Auth Error:", e)
-        return jsonify({"error": "Invalid token"}), 400
\ No newline at end of file
+        return jsonify({"error": "Invalid token"}), 400
+
+    user = google_user(claims)
+    return jsonify({"user_id": user.id, "email": user.email, "access_token": issue_token(user)})
+
+
+def init_app(app):
+    app.extensions["google_certs"] = CertificateCache(
+        url=app.config.get("GOOGLE_CERTS_URL", GOOGLE_CERTS_URL),
+        ttl=float(app.config.get("GOOGLE_CERTS_TTL", 3600)),
+    )
+    app.register_blueprint(auth_bp)
@@ -1,2 +1,280 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.sql.util import find_tables
+
+# Methods whose transactions are expected to write
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Per-user tables. With SHARD_COUNT > 1 they live in the shard files
+# (user_id % SHARD_COUNT); users, auth and the outbox stay in the main database.
+SHARDED_TABLES = frozenset({"expense", "budget", "spend_rollup", "data_version", "alert_state",
+                            "archive_summary", "archived_month"})
+
+# Ids of per-user rows come from a block per database (main = 0, shard n =
+# n + 1), so they are unique across shards and survive a rebalance unchanged;
+# split shares point at expense ids
+ID_BLOCK = 2 ** 40
+
+_write_intent = contextvars.ContextVar("write_intent", default=False)
+_shard = contextvars.ContextVar("shard", default=None)
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+class ShardingError(Exception):
+    pass
+
+
+def shard_count():
+    return int(current_app.config.get("SHARD_COUNT", 1)) if has_app_context() else 1
+
+
+def shard_for(user_id, count=None):
+    return int(user_id) % (count or shard_count())
+
+
+def shard_key(index):
+    """SQLALCHEMY_BINDS key of a shard"""
+    return f"shard{index}"
+
+
+def shard_indexes():
+    """Every shard of this app, or [None] when it is not sharded"""
+    count = shard_count()
+    return list(range(count)) if count > 1 else [None]
+
+
+@contextmanager
+def on_shard(index):
+    """Route per-user tables to one shard inside this block (jobs, scripts)"""
+    token = _shard.set(index)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+def user_shard(user_id):
+    return on_shard(shard_for(user_id) if shard_count() > 1 else None)
+
+
+def route_request(user_id):
+    """Route this request's per-user tables to the user's shard"""
+    if shard_count() <= 1:
+        return
+    g.shard = shard_for(user_id)
+    # End the auth lookup's main-database transaction so writers always take
+    # the shard lock before the main one and never wait on each other in reverse
+    db.session.commit()
+
+
+def active_shard():
+    shard = _shard.get()
+    if shard is None and has_app_context():
+        shard = g.get("shard")
+    return shard
+
+
+def _is_sharded(mapper, clause):
+    # ORM statements name their primary entity; only Core ones need walking
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is None:
+        return False
+    names = {table.name for table in find_tables(clause, include_crud=True)}
+    if not names & SHARDED_TABLES:
+        return False
+    if names - SHARDED_TABLES:
+        raise ShardingError(f"Statement mixes per-user and central tables: {sorted(names)}")
+    return True
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy's session, sending per-user tables to the active shard"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shard_count() > 1 and _is_sharded(mapper, clause):
+            index = active_shard()
+            if index is None:
+                raise ShardingError("No shard selected; use user_shard() or on_shard() outside requests")
+            return self._db.engines[shard_key(index)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def _block_index(engine):
+    for key, bound in db.engines.items():
+        if bound is engine and key is not None and key.startswith("shard"):
+            return int(key[len("shard"):]) + 1
+    return 0
+
+
+def shard_row_id(context):
+    """Column default for the ids of sharded tables: the next id of this
+    database's block. The highest id handed out is kept in id_block, since
+    rows moved out by a rebalance take theirs along and max(id) would forget."""
+    column = context.current_column
+    next_ids = context.__dict__.setdefault("_shard_row_ids", {})
+    if column not in next_ids:
+        conn = context.connection
+        blocks = db.metadata.tables["id_block"]
+        name = column.table.name
+        # Reserve an id for every row of an executemany at once. The increment
+        # happens in the statement, so concurrent writers never get the same range.
+        count = max(len(context.compiled_parameters), 1)
+        high = conn.execute(
+            blocks.update().where(blocks.c.name == name).values(high=blocks.c.high + count).returning(blocks.c.high)
+        ).scalar()
+        if high is None:
+            # First id from this database: start after what the block already holds
+            low = _block_index(conn.engine) * ID_BLOCK
+            start = conn.execute(
+                select(func.max(column)).where(column >= low, column < low + ID_BLOCK)
+            ).scalar() or low
+            stmt = upsert(blocks).values(name=name, high=start + count)
+            high = conn.execute(
+                stmt.on_conflict_do_update(index_elements=["name"], set_={"high": blocks.c.high + count})
+                .returning(blocks.c.high)
+            ).scalar()
+        next_ids[column] = high - count + 1
+    value = next_ids[column]
+    next_ids[column] += 1
+    return value
+
+
+def upsert(model):
+    """Dialect-aware INSERT that supports on_conflict_do_update / do_nothing"""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def database_uri(url):
+    """Normalize a DATABASE_URL (Heroku/Render style postgres:// included)"""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def is_sqlite_file(uri):
+    return uri.startswith("sqlite:///") and ":memory:" not in uri and "mode=memory" not in uri
+
+
+def sqlite_engine_options(app):
+    """Engine options for the SQLite production profile"""
+    busy_ms = int(app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    return {
+        "connect_args": {"timeout": busy_ms / 1000, "check_same_thread": False},
+        "pool_size": int(app.config.get("SQLITE_POOL_SIZE", 8)),
+        "max_overflow": int(app.config.get("SQLITE_MAX_OVERFLOW", 8)),
+        "pool_timeout": 30,
+    }
+
+
+@contextmanager
+def write_transaction():
+    """Mark transactions begun inside this block as writers (BEGIN IMMEDIATE).
+    Requests infer this from the HTTP method; jobs and scripts opt in here."""
+    token = _write_intent.set(True)
+    try:
+        yield
+    finally:
+        _write_intent.reset(token)
+
+
+def end_read_transaction():
+    """Commit before slow work that needs no database (bcrypt), keeping loaded
+    objects usable. A POST's first transaction is BEGIN IMMEDIATE, so leaving it
+    open would hold SQLite's write lock, and every other writer, meanwhile."""
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = True
+
+
+def _wants_write():
+    if _write_intent.get():
+        return True
+    return has_request_context() and request.method in WRITE_METHODS
+
+
+def _write_lock(engine):
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(engine.url), threading.Lock())
+
+
+def install_sqlite_profile(engine, app):
+    """WAL + pragmas on every connection, and per-process write serialization.
+
+    Writers start with BEGIN IMMEDIATE so they take SQLite's write lock up front
+    (waiting in busy_timeout) instead of failing when a read transaction tries to
+    upgrade. Within one process, writers queue on a lock first so threads don't
+    spin against each other on the file lock."""
+    cfg = app.config
+    busy_ms = int(cfg.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA busy_timeout={busy_ms}",
+        f"PRAGMA synchronous={cfg.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={int(cfg.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        f"PRAGMA cache_size={int(cfg.get('SQLITE_CACHE_SIZE', -64000))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    lock = _write_lock(engine)
+    lock_timeout = busy_ms / 1000
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Take over transaction control from pysqlite so BEGIN can be chosen below
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        if not _wants_write():
+            conn.exec_driver_sql("BEGIN")
+            return
+        held = lock.acquire(timeout=lock_timeout)
+        conn.info["write_lock"] = held
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        except Exception:
+            _release(conn)
+            raise
+
+    def _release(conn):
+        if conn.info.pop("write_lock", False):
+            lock.release()
+
+    @event.listens_for(engine, "commit")
+    def on_commit(conn):
+        _release(conn)
+
+    @event.listens_for(engine, "rollback")
+    def on_rollback(conn):
+        _release(conn)
+
+
+def init_engines(app):
+    """Apply the configured profile to every engine of this app"""
+    if app.config.get("SQLITE_PROFILE", "production") != "production":
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+                install_sqlite_profile(engine, app)
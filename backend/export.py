@@ -0,0 +1,89 @@
+# export.py
+# Streams a user's expenses as CSV or NDJSON. Rows are read with keyset
+# pagination on (date, id) so memory stays flat regardless of history size.
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+from sqlalchemy import tuple_
+
+from backend.models import Expense
+
+DEFAULT_CHUNK_SIZE = 1000
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CSV_FIELDS = ["id", "date", "category", "amount"]
+
+
+def month_bounds(start, end):
+    """[first day of start, first day after end) as ISO strings for a YYYY-MM range"""
+    year, month = int(end[:4]), int(end[5:7]) + 1
+    if month > 12:
+        year, month = year + 1, 1
+    return f"{start}-01", f"{year:04d}-{month:02d}-01"
+
+
+def expense_filters(user_id, start_month=None, end_month=None, category=None):
+    """WHERE clauses shared by export and listing"""
+    filters = [Expense.user_id == user_id]
+    if start_month or end_month:
+        lower, upper = month_bounds(start_month or end_month, end_month or start_month)
+        filters.append(Expense.date >= date.fromisoformat(lower))
+        filters.append(Expense.date < date.fromisoformat(upper))
+    if category:
+        filters.append(Expense.category == category)
+    return filters
+
+
+def after_key(last_date, last_id):
+    """Keyset predicate for rows strictly after (last_date, last_id)"""
+    return tuple_(Expense.date, Expense.id) > tuple_(last_date, last_id)
+
+
+def iter_expense_chunks(filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of (id, date, category, amount) tuples ordered by (date, id)"""
+    last = None
+    while True:
+        query = Expense.query.with_entities(Expense.id, Expense.date, Expense.category, Expense.amount) \
+            .filter(*filters)
+        if last:
+            query = query.filter(after_key(last.date, last.id))
+        rows = query.order_by(Expense.date, Expense.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+        if len(rows) < chunk_size:
+            return
+
+
+def _row_dict(row):
+    return {"id": row.id, "date": row.date.isoformat(), "category": row.category, "amount": row.amount}
+
+
+def render(chunks, fmt):
+    """Serialize row chunks to text blocks, one per chunk"""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(CSV_FIELDS)
+        yield buf.getvalue()
+        for rows in chunks:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows((r.id, r.date.isoformat(), r.category, r.amount) for r in rows)
+            yield buf.getvalue()
+    else:
+        for rows in chunks:
+            yield "".join(json.dumps(_row_dict(r)) + "\n" for r in rows)
+
+
+def gzip_stream(blocks):
+    """Incrementally gzip an iterable of text blocks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,143 @@
+# forecast.py
+# Month-end spend projections per budget, computed with NumPy over daily
+# series. Each budget's expenses for the month and HISTORY_MONTHS before it
+# are loaded in one grouped query into a (budgets, months, 31) array.
+#
+# The projection is spent so far plus an estimate of the rest of the month,
+# blended from two models:
+#   run rate     spent / days elapsed * days left
+#   seasonality  what prior months of the same category spent after the same
+#                point of the month (averaged over months that had spending)
+# The run rate is weighted by the fraction of the month elapsed, so early on
+# the projection leans on history and late in the month on actual pace.
+import calendar
+from datetime import date
+
+import numpy as np
+from sqlalchemy import Integer, cast, extract, func, select
+
+from backend.db import db
+from backend.models import Budget, Expense
+from backend.reports import month_range
+from backend.rollup import expense_month
+
+HISTORY_MONTHS = 3
+MAX_DAYS = 31
+
+
+def shift_month(month, delta):
+    year, index = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + delta, 12)
+    return f"{year:04d}-{index + 1:02d}"
+
+
+def days_in(month):
+    return calendar.monthrange(int(month[:4]), int(month[5:7]))[1]
+
+
+def days_elapsed(month, as_of):
+    """Days of month covered by data as of that date: 0 before it starts,
+    the full length once it is over"""
+    first = date(int(month[:4]), int(month[5:7]), 1)
+    return min(max((as_of - first).days + 1, 0), days_in(month))
+
+
+def load_daily(month, user_ids, categories, history=HISTORY_MONTHS, user_id=None):
+    """(budgets, history + 1, 31) array of daily spend aligned with the given
+    budget keys; the last month is the target one. One query, optionally
+    limited to a single user."""
+    months = month_range(shift_month(month, -history), month)
+    daily = np.zeros((len(user_ids), len(months), MAX_DAYS))
+    if not len(user_ids):
+        return daily
+
+    # Core columns: plain tuples, no ORM row processing for what can be many rows
+    expense = Expense.__table__.c
+    stmt = select(
+        expense.user_id, expense.category, expense_month(expense.date),
+        cast(extract("day", expense.date), Integer), func.sum(expense.amount),
+    ).where(
+        expense.date >= date.fromisoformat(f"{months[0]}-01"),
+        expense.date < date.fromisoformat(f"{shift_month(month, 1)}-01"),
+    ).group_by(expense.user_id, expense.category, expense.date)
+    if user_id is not None:
+        stmt = stmt.where(expense.user_id == user_id)
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        return daily
+
+    row_users, row_categories, row_months, row_days, row_amounts = (np.asarray(c) for c in zip(*rows))
+    # Integer keys for (user, category) on both sides, then match by binary search
+    names, codes = np.unique(np.concatenate([np.asarray(categories, dtype=str), row_categories.astype(str)]),
+                             return_inverse=True)
+    budget_keys = np.asarray(user_ids, dtype=np.int64) * len(names) + codes[:len(user_ids)]
+    row_keys = row_users.astype(np.int64) * len(names) + codes[len(user_ids):]
+
+    order = np.argsort(budget_keys)
+    sorted_keys = budget_keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, row_keys), len(sorted_keys) - 1)
+    match = sorted_keys[pos] == row_keys
+
+    month_index = np.searchsorted(np.asarray(months), row_months.astype(str))
+    np.add.at(daily, (order[pos[match]], month_index[match], row_days[match].astype(int) - 1),
+              row_amounts[match].astype(float))
+    return daily
+
+
+def project(daily, month, as_of):
+    """Vectorized projection for every row of a load_daily() array.
+    Returns arrays: spent, run_rate, seasonal (nan without history) and forecast."""
+    history = daily.shape[1] - 1
+    length = days_in(month)
+    elapsed = days_elapsed(month, as_of)
+    cumulative = daily.cumsum(axis=2)
+
+    spent = cumulative[:, -1, elapsed - 1] if elapsed else np.zeros(len(daily))
+    remaining_run = spent / elapsed * (length - elapsed) if elapsed else np.zeros(len(daily))
+
+    if history:
+        # Same fraction of each prior month, whatever its length
+        prior = month_range(shift_month(month, -history), shift_month(month, -1))
+        lengths = np.array([days_in(m) for m in prior])
+        cut = np.round(elapsed / length * lengths).astype(int)
+        totals = cumulative[:, :-1, MAX_DAYS - 1]
+        before = np.where(cut > 0, cumulative[:, np.arange(history), np.maximum(cut - 1, 0)], 0.0)
+        valid = totals > 0
+        seen = valid.sum(axis=1)
+        remaining_hist = np.where(valid, totals - before, 0.0).sum(axis=1) / np.maximum(seen, 1)
+        has_history = seen > 0
+    else:
+        remaining_hist = np.zeros(len(daily))
+        has_history = np.zeros(len(daily), dtype=bool)
+
+    weight = np.where(has_history, elapsed / length, 1.0)
+    return {
+        "spent": spent,
+        "run_rate": spent + remaining_run,
+        "seasonal": np.where(has_history, spent + remaining_hist, np.nan),
+        "forecast": spent + weight * remaining_run + (1 - weight) * remaining_hist,
+    }
+
+
+def forecast_budgets(month, user_ids, categories, as_of=None, history=HISTORY_MONTHS, user_id=None):
+    """project() for budgets given as parallel user_id / category sequences"""
+    daily = load_daily(month, user_ids, categories, history, user_id)
+    return project(daily, month, as_of or date.today())
+
+
+def user_forecast(user_id, month, as_of=None, history=HISTORY_MONTHS):
+    """Projection for each of a user's budgets in month, by category"""
+    budgets = Budget.query.filter_by(user_id=user_id, month=month).order_by(Budget.category).all()
+    result = forecast_budgets(month, [b.user_id for b in budgets], [b.category for b in budgets],
+                              as_of, history, user_id=user_id)
+    return [
+        {
+            "category": b.category,
+            "budget": b.amount,
+            "low_budget_percent": b.low_budget_percent,
+            "spent": round(float(result["spent"][i]), 2),
+            "forecast": round(float(result["forecast"][i]), 2),
+            "run_rate": round(float(result["run_rate"][i]), 2),
+            "seasonal": None if np.isnan(result["seasonal"][i]) else round(float(result["seasonal"][i]), 2),
+        }
+        for i, b in enumerate(budgets)
+    ]
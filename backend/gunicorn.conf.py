@@ -0,0 +1,19 @@
+# gunicorn.conf.py
+# gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+# The app is built once in the master (preload_app) and inherited by every
+# worker. Workers drop the inherited database connections right after fork so
+# no two processes share a connection.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from backend.db import db
+    from backend.wsgi import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
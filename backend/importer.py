@@ -0,0 +1,148 @@
+# importer.py
+# Bulk expense import from a streamed CSV or NDJSON request body. Rows are
+# parsed incrementally and written in executemany batches; the rollup is
+# updated once per (category, month) per batch and budgets are checked on the
+# same granularity instead of once per row.
+import csv
+import io
+import json
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from backend.db import db
+from backend.models import Expense
+from backend import rollup
+from backend.report_cache import bump_version
+from backend.alerts import check_budgets
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+CSV_TYPES = {"text/csv", "application/csv"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def detect_format(mimetype, explicit=None):
+    fmt = (explicit or "").lower()
+    if fmt in ("csv", "ndjson"):
+        return fmt
+    if mimetype in CSV_TYPES:
+        return "csv"
+    if mimetype in NDJSON_TYPES:
+        return "ndjson"
+    raise ImportFormatError("Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+
+
+def iter_records(stream, fmt):
+    """Yield (row_number, dict or error message) without buffering the body"""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            yield from _csv_records(text)
+        else:
+            yield from _ndjson_records(text)
+    except UnicodeDecodeError:
+        raise ImportFormatError("The body must be UTF-8 text")
+    except csv.Error as e:
+        raise ImportFormatError(f"Malformed CSV: {e}")
+
+
+def _csv_records(text):
+    reader = csv.DictReader(text)
+    missing = {"date", "category", "amount"} - set(reader.fieldnames or [])
+    if missing:
+        raise ImportFormatError(f"CSV header missing: {', '.join(sorted(missing))}")
+    for number, record in enumerate(reader, start=1):
+        yield number, record
+
+
+def _ndjson_records(text):
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON"
+            continue
+        yield number, record if isinstance(record, dict) else "Each line must be a JSON object"
+
+
+def parse_record(record):
+    """Validate one record. Returns (category, amount, date) or raises ValueError."""
+    category = (record.get("category") or "").strip()
+    if not category:
+        raise ValueError("category is required")
+    if len(category) > 50:
+        raise ValueError("category is too long")
+    try:
+        amount = float(record.get("amount"))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid amount")
+    if not math.isfinite(amount):
+        raise ValueError("Invalid amount")
+    value = str(record.get("date") or "")
+    try:
+        # fromisoformat is much cheaper than strptime; the shape check keeps it strict
+        if len(value) != 10 or value[4] != "-" or value[7] != "-":
+            raise ValueError
+        date = datetime.fromisoformat(value).date()
+    except ValueError:
+        raise ValueError("Date must be YYYY-MM-DD")
+    return category, amount, date
+
+
+def import_expenses(user, records, batch_size=DEFAULT_BATCH_SIZE, notify=True):
+    """Insert validated records in batches. Returns a summary for the response."""
+    inserted = 0
+    rejected = 0
+    errors = []
+    budgets = {}
+    batch = []
+    user_id = user.id
+
+    def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        totals = defaultdict(lambda: [0.0, 0])
+        for row in batch:
+            key = (row["category"], row["date"].isoformat()[:7])
+            totals[key][0] += row["amount"]
+            totals[key][1] += 1
+
+        db.session.execute(Expense.__table__.insert(), batch)
+        rollup.record_totals([
+            {"user_id": user_id, "category": category, "month": month, "total": amount, "count": count}
+            for (category, month), (amount, count) in totals.items()
+        ])
+        for (category, month), result in check_budgets(user, list(totals), notify).items():
+            budgets.setdefault(month, {})[category] = result
+        bump_version(user_id)
+        db.session.commit()
+
+        inserted += len(batch)
+        batch.clear()
+
+    for number, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            category, amount, date = parse_record(record)
+        except ValueError as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": number, "error": str(e)})
+            continue
+
+        batch.append({"user_id": user_id, "category": category, "amount": amount, "date": date})
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    return {"inserted": inserted, "rejected": rejected, "errors": errors, "budgets": budgets}
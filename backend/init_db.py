@@ -1,9 +1,10 @@
 # init_db.py
+# Creates or upgrades the configured database; same as python -m backend.migrate
 from backend.app import create_app
-from backend.db import db
+from backend.migrate import upgrade
 
-app = create_app()
+app = create_app({"SCHEMA_MIGRATE": "off", "OUTBOX_WORKERS": 0})
 
 with app.app_context():
-    db.create_all()
-    print("✅ Database initialized!")
\ No newline at end of file
+    upgrade()
+    print("✅ Database initialized!")
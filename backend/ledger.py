@@ -0,0 +1,101 @@
+# ledger.py
+# Who owes whom. Every share of a split expense is stored in split_share and
+# added to the pair's running net in balance in the same transaction, so
+# balances are read directly and never recomputed from the history.
+# Settlement turns a group's net positions into transfers: largest debtor
+# pays largest creditor, via two heaps, which needs at most members - 1
+# transfers.
+import heapq
+import time
+
+import numpy as np
+from sqlalchemy import or_
+
+from backend.db import db, upsert
+from backend.models import Balance, SplitShare, User
+from backend.user_resolver import IN_CHUNK_SIZE
+
+# Amounts below half a cent count as settled
+EPSILON = 0.005
+
+
+def _pair(payer_id, debtor_id, amount):
+    """Balance row delta for debtor owing payer amount"""
+    if payer_id < debtor_id:
+        return {"user_a": payer_id, "user_b": debtor_id, "net": amount}
+    return {"user_a": debtor_id, "user_b": payer_id, "net": -amount}
+
+
+def record_shares(payer_id, expense_id, shares):
+    """Store {debtor_id: amount} for one expense and move the pair balances.
+    Runs in the caller's transaction, no commit."""
+    shares = {debtor: amount for debtor, amount in shares.items() if debtor != payer_id and amount}
+    if not shares:
+        return
+    now = time.time()
+    db.session.execute(SplitShare.__table__.insert(), [
+        {"expense_id": expense_id, "payer_id": payer_id, "debtor_id": debtor, "amount": amount, "created_at": now}
+        for debtor, amount in shares.items()
+    ])
+    stmt = upsert(Balance)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_a", "user_b"],
+        set_={"net": Balance.net + stmt.excluded.net},
+    ), [_pair(payer_id, debtor, amount) for debtor, amount in shares.items()])
+
+
+def balances(user_id):
+    """[(other user id, name, email, amount)]: positive when they owe user_id"""
+    rows = db.session.query(Balance.user_a, Balance.user_b, Balance.net, User.name, User.email).join(
+        User, or_(
+            (Balance.user_a == user_id) & (User.id == Balance.user_b),
+            (Balance.user_b == user_id) & (User.id == Balance.user_a),
+        )
+    ).filter(or_(Balance.user_a == user_id, Balance.user_b == user_id)).all()
+    result = []
+    for a, b, net, name, email in rows:
+        amount = net if a == user_id else -net
+        if abs(amount) >= EPSILON:
+            result.append((b if a == user_id else a, name, email, round(amount, 2)))
+    return sorted(result, key=lambda r: -abs(r[3]))
+
+
+def net_positions(member_ids):
+    """{user_id: net} over balances between members only; positive = is owed"""
+    members = np.unique(np.asarray(sorted(member_ids), dtype=np.int64))
+    wanted = set(members.tolist())
+    a, b, net = [], [], []
+    for start in range(0, len(members), IN_CHUNK_SIZE):
+        chunk = members[start:start + IN_CHUNK_SIZE].tolist()
+        for user_a, user_b, amount in db.session.query(Balance.user_a, Balance.user_b, Balance.net) \
+                .filter(Balance.user_a.in_(chunk)):
+            if user_b in wanted:
+                a.append(user_a)
+                b.append(user_b)
+                net.append(amount)
+    positions = np.zeros(len(members))
+    if net:
+        amounts = np.asarray(net)
+        np.add.at(positions, np.searchsorted(members, a), amounts)
+        np.add.at(positions, np.searchsorted(members, b), -amounts)
+    return dict(zip(members.tolist(), positions.tolist()))
+
+
+def settle(positions):
+    """Transfers (debtor, creditor, amount) that zero every position"""
+    creditors = [(-amount, user) for user, amount in positions.items() if amount >= EPSILON]
+    debtors = [(amount, user) for user, amount in positions.items() if amount <= -EPSILON]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, round(amount, 2)))
+        if -credit - amount >= EPSILON:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt - amount >= EPSILON:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
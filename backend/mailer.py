@@ -0,0 +1,257 @@
+# mailer.py
+# Email goes through the email_outbox table: request handlers enqueue rows in
+# their own transaction and a fixed pool of dispatcher threads drains it, each
+# holding one authenticated SMTP connection across a batch of messages.
+import argparse
+import smtplib
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session
+
+from backend import metrics
+from backend.db import db, write_transaction
+from backend.models import EmailOutbox
+
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def enqueue_email(recipients, subject, html=None, body=None):
+    """Queue one message per recipient. Joins the caller's transaction; the caller commits."""
+    now = time.time()
+    for recipient in recipients:
+        db.session.add(EmailOutbox(
+            recipient=recipient, subject=subject, html=html, body=body,
+            status="pending", attempts=0, next_attempt_at=now, created_at=now
+        ))
+    db.session.info["outbox_pending"] = True
+    metrics.add_emails(len(recipients))
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop("outbox_pending", False):
+        dispatcher = current_app.extensions.get("outbox")
+        if dispatcher:
+            dispatcher.wake()
+
+
+def queue_depth():
+    """Outbox row counts by status"""
+    counts = dict(
+        db.session.query(EmailOutbox.status, func.count(EmailOutbox.id))
+        .group_by(EmailOutbox.status).all()
+    )
+    return {status: counts.get(status, 0) for status in ("pending", "sending", "failed")}
+
+
+def build_message(row, sender):
+    msg = EmailMessage()
+    msg["Subject"] = row.subject
+    msg["From"] = sender
+    msg["To"] = row.recipient
+    msg.set_content(row.body or "This message requires an HTML capable email client.")
+    if row.html:
+        msg.add_alternative(row.html, subtype="html")
+    return msg
+
+
+class SMTPConnection:
+    """One lazily opened, reusable SMTP session"""
+
+    def __init__(self, config):
+        self.config = config
+        self.smtp = None
+
+    def open(self):
+        cfg = self.config
+        host = cfg.get("MAIL_SERVER") or "localhost"
+        port = int(cfg.get("MAIL_PORT") or 25)
+        timeout = cfg.get("MAIL_TIMEOUT", 30)
+        if cfg.get("MAIL_USE_SSL"):
+            smtp = smtplib.SMTP_SSL(host, port, timeout=timeout)
+        else:
+            smtp = smtplib.SMTP(host, port, timeout=timeout)
+            if cfg.get("MAIL_USE_TLS"):
+                smtp.starttls()
+        if cfg.get("MAIL_USERNAME") and cfg.get("MAIL_PASSWORD"):
+            smtp.login(cfg["MAIL_USERNAME"], cfg["MAIL_PASSWORD"])
+        self.smtp = smtp
+
+    def send(self, msg):
+        if self.smtp is None:
+            self.open()
+        self.smtp.send_message(msg)
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+
+class OutboxDispatcher:
+    """Fixed-size pool of threads that drain the outbox"""
+
+    def __init__(self, app):
+        self.app = app
+        cfg = app.config
+        self.workers = int(cfg.get("OUTBOX_WORKERS", 2))
+        self.batch_size = int(cfg.get("OUTBOX_BATCH_SIZE", 20))
+        self.max_attempts = int(cfg.get("OUTBOX_MAX_ATTEMPTS", 5))
+        self.retry_base = float(cfg.get("OUTBOX_RETRY_BASE", 30))
+        self.retry_max = float(cfg.get("OUTBOX_RETRY_MAX", 3600))
+        self.lease = float(cfg.get("OUTBOX_LEASE_SECONDS", 120))
+        self.poll_interval = float(cfg.get("OUTBOX_POLL_INTERVAL", 5))
+        self.sent = 0
+        self.failed = 0
+        self._event = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    # ---------- lifecycle ----------
+    def start(self):
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._event.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self.start()
+        self._event.set()
+
+    # ---------- work ----------
+    def _run(self):
+        conn = SMTPConnection(self.app.config)
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    processed = self.process_batch(conn)
+                except Exception as e:
+                    print("Outbox dispatcher error:", e)
+                    db.session.rollback()
+                    processed = 0
+                if not processed:
+                    # Idle: release the SMTP session until there is work again
+                    conn.close()
+                    self._event.wait(self.poll_interval)
+                    self._event.clear()
+            conn.close()
+
+    def claim(self):
+        """Atomically claim up to batch_size due rows for this worker.
+        Returns plain rows; the transaction is over before any mail is sent."""
+        now = time.time()
+        token = uuid.uuid4().hex
+        due = db.session.query(EmailOutbox.id).filter(or_(
+            (EmailOutbox.status == "pending") & (EmailOutbox.next_attempt_at <= now),
+            (EmailOutbox.status == "sending") & (EmailOutbox.claimed_at < now - self.lease),
+        )).order_by(EmailOutbox.id).limit(self.batch_size)
+        with write_transaction():
+            db.session.query(EmailOutbox).filter(EmailOutbox.id.in_(due.scalar_subquery())).update(
+                {"status": "sending", "claimed_by": token, "claimed_at": now},
+                synchronize_session=False
+            )
+            rows = db.session.query(
+                EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.body,
+                EmailOutbox.html, EmailOutbox.attempts
+            ).filter_by(claimed_by=token, status="sending").order_by(EmailOutbox.id).all()
+            db.session.commit()
+        return rows
+
+    def process_batch(self, conn):
+        """Send one claimed batch over conn. Returns the number of rows handled."""
+        rows = self.claim()
+        if not rows:
+            return 0
+
+        cfg = self.app.config
+        sender = cfg.get("MAIL_DEFAULT_SENDER") or cfg.get("MAIL_USERNAME") or "no-reply@localhost"
+        sent, failures = [], []
+        for i, row in enumerate(rows):
+            try:
+                if not cfg.get("MAIL_SUPPRESS_SEND"):
+                    conn.send(build_message(row, sender))
+                sent.append(row.id)
+            except MESSAGE_ERRORS as e:
+                # The server rejected this message; the session is still usable
+                failures.append((row, e))
+            except Exception as e:
+                # Connection-level failure: back off the rest of the batch too
+                conn.close()
+                failures.extend((pending, e) for pending in rows[i:])
+                break
+
+        # Outcomes are written in one short writer transaction after sending
+        with write_transaction():
+            if sent:
+                db.session.query(EmailOutbox).filter(EmailOutbox.id.in_(sent)).delete(synchronize_session=False)
+            for row, error in failures:
+                db.session.query(EmailOutbox).filter_by(id=row.id).update(
+                    self._failure_update(row, error), synchronize_session=False
+                )
+            db.session.commit()
+        self.sent += len(sent)
+        return len(rows)
+
+    def _failure_update(self, row, error):
+        attempts = row.attempts + 1
+        values = {"attempts": attempts, "last_error": str(error)[:1000], "claimed_by": None}
+        if attempts >= self.max_attempts:
+            values["status"] = "failed"
+            self.failed += 1
+            print(f"Email to {row.recipient} failed permanently: {error}")
+        else:
+            values["status"] = "pending"
+            values["next_attempt_at"] = time.time() + min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return values
+
+    def drain(self):
+        """Synchronously send everything that is due. Returns rows handled."""
+        conn = SMTPConnection(self.app.config)
+        total = 0
+        try:
+            while True:
+                processed = self.process_batch(conn)
+                if not processed:
+                    return total
+                total += processed
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {"workers": self.workers, "sent": self.sent, "failed": self.failed, **queue_depth()}
+
+
+def init_app(app):
+    app.extensions["outbox"] = OutboxDispatcher(app)
+
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Drain the email outbox once (e.g. from cron)")
+    parser.parse_args()
+
+    app = create_app({"OUTBOX_WORKERS": 0})
+    with app.app_context():
+        sent = app.extensions["outbox"].drain()
+        print(f"✅ Outbox processed: {sent} messages, depth now {queue_depth()}")
@@ -0,0 +1,199 @@
+# metrics.py
+# Per-request instrumentation: latency, SQL statement count and time (via
+# SQLAlchemy engine events), bcrypt time and emails enqueued, aggregated per
+# route and rendered in the Prometheus text format on /metrics.
+import contextvars
+import logging
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+MAX_LOGGED_STATEMENTS = 50
+
+slow_log = logging.getLogger("backend.slow_requests")
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "sql_time", "bcrypt_time", "emails", "statements")
+
+    def __init__(self, capture_statements):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.bcrypt_time = 0.0
+        self.emails = 0
+        self.statements = [] if capture_statements else None
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        data = self.series.get(labels)
+        if data is None:
+            data = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, data in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            for bound, count in zip(self.buckets, data):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {data[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {data[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {data[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{{{_labels(label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+
+
+class Registry:
+    ROUTE_LABELS = ("endpoint", "method")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = Histogram("http_request_duration_seconds", "Request latency", LATENCY_BUCKETS)
+        self.statements = Histogram("http_request_sql_statements", "SQL statements per request", STATEMENT_BUCKETS)
+        self.requests = Counter("http_requests_total", "Requests by status")
+        self.db_seconds = Counter("http_request_db_seconds_total", "Time spent executing SQL")
+        self.bcrypt_seconds = Counter("http_request_bcrypt_seconds_total", "Time spent in bcrypt")
+        self.emails = Counter("http_request_emails_enqueued_total", "Emails enqueued")
+
+    def record(self, endpoint, method, status, elapsed, stats):
+        route = (endpoint, method)
+        with self._lock:
+            self.latency.observe(route, elapsed)
+            self.statements.observe(route, stats.sql_count)
+            self.requests.inc(route + (status,))
+            self.db_seconds.inc(route, stats.sql_time)
+            self.bcrypt_seconds.inc(route, stats.bcrypt_time)
+            self.emails.inc(route, stats.emails)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            lines += self.latency.render(self.ROUTE_LABELS)
+            lines += self.statements.render(self.ROUTE_LABELS)
+            lines += self.requests.render(self.ROUTE_LABELS + ("status",))
+            lines += self.db_seconds.render(self.ROUTE_LABELS)
+            lines += self.bcrypt_seconds.render(self.ROUTE_LABELS)
+            lines += self.emails.render(self.ROUTE_LABELS)
+        return lines
+
+
+def render_gauges(prefix, values):
+    """Flatten a stats dict into Prometheus gauges (non-numeric values skipped)"""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, dict):
+            lines += render_gauges(f"{prefix}_{key}", value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{key}".replace(".", "_")
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+# ---------- hooks used by other modules ----------
+def add_bcrypt_time(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.bcrypt_time += seconds
+
+
+def add_emails(count):
+    stats = _current.get()
+    if stats is not None:
+        stats.emails += count
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None or not conn.info.get("query_started"):
+            return
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((round(elapsed * 1000, 2), statement))
+
+
+def init_app(app, engines):
+    registry = Registry()
+    app.extensions["metrics"] = registry
+    slow_ms = app.config.get("SLOW_REQUEST_MS")
+    slow_seconds = float(slow_ms) / 1000 if slow_ms not in (None, "") else None
+
+    for engine in engines:
+        instrument_engine(engine)
+
+    @app.before_request
+    def start_request_stats():
+        request.environ["metrics.token"] = _current.set(RequestStats(slow_seconds is not None))
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        registry.record(endpoint, request.method, response.status_code, elapsed, stats)
+        if slow_seconds is not None and elapsed >= slow_seconds:
+            slow_log.warning(
+                "Slow request %s %s: %.1f ms, %d statements (%.1f ms SQL, %.1f ms bcrypt)\n%s",
+                request.method, request.path, elapsed * 1000, stats.sql_count,
+                stats.sql_time * 1000, stats.bcrypt_time * 1000,
+                "\n".join(f"  {ms} ms  {sql}" for ms, sql in stats.statements),
+            )
+        return response
+
+    @app.teardown_request
+    def clear_request_stats(exc):
+        token = request.environ.pop("metrics.token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Streamed responses can finish in a different context
+                _current.set(None)
+
+    return registry
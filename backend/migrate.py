@@ -0,0 +1,211 @@
+# migrate.py
+# Upgrades an existing expenses.db in place: Expense.date becomes a DATE column,
+# Expense/Budget get their composite indexes and User its lower(email) index,
+# missing tables are created, block-allocated ids are widened to BIGINT outside
+# SQLite, and the result is stamped with SCHEMA_VERSION.
+# Shard files (SHARD_COUNT > 1) get the per-user tables and a stamp of their own.
+# Safe to re-run; an interrupted copy resumes from the last finished batch.
+# At boot, create_app only compares the stamps (see ensure_schema).
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+from backend.db import db, upsert, write_transaction, SHARDED_TABLES, shard_indexes, shard_key, on_shard
+from backend.models import Budget, Expense, IdBlock, SchemaVersion, User
+from backend import rollup
+
+# Bump whenever models.py changes shape so existing databases get upgraded
+SCHEMA_VERSION = 6
+
+EXPENSE_NEW_DDL = """
+CREATE TABLE IF NOT EXISTS expense_new (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    amount FLOAT NOT NULL,
+    date DATE NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id)
+)
+"""
+
+
+# Columns holding ids from backend.db.ID_BLOCK blocks (models.ROW_ID)
+ROW_ID_COLUMNS = [
+    ("expense", "id"), ("budget", "id"), ("alert_state", "id"), ("id_block", "high"), ("split_share", "expense_id"),
+]
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _column_type(conn, table, column):
+    for info in inspect(conn).get_columns(table):
+        if info["name"] == column:
+            return str(info["type"]).upper()
+    return None
+
+
+def _normalize_date(expense_id, value):
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise MigrationError(f"Expense {expense_id} has an unreadable date: {value!r}")
+
+
+def _rebuild_expense_table(engine, batch_size, log):
+    with engine.begin() as conn:
+        conn.execute(text(EXPENSE_NEW_DDL))
+        last_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM expense_new")).scalar()
+
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, user_id, category, amount, date FROM expense "
+                     "WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size}
+            ).fetchall()
+            if not rows:
+                break
+            conn.execute(
+                text("INSERT INTO expense_new (id, user_id, category, amount, date) "
+                     "VALUES (:id, :user_id, :category, :amount, :date)"),
+                [{"id": r[0], "user_id": r[1], "category": r[2], "amount": r[3],
+                  "date": _normalize_date(r[0], r[4])} for r in rows]
+            )
+        last_id = rows[-1][0]
+        copied += len(rows)
+        log(f"  copied {copied} expenses (up to id {last_id})")
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE expense"))
+        conn.execute(text("ALTER TABLE expense_new RENAME TO expense"))
+    return copied
+
+
+def _widen_row_ids(engine, log):
+    """ALTER the block-allocated id columns to BIGINT (PostgreSQL); SQLite's INTEGER is 64-bit"""
+    if engine.dialect.name == "sqlite":
+        return
+    with engine.begin() as conn:
+        for table, column in ROW_ID_COLUMNS:
+            current = _column_type(conn, table, column)
+            if current and current != "BIGINT":
+                log(f"Widening {table}.{column} from {current} to BIGINT...")
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT"))
+
+
+def _dedupe_budgets(engine):
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "DELETE FROM budget WHERE id NOT IN ("
+            " SELECT MIN(id) FROM budget GROUP BY user_id, month, category)"
+        ))
+        return result.rowcount
+
+
+def schema_version(engine):
+    """Version stamped in the database, or None if it was never stamped"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(SchemaVersion.__tablename__):
+            return None
+        return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+
+
+def stamp(engine, version=SCHEMA_VERSION):
+    stmt = upsert(SchemaVersion).values(id=1, version=version, applied_at=time.time())
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["id"], set_={"version": version, "applied_at": stmt.excluded.applied_at}
+        ))
+
+
+def shard_engines():
+    """Engines of this app's shard files, in shard order (empty when unsharded)"""
+    return [db.engines[shard_key(index)] for index in shard_indexes() if index is not None]
+
+
+def create_shard_tables(engine):
+    """Create the per-user tables (plus id blocks and the version stamp) in a shard file"""
+    tables = [db.metadata.tables[name] for name in sorted(SHARDED_TABLES)]
+    db.metadata.create_all(engine, tables=tables + [IdBlock.__table__, SchemaVersion.__table__])
+
+
+def upgrade(batch_size=5000, log=print):
+    """Bring the bound database and its shards up to the current schema and stamp them"""
+    # Tables that do not exist yet (fresh database, new models) come first
+    db.create_all(bind_key=None)
+    shards = shard_engines()
+    for engine in shards:
+        create_shard_tables(engine)
+
+    for engine in [db.engine] + shards:
+        with engine.connect() as conn:
+            date_type = _column_type(conn, "expense", "date")
+
+        if date_type and date_type != "DATE":
+            if engine.dialect.name != "sqlite":
+                # Only legacy SQLite files ever had a text date column
+                raise MigrationError(f"expense.date is {date_type}; convert it to DATE by hand")
+            log(f"Converting expense.date from {date_type} to DATE...")
+            _rebuild_expense_table(engine, batch_size, log)
+
+        _widen_row_ids(engine, log)
+
+        removed = _dedupe_budgets(engine)
+        if removed:
+            log(f"Removed {removed} duplicate budget rows")
+
+        tables = (Expense.__table__, Budget.__table__) + ((User.__table__,) if engine is db.engine else ())
+        with engine.begin() as conn:
+            for table in tables:
+                for index in table.indexes:
+                    # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+
+    for index in shard_indexes():
+        with on_shard(index):
+            rollup.rebuild()
+    # Release the session's connections before stamping through the engines
+    db.session.commit()
+    for engine in [db.engine] + shards:
+        stamp(engine)
+    log(f"✅ Schema up to date (version {SCHEMA_VERSION})")
+
+
+def ensure_schema(app, log=print):
+    """Boot-time check. SCHEMA_MIGRATE is "auto" (upgrade when behind), "check"
+    (refuse to start when behind) or "off". Returns True if it upgraded."""
+    mode = app.config.get("SCHEMA_MIGRATE", "auto")
+    if mode == "off":
+        return False
+    versions = [schema_version(engine) for engine in [db.engine] + shard_engines()]
+    if all(version == SCHEMA_VERSION for version in versions):
+        return False
+    for version in versions:
+        if version is not None and version > SCHEMA_VERSION:
+            raise MigrationError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+    if mode != "auto":
+        behind = min(versions, key=lambda v: v or 0)
+        raise MigrationError(f"Database schema version is {behind}, expected {SCHEMA_VERSION}; "
+                             "run python -m backend.migrate")
+    with write_transaction():
+        upgrade(log=log)
+    return True
+
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Upgrade an existing expenses.db in place")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = create_app({"SCHEMA_MIGRATE": "off", "OUTBOX_WORKERS": 0})
+    with app.app_context():
+        upgrade(batch_size=args.batch_size)
@@ -1,4 +1,11 @@
-from backend.db import db
+from backend.db import db, shard_row_id
+
+# Tables named in backend.db.SHARDED_TABLES live on the owner's shard when
+# SHARD_COUNT > 1; everything else stays in the main database.
+
+# Ids handed out from a shard's block (backend.db.ID_BLOCK) start past 2**31.
+# SQLite's INTEGER is 64-bit already and must stay the rowid alias.
+ROW_ID = db.BigInteger().with_variant(db.Integer, "sqlite")
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -7,9 +14,15 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False)
     budgets = db.relationship("Budget", backref="user", lazy=True)
     expenses = db.relationship("Expense", backref="user", lazy=True)
+    __table_args__ = (
+        db.Index("ix_user_email_lower", db.func.lower(email)),
+    )
 
 class Budget(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        db.Index("ix_budget_user_month_category", "user_id", "month", "category", unique=True),
+    )
+    id = db.Column(ROW_ID, primary_key=True, default=shard_row_id)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     category = db.Column(db.String(50), nullable=False)
     month = db.Column(db.String(7), nullable=False)  # YYYY-MM
@@ -17,8 +30,121 @@ class Budget(db.Model):
     low_budget_percent = db.Column(db.Integer)
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index("ix_expense_user_category_date", "user_id", "category", "date"),
+        db.Index("ix_expense_user_date", "user_id", "date"),
+    )
+    id = db.Column(ROW_ID, primary_key=True, default=shard_row_id)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+class SpendRollup(db.Model):
+    # Running (user, category, month) totals, maintained alongside Expense inserts
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class EmailOutbox(db.Model):
+    # Durable queue drained by backend.mailer's dispatcher
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next", "status", "next_attempt_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default="pending")  # pending|sending|failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.Float, nullable=False)  # epoch seconds
+    claimed_by = db.Column(db.String(64))
+    claimed_at = db.Column(db.Float)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False)
+
+class OtpEntry(db.Model):
+    # Pending signup codes, visible to every worker (see backend.otp_store)
+    email = db.Column(db.String(100), primary_key=True)
+    otp_hash = db.Column(db.String(64), nullable=False)
+    issued_at = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+class DataVersion(db.Model):
+    # Bumped on every expense/budget write; report caches and ETags key off it
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class AlertState(db.Model):
+    # One row per budget threshold that has already been alerted on
+    __table_args__ = (
+        db.Index("ix_alert_state_month_user_category_kind", "month", "user_id", "category", "kind", unique=True),
+    )
+    id = db.Column(ROW_ID, primary_key=True, default=shard_row_id)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     category = db.Column(db.String(50), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    kind = db.Column(db.String(20), nullable=False)  # low_budget|over_budget|forecast_over|rejected_expense
+    spent = db.Column(db.Float, nullable=False)
+    fired_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+class SchemaVersion(db.Model):
+    # Single row stamped by backend.migrate; boot skips schema work when current
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    applied_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+class ArchiveSummary(db.Model):
+    # Totals of the expenses moved to archive files (see backend.archive)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ArchivedMonth(db.Model):
+    # The archive file currently holding a user's archived expenses for a month
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    path = db.Column(db.String(200), nullable=False)  # relative to ARCHIVE_DIR
+    rows = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+class SplitShare(db.Model):
+    # One debtor's share of a split expense; expense ids are unique across shards
+    __table_args__ = (
+        db.Index("ix_split_share_payer_expense", "payer_id", "expense_id"),
+        db.Index("ix_split_share_debtor", "debtor_id"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    expense_id = db.Column(ROW_ID, nullable=False)
+    payer_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    debtor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    date = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD
+    created_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+class Balance(db.Model):
+    # Pairwise net debt, maintained by backend.ledger on every share.
+    # user_a < user_b; positive net means user_b owes user_a.
+    __table_args__ = (
+        db.Index("ix_balance_user_b", "user_b"),
+    )
+    user_a = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    user_b = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    net = db.Column(db.Float, nullable=False, default=0.0)
+
+class IdBlock(db.Model):
+    # Highest id each sharded table has handed out in this database (see backend.db.shard_row_id)
+    name = db.Column(db.String(50), primary_key=True)  # table name
+    high = db.Column(ROW_ID, nullable=False)
+
+class ShardLayout(db.Model):
+    # How many shards the per-user tables are currently spread over (see backend.sharding)
+    id = db.Column(db.Integer, primary_key=True)
+    shards = db.Column(db.Integer, nullable=False)
+    rebalancing_to = db.Column(db.Integer)  # set while a rebalance is moving rows
+    updated_at = db.Column(db.Float, nullable=False)  # epoch seconds
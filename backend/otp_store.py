@@ -0,0 +1,193 @@
+# otp_store.py
+# Signup OTPs behind a small interface. The SQLite store keeps codes in the
+# app database so every gunicorn worker sees them; the memory store is for
+# single-process runs and tests. Both count failed attempts, throttle resends
+# and sweep expired entries in bulk.
+import abc
+import hashlib
+import heapq
+import hmac
+import threading
+import time
+
+from backend.db import db
+from backend.models import OtpEntry
+
+OK = "ok"
+MISSING = "missing"
+EXPIRED = "expired"
+INVALID = "invalid"
+LOCKED = "locked"
+
+
+class OTPThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__("OTP requested too recently")
+        self.retry_after = retry_after
+
+
+def _digest(otp):
+    return hashlib.sha256(str(otp).encode("utf-8")).hexdigest()
+
+
+class OTPStore(abc.ABC):
+    """Interface: issue a code, verify it, discard it once used"""
+
+    def __init__(self, ttl=300, max_attempts=5, resend_interval=60, sweep_interval=60):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.resend_interval = resend_interval
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+    @abc.abstractmethod
+    def issue(self, email, otp):
+        """Store a new code for email, raising OTPThrottled if one was issued too recently"""
+
+    @abc.abstractmethod
+    def verify(self, email, otp):
+        """Return OK, MISSING, EXPIRED, INVALID or LOCKED. A good code stays stored until discard()."""
+
+    @abc.abstractmethod
+    def discard(self, email):
+        """Forget the code for email"""
+
+    @abc.abstractmethod
+    def sweep(self):
+        """Delete every expired entry. Returns the number removed."""
+
+    def maybe_sweep(self, now):
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep()
+
+    def _check(self, entry_hash, expires_at, attempts, otp, now):
+        if expires_at <= now:
+            return EXPIRED
+        if attempts >= self.max_attempts:
+            return LOCKED
+        if hmac.compare_digest(entry_hash, _digest(otp)):
+            return OK
+        return INVALID
+
+
+class MemoryOTPStore(OTPStore):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._entries = {}  # email -> [otp_hash, issued_at, expires_at, attempts]
+        self._expiry = []   # heap of (expires_at, email)
+        self._lock = threading.Lock()
+
+    def issue(self, email, otp):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._entries.get(email)
+            if entry and now - entry[1] < self.resend_interval:
+                raise OTPThrottled(int(self.resend_interval - (now - entry[1])) + 1)
+            expires_at = now + self.ttl
+            self._entries[email] = [_digest(otp), now, expires_at, 0]
+            heapq.heappush(self._expiry, (expires_at, email))
+
+    def verify(self, email, otp):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._entries.get(email)
+            if not entry:
+                return MISSING
+            status = self._check(entry[0], entry[2], entry[3], otp, now)
+            if status == INVALID:
+                entry[3] += 1
+                if entry[3] >= self.max_attempts:
+                    del self._entries[email]
+                    return LOCKED
+            elif status in (EXPIRED, LOCKED):
+                del self._entries[email]
+            return status
+
+    def discard(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def sweep(self):
+        with self._lock:
+            return self._sweep(time.time())
+
+    def _sweep(self, now):
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, email = heapq.heappop(self._expiry)
+            entry = self._entries.get(email)
+            # Skip heap records left behind by a reissued code
+            if entry and entry[2] == expires_at:
+                del self._entries[email]
+                removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteOTPStore(OTPStore):
+    """Codes live in the otp_entry table of the app database"""
+
+    def issue(self, email, otp):
+        now = time.time()
+        self.maybe_sweep(now)
+        entry = db.session.get(OtpEntry, email)
+        if entry and entry.expires_at > now and now - entry.issued_at < self.resend_interval:
+            raise OTPThrottled(int(self.resend_interval - (now - entry.issued_at)) + 1)
+        if entry is None:
+            entry = OtpEntry(email=email)
+            db.session.add(entry)
+        entry.otp_hash = _digest(otp)
+        entry.issued_at = now
+        entry.expires_at = now + self.ttl
+        entry.attempts = 0
+        db.session.commit()
+
+    def verify(self, email, otp):
+        now = time.time()
+        entry = db.session.get(OtpEntry, email)
+        if not entry:
+            return MISSING
+        status = self._check(entry.otp_hash, entry.expires_at, entry.attempts, otp, now)
+        if status == INVALID:
+            # Increment in SQL so concurrent guesses from several workers all count
+            db.session.query(OtpEntry).filter_by(email=email).update(
+                {"attempts": OtpEntry.attempts + 1}, synchronize_session=False
+            )
+            db.session.commit()
+            if db.session.get(OtpEntry, email, populate_existing=True).attempts >= self.max_attempts:
+                self.discard(email)
+                return LOCKED
+        elif status in (EXPIRED, LOCKED):
+            self.discard(email)
+        return status
+
+    def discard(self, email):
+        db.session.query(OtpEntry).filter_by(email=email).delete()
+        db.session.commit()
+
+    def sweep(self):
+        removed = db.session.query(OtpEntry).filter(OtpEntry.expires_at <= time.time()).delete()
+        db.session.commit()
+        return removed
+
+
+def init_app(app):
+    cfg = app.config
+    options = {
+        "ttl": float(cfg.get("OTP_TTL", 300)),
+        "max_attempts": int(cfg.get("OTP_MAX_ATTEMPTS", 5)),
+        "resend_interval": float(cfg.get("OTP_RESEND_INTERVAL", 60)),
+    }
+    backend = cfg.get("OTP_STORE", "sqlite")
+    if backend == "memory":
+        store = MemoryOTPStore(**options)
+    elif backend == "sqlite":
+        store = SQLiteOTPStore(**options)
+    else:
+        raise ValueError(f"Unknown OTP_STORE: {backend}")
+    app.extensions["otp_store"] = store
@@ -0,0 +1,107 @@
+# pagination.py
+# Cursor-paginated listings. Cursors are opaque base64 tokens holding the last
+# row's sort key, so every page is an index seek rather than an OFFSET scan.
+import base64
+import json
+from datetime import date
+
+from sqlalchemy import func, tuple_
+
+from backend.db import db
+from backend.export import after_key, expense_filters
+from backend.models import ArchiveSummary, Budget, Expense, SpendRollup
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise CursorError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise CursorError("Invalid cursor")
+    return values
+
+
+def page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def _page(rows, limit, key):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_cursor(*key(rows[-1])) if has_more else None)
+
+
+def list_expenses(user_id, start_month=None, end_month=None, category=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    query = Expense.query.filter(*expense_filters(user_id, start_month, end_month, category))
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, 2)
+        try:
+            query = query.filter(after_key(date.fromisoformat(last_date), int(last_id)))
+        except (TypeError, ValueError):
+            raise CursorError("Invalid cursor")
+    rows = query.order_by(Expense.date, Expense.id).limit(limit + 1).all()
+    rows, next_cursor = _page(rows, limit, lambda e: (e.date.isoformat(), e.id))
+    items = [{"id": e.id, "date": e.date.isoformat(), "category": e.category, "amount": e.amount} for e in rows]
+    return items, next_cursor
+
+
+def _rollup_count(model, user_id, start_month, end_month, category):
+    query = db.session.query(func.coalesce(func.sum(model.count), 0)).filter(model.user_id == user_id)
+    if start_month or end_month:
+        query = query.filter(model.month.between(start_month or end_month, end_month or start_month))
+    if category:
+        query = query.filter(model.category == category)
+    return query.scalar()
+
+
+def count_expenses(user_id, start_month=None, end_month=None, category=None):
+    """Row count from the rollup; filters are month-grained so this is exact.
+    The listing only shows hot rows, so months moved out by backend.archive
+    are subtracted (export still includes them)."""
+    return (_rollup_count(SpendRollup, user_id, start_month, end_month, category)
+            - _rollup_count(ArchiveSummary, user_id, start_month, end_month, category))
+
+
+def _budget_filters(user_id, start_month, end_month, category):
+    filters = [Budget.user_id == user_id]
+    if start_month or end_month:
+        filters.append(Budget.month.between(start_month or end_month, end_month or start_month))
+    if category:
+        filters.append(Budget.category == category)
+    return filters
+
+
+def list_budgets(user_id, start_month=None, end_month=None, category=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # (month, category) is unique per user and matches the budget index order
+    query = Budget.query.filter(*_budget_filters(user_id, start_month, end_month, category))
+    if cursor:
+        last_month, last_category = decode_cursor(cursor, 2)
+        query = query.filter(tuple_(Budget.month, Budget.category) > tuple_(str(last_month), str(last_category)))
+    rows = query.order_by(Budget.month, Budget.category).limit(limit + 1).all()
+    rows, next_cursor = _page(rows, limit, lambda b: (b.month, b.category))
+    items = [{"id": b.id, "month": b.month, "category": b.category, "amount": b.amount,
+              "low_budget_percent": b.low_budget_percent} for b in rows]
+    return items, next_cursor
+
+
+def count_budgets(user_id, start_month=None, end_month=None, category=None):
+    """Counted from the (user_id, month, category) index, never the table"""
+    return db.session.query(func.count(Budget.id)).filter(
+        *_budget_filters(user_id, start_month, end_month, category)
+    ).scalar()
@@ -0,0 +1,121 @@
+# passwords.py
+# bcrypt runs on a small dedicated executor instead of the request worker.
+# Admission is bounded: once every worker is busy and the wait queue is full,
+# callers get HashingBusy (served as 503 + Retry-After) instead of piling up.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from backend import metrics
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class HashingBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Password hashing is saturated")
+        self.retry_after = retry_after
+
+
+class LatencyStats:
+    """Count, sum, max and cumulative bucket counts for one operation"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 2),
+                "buckets": {str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)},
+            }
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, queue_size=16, wait_timeout=0.5, retry_after=1):
+        self.rounds = rounds
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.rejected = 0
+        self.latency = {"hash": LatencyStats(), "check": LatencyStats()}
+        self.workers = workers
+        self._executor = None  # created on first use, so a preloaded app forks without it
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _run(self, op, fn, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            self.rejected += 1
+            raise HashingBusy(self.retry_after)
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        result = future.result()
+        elapsed = time.perf_counter() - started
+        self.latency[op].observe(elapsed)
+        metrics.add_bcrypt_time(elapsed)
+        return result
+
+    def hash(self, password):
+        hashed = self._run("hash", bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds))
+        return hashed.decode("utf-8")
+
+    def check(self, password, hashed):
+        return self._run("check", bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """True when a stored hash was made with a different cost than configured"""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "rejected": self.rejected,
+            **{op: stats.snapshot() for op, stats in self.latency.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def init_app(app):
+    cfg = app.config
+    app.extensions["passwords"] = PasswordHasher(
+        rounds=int(cfg.get("BCRYPT_ROUNDS", 12)),
+        workers=int(cfg.get("PASSWORD_HASH_WORKERS", 2)),
+        queue_size=int(cfg.get("PASSWORD_HASH_QUEUE", 16)),
+        wait_timeout=float(cfg.get("PASSWORD_HASH_WAIT", 0.5)),
+        retry_after=int(cfg.get("PASSWORD_HASH_RETRY_AFTER", 1)),
+    )
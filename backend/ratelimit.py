@@ -0,0 +1,289 @@
+# ratelimit.py
+# Token buckets per route and client, checked in before_request so a rejected
+# request never reaches the database or bcrypt. A rule is (scope, capacity,
+# period): the bucket holds up to capacity tokens and refills capacity per
+# period seconds. The scope keys the bucket by client IP, or by the user id in
+# the bearer token ("user", falling back to the IP without a valid token).
+#
+# The memory store is per process; the SQLite store keeps buckets in a small
+# file of its own so every gunicorn worker draws from the same bucket without
+# touching the app database's write lock.
+#
+# Load shedding caps the requests in flight per process (MAX_IN_FLIGHT) and
+# answers 503 beyond it, before any other work is done.
+import abc
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, jsonify, request
+
+from backend.db import is_sqlite_file
+from backend.tokens import decode_token
+
+IP = "ip"
+USER = "user"
+
+# endpoint -> rules; RATE_LIMITS entries replace these per endpoint
+DEFAULT_RULES = {
+    "signup_request": [(IP, 5, 600)],     # each one emails an OTP
+    "signup_verify": [(IP, 20, 600)],
+    "signup_plain": [(IP, 10, 600)],
+    "login": [(IP, 20, 60)],              # bcrypt per attempt
+    "auth.google_auth": [(IP, 20, 60)],
+    "add_expense": [(USER, 120, 60)],
+    "import_expenses_bulk": [(USER, 10, 60)],
+    "export_expenses": [(USER, 10, 60)],
+    "settle_group": [(USER, 30, 60)],
+}
+# Monitoring keeps working while the app sheds load
+UNLIMITED_ENDPOINTS = {"prometheus_metrics", "internal_stats", "static"}
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+
+
+def parse_rules(text):
+    """'login=ip:20/60;add_expense=user:120/60,ip:600/60' -> {endpoint: rules}.
+    An endpoint with nothing after '=' is left unlimited."""
+    rules = {}
+    for entry in filter(None, (e.strip() for e in (text or "").split(";"))):
+        endpoint, _, specs = entry.partition("=")
+        rules[endpoint.strip()] = []
+        for spec in filter(None, (s.strip() for s in specs.split(","))):
+            scope, _, limit = spec.partition(":")
+            capacity, _, period = limit.partition("/")
+            if scope not in (IP, USER):
+                raise ValueError(f"Unknown rate limit scope {scope!r} in {entry!r}")
+            rules[endpoint.strip()].append((scope, int(capacity), float(period)))
+    return rules
+
+
+def _retry_after(tokens, rate):
+    return int((1 - tokens) / rate) + 1
+
+
+class BucketStore(abc.ABC):
+    """Interface: take one token from a bucket or raise RateLimited"""
+
+    @abc.abstractmethod
+    def take(self, key, capacity, period):
+        """Take one token, raising RateLimited when the bucket is empty"""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Buckets currently stored"""
+
+
+class MemoryBucketStore(BucketStore):
+    def __init__(self, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._buckets = {}  # key -> [tokens, updated, full_at]
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        now = time.monotonic()
+        rate = capacity / period
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            if tokens < 1:
+                raise RateLimited(_retry_after(tokens, rate))
+            tokens -= 1
+            self._buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+
+    def _sweep(self, now):
+        # A bucket that has refilled is the same as no bucket at all
+        self._next_sweep = now + self.sweep_interval
+        for key in [k for k, b in self._buckets.items() if b[2] <= now]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in a separate SQLite file shared by every worker. Refill and
+    take happen in one conditional upsert, so concurrent workers never hand
+    out the same token twice."""
+
+    TAKE = """
+        INSERT INTO bucket (key, tokens, updated) VALUES (:key, :capacity - 1, :now)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:capacity, tokens + (:now - updated) * :rate) - 1,
+            updated = :now
+        WHERE min(:capacity, tokens + (:now - updated) * :rate) >= 1
+        RETURNING tokens
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, sweep_interval=60):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS bucket "
+                     "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")  # losing a few buckets in a crash is harmless
+        return conn
+
+    def _conn(self):
+        # One connection per thread, and never one inherited across fork
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+        return local.conn
+
+    def take(self, key, capacity, period):
+        now = time.time()
+        rate = capacity / period
+        conn = self._conn()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            conn.execute("DELETE FROM bucket WHERE tokens + (? - updated) * ? >= ?", (now, rate, capacity))
+        params = {"key": key, "capacity": capacity, "now": now, "rate": rate}
+        if conn.execute(self.TAKE, params).fetchone() is None:
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = min(capacity, row[0] + (now - row[1]) * rate) if row else 0.0
+            raise RateLimited(_retry_after(tokens, rate))
+
+    def __len__(self):
+        return self._conn().execute("SELECT count(*) FROM bucket").fetchone()[0]
+
+
+class RateLimiter:
+    def __init__(self, store, rules, max_in_flight=0, forwarded_for=False):
+        self.store = store
+        self.rules = rules
+        self.max_in_flight = max_in_flight
+        self.forwarded_for = forwarded_for
+        self.in_flight = 0
+        self.allowed = 0
+        self.limited = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def client_ip(self):
+        """The address our proxy saw: it appends that hop last to X-Forwarded-For,
+        while everything left of it is whatever the client chose to send"""
+        if self.forwarded_for and request.headers.get("X-Forwarded-For"):
+            return request.headers["X-Forwarded-For"].split(",")[-1].strip()
+        return request.remote_addr or "-"
+
+    def client_user(self):
+        """User id from the bearer token; signature checked, user not loaded"""
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            return None
+        try:
+            return decode_token(header[7:]).get("user_id")
+        except Exception:
+            return None
+
+    def enter(self):
+        """Count the request in; False when the process is already at capacity"""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def check(self, endpoint):
+        rules = self.rules.get(endpoint)
+        if not rules or self.store is None:
+            return
+        try:
+            for scope, capacity, period in rules:
+                user_id = self.client_user() if scope == USER else None
+                client = f"user:{user_id}" if user_id is not None else f"ip:{self.client_ip()}"
+                self.store.take(f"{endpoint}|{scope}|{client}", capacity, period)
+        except RateLimited:
+            with self._lock:
+                self.limited += 1
+            raise
+        with self._lock:
+            self.allowed += 1
+
+    def stats(self):
+        return {
+            "store": type(self.store).__name__ if self.store else "off",
+            "buckets": len(self.store) if self.store else 0,
+            "in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+            "allowed": self.allowed, "limited": self.limited, "shed": self.shed,
+        }
+
+
+def _retry_response(message, status, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def sqlite_path(app):
+    """Bucket file: RATE_LIMIT_SQLITE_PATH, else next to the main SQLite database"""
+    if app.config.get("RATE_LIMIT_SQLITE_PATH"):
+        return app.config["RATE_LIMIT_SQLITE_PATH"]
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not is_sqlite_file(uri):
+        raise ValueError("RATE_LIMIT_SQLITE_PATH is required when the database is not a SQLite file")
+    return f"{os.path.splitext(uri[len('sqlite:///'):])[0]}-ratelimit.db"
+
+
+def init_app(app):
+    cfg = app.config
+    backend = cfg.get("RATE_LIMIT_STORE", "memory")
+    if backend == "memory":
+        store = MemoryBucketStore()
+    elif backend == "sqlite":
+        store = SQLiteBucketStore(sqlite_path(app), int(cfg.get("SQLITE_BUSY_TIMEOUT_MS", 5000)))
+    elif backend == "off":
+        store = None
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_STORE: {backend}")
+    rules = cfg.get("RATE_LIMITS")
+    if isinstance(rules, str):
+        rules = parse_rules(rules)
+    limiter = RateLimiter(
+        store, {**DEFAULT_RULES, **(rules or {})},
+        max_in_flight=int(cfg.get("MAX_IN_FLIGHT", 0)),
+        forwarded_for=bool(cfg.get("RATE_LIMIT_FORWARDED_FOR", False)),
+    )
+    app.extensions["ratelimit"] = limiter
+
+    @app.before_request
+    def limit_request():
+        if request.endpoint in UNLIMITED_ENDPOINTS:
+            return None
+        if not limiter.enter():
+            return _retry_response("Server busy, please retry shortly", 503, 1)
+        g.rate_counted = True
+        try:
+            limiter.check(request.endpoint)
+        except RateLimited as e:
+            return _retry_response("Too many requests, please slow down", 429, e.retry_after)
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        if g.pop("rate_counted", False):
+            limiter.leave()
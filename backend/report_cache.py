@@ -0,0 +1,103 @@
+# report_cache.py
+# Reports only change when a user's expenses or budgets do. Writers bump a
+# per-user version in their own transaction; reports are cached per
+# (user, report key) together with the version they were built from and served
+# with an ETag, so an unchanged poll costs one primary-key lookup.
+import threading
+import time
+from collections import OrderedDict
+
+from backend.db import db, upsert
+from backend.models import DataVersion
+
+
+def bump_version(user_id):
+    """Mark a user's data as changed. Runs in the caller's transaction, no commit."""
+    stmt = upsert(DataVersion).values(user_id=user_id, version=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"version": DataVersion.version + 1},
+    ))
+
+
+def current_version(user_id):
+    version = db.session.query(DataVersion.version).filter(DataVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def etag_for(user_id, version):
+    return f"r{user_id}-{version}"
+
+
+class ReportCache:
+    """LRU of built reports; an entry only answers for the version it was built at"""
+
+    def __init__(self, maxsize=2048, ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds; 0 keeps entries until evicted or outdated
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()  # (user_id, key) -> (version, expires_at, report)
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize, ttl):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.not_modified = 0
+
+    def get(self, user_id, key, version, builder):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry and entry[0] == version and (not entry[1] or entry[1] > now):
+                self._entries.move_to_end((user_id, key))
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        report = builder()
+        if self.maxsize <= 0:
+            return report
+        with self._lock:
+            current = self._entries.get((user_id, key))
+            # A concurrent request may already have stored a newer build
+            if not current or current[0] <= version:
+                self._entries[(user_id, key)] = (version, now + self.ttl if self.ttl else 0, report)
+                self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return report
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size, "maxsize": self.maxsize, "ttl": self.ttl,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+report_cache = ReportCache()
+
+
+def init_app(app):
+    report_cache.configure(
+        maxsize=int(app.config.get("REPORT_CACHE_SIZE", 2048)),
+        ttl=float(app.config.get("REPORT_CACHE_TTL", 0)),
+    )
@@ -1,23 +1,95 @@
 # reports.py
-from backend.models import Expense, Budget
+from datetime import datetime
+
+from sqlalchemy import Float, func, literal, select, union_all
+
+from backend.models import Budget, SpendRollup
 from backend.db import db
-from sqlalchemy import func
+
+MAX_REPORT_MONTHS = 120
+
+
+def parse_month(value):
+    """Validate a YYYY-MM string, returning it normalized"""
+    return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+
+
+def month_range(start, end):
+    """All YYYY-MM keys from start to end inclusive"""
+    year, month = int(start[:4]), int(start[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= end:
+        months.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+def _grouped_rows(user_id, start, end):
+    """One statement: (month, category, spent, budget) for every month/category
+    that has spending or a budget. budget is None when no budget is set."""
+    spent = select(
+        SpendRollup.month, SpendRollup.category,
+        SpendRollup.total.label("spent"), literal(None, Float).label("budget")
+    ).where(
+        SpendRollup.user_id == user_id,
+        SpendRollup.month.between(start, end)
+    )
+    budgets = select(
+        Budget.month, Budget.category,
+        literal(0.0).label("spent"), Budget.amount.label("budget")
+    ).where(
+        Budget.user_id == user_id,
+        Budget.month.between(start, end)
+    )
+    rows = union_all(spent, budgets).subquery()
+    query = select(
+        rows.c.month, rows.c.category,
+        func.sum(rows.c.spent), func.max(rows.c.budget)
+    ).group_by(rows.c.month, rows.c.category).order_by(rows.c.month, rows.c.category)
+    return db.session.execute(query).all()
+
+
+def month_report(user_id, month):
+    """Total spent plus spent-vs-budget for every budgeted category"""
+    total = 0.0
+    breakdown = {}
+    for _, category, spent, budget in _grouped_rows(user_id, month, month):
+        total += spent or 0.0
+        if budget is not None:
+            breakdown[category] = {"spent": spent or 0.0, "budget": budget}
+    return {"total": total, "breakdown": breakdown}
+
+
+def range_report(user_id, start, end):
+    """Month x category matrices for start..end (inclusive)"""
+    months = month_range(start, end)
+    month_idx = {m: i for i, m in enumerate(months)}
+    # Rows stored with a non-normalized month ("2025-1") have no column here
+    rows = [row for row in _grouped_rows(user_id, start, end) if row[0] in month_idx]
+    categories = sorted({category for _, category, _, _ in rows})
+
+    cat_idx = {c: i for i, c in enumerate(categories)}
+    spent = [[0.0] * len(categories) for _ in months]
+    budget = [[None] * len(categories) for _ in months]
+    for month, category, month_spent, month_budget in rows:
+        i, j = month_idx[month], cat_idx[category]
+        spent[i][j] = month_spent or 0.0
+        budget[i][j] = month_budget
+
+    return {
+        "months": months,
+        "categories": categories,
+        "total": [sum(row) for row in spent],
+        "spent": spent,
+        "budget": budget,
+    }
+
 
 def monthly_total(user_id, month):
-    total = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.user_id==user_id,
-        Expense.date.like(f"{month}%")
-    ).scalar() or 0.0
-    return total
+    return month_report(user_id, month)["total"]
+
 
 def spending_vs_budget(user_id, month):
-    budgets = Budget.query.filter_by(user_id=user_id, month=month).all()
-    report = {}
-    for b in budgets:
-        spent = db.session.query(func.sum(Expense.amount)).filter(
-            Expense.user_id==user_id,
-            Expense.category==b.category,
-            Expense.date.like(f"{month}%")
-        ).scalar() or 0.0
-        report[b.category] = {"spent": spent, "budget": b.amount}
-    return report
\ No newline at end of file
+    return month_report(user_id, month)["breakdown"]
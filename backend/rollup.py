@@ -0,0 +1,159 @@
+# rollup.py
+import argparse
+import sys
+
+from sqlalchemy import func, select, union_all
+
+from backend.db import db, upsert, shard_indexes, on_shard
+from backend.models import ArchiveSummary, Expense, SpendRollup
+
+
+def expense_month(column, dialect=None):
+    """SQL expression for the YYYY-MM key of an expense date"""
+    if (dialect or db.engine.dialect.name) == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def _upsert_statement():
+    stmt = upsert(SpendRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "category", "month"],
+        set_={
+            "total": SpendRollup.total + stmt.excluded.total,
+            "count": SpendRollup.count + stmt.excluded.count,
+        },
+    )
+
+
+def record_expense(user_id, category, month, amount, count=1):
+    """Add an expense to the rollup. Runs in the caller's transaction, no commit."""
+    record_totals([{"user_id": user_id, "category": category, "month": month,
+                    "total": amount, "count": count}])
+
+
+def record_totals(rows):
+    """Add many pre-aggregated {user_id, category, month, total, count} rows in one executemany"""
+    if rows:
+        db.session.execute(_upsert_statement(), rows)
+
+
+def ensure_row(user_id, category, month):
+    """Create an empty rollup row if missing. True if it was created. Caller's transaction."""
+    stmt = upsert(SpendRollup).values(user_id=user_id, category=category, month=month, total=0.0, count=0)
+    return db.session.execute(stmt.on_conflict_do_nothing(index_elements=["user_id", "category", "month"])).rowcount == 1
+
+
+def reserve(user_id, category, month, amount, limit):
+    """Atomically add one expense of amount unless the total would pass limit.
+
+    The check and the increment are one conditional UPDATE, so concurrent
+    writers cannot both squeeze under the limit. Returns the new total, or
+    None when the budget would be exceeded. Caller's transaction, no commit."""
+    table = SpendRollup.__table__
+    stmt = table.update().where(
+        table.c.user_id == user_id,
+        table.c.category == category,
+        table.c.month == month,
+        table.c.total + amount <= limit,
+    ).values(total=table.c.total + amount, count=table.c.count + 1).returning(table.c.total)
+    new_total = db.session.execute(stmt).scalar()
+    if new_total is None and ensure_row(user_id, category, month):
+        # Budgets from before add_budget created the row start at zero
+        new_total = db.session.execute(stmt).scalar()
+    return new_total
+
+
+def spent(user_id, category, month):
+    """Total spent by a user in one category for a month"""
+    total = db.session.query(SpendRollup.total).filter_by(
+        user_id=user_id, category=category, month=month
+    ).scalar()
+    return total or 0.0
+
+
+def month_total(user_id, month):
+    """Total spent by a user across all categories for a month"""
+    total = db.session.query(func.sum(SpendRollup.total)).filter(
+        SpendRollup.user_id == user_id,
+        SpendRollup.month == month
+    ).scalar()
+    return total or 0.0
+
+
+def _totals_from_expenses():
+    """Hot expenses plus what backend.archive moved out, per (user, category, month)"""
+    month = expense_month(Expense.date)
+    hot = select(
+        Expense.user_id, Expense.category, month.label("month"),
+        func.sum(Expense.amount).label("total"), func.count(Expense.id).label("count")
+    ).group_by(Expense.user_id, Expense.category, month)
+    archived = select(ArchiveSummary.user_id, ArchiveSummary.category, ArchiveSummary.month,
+                      ArchiveSummary.total, ArchiveSummary.count)
+    rows = union_all(hot, archived).subquery()
+    return select(
+        rows.c.user_id, rows.c.category, rows.c.month, func.sum(rows.c.total), func.sum(rows.c.count)
+    ).group_by(rows.c.user_id, rows.c.category, rows.c.month)
+
+
+def rebuild():
+    """Recompute the whole rollup from the Expense table and archived totals. Returns rows written."""
+    db.session.query(SpendRollup).delete()
+    db.session.execute(
+        SpendRollup.__table__.insert().from_select(
+            ["user_id", "category", "month", "total", "count"],
+            _totals_from_expenses()
+        )
+    )
+    db.session.commit()
+    return db.session.query(func.count()).select_from(SpendRollup).scalar()
+
+
+def verify(tolerance=1e-6):
+    """Compare the rollup against Expense (and archived totals). Returns a list of mismatches."""
+    expected = {(u, c, m): (t, n) for u, c, m, t, n in db.session.execute(_totals_from_expenses())}
+    actual = {
+        (r.user_id, r.category, r.month): (r.total, r.count)
+        for r in SpendRollup.query.filter(SpendRollup.count > 0)
+    }
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        exp_total, exp_count = expected.get(key, (0.0, 0))
+        got_total, got_count = actual.get(key, (0.0, 0))
+        if exp_count != got_count or abs(exp_total - got_total) > tolerance:
+            user_id, category, month = key
+            mismatches.append({
+                "user_id": user_id, "category": category, "month": month,
+                "expected": {"total": exp_total, "count": exp_count},
+                "actual": {"total": got_total, "count": got_count},
+            })
+    return mismatches
+
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Maintain the spend rollup table")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.command == "rebuild":
+            rows = 0
+            for shard in shard_indexes():
+                with on_shard(shard):
+                    rows += rebuild()
+            print(f"✅ Rollup rebuilt: {rows} rows")
+        else:
+            problems = []
+            for shard in shard_indexes():
+                with on_shard(shard):
+                    problems += verify()
+            for p in problems:
+                print(f"❌ {p['user_id']}/{p['category']}/{p['month']}: "
+                      f"expected {p['expected']}, found {p['actual']}")
+            if problems:
+                sys.exit(1)
+            print("✅ Rollup matches expenses")
@@ -0,0 +1,238 @@
+# sharding.py
+# Spreads the per-user tables (backend.db.SHARDED_TABLES) over SHARD_COUNT
+# SQLite files so writes for different users stop queueing on one file lock.
+# A user's rows all live in shard user_id % SHARD_COUNT; users, auth and the
+# email outbox stay in the main database. Shards are ordinary Flask-SQLAlchemy
+# binds ("shard0", "shard1", ...) chosen per statement by backend.db's session.
+#
+# The main database records how many shards the data is spread over. Boot
+# refuses to start when SHARD_COUNT disagrees; move the data first (offline):
+#
+#   python -m backend.sharding rebalance --shards 4
+#   python -m backend.sharding status
+import argparse
+import os
+import time
+
+from sqlalchemy import create_engine, delete, func, inspect, select
+
+from backend.db import (db, upsert, write_transaction, is_sqlite_file, sqlite_engine_options,
+                        ShardingError, SHARDED_TABLES, shard_key)
+from backend.models import ShardLayout
+from backend import migrate
+
+# Users moved per statement; stays below SQLite's 999 bound-parameter limit
+MOVE_CHUNK_SIZE = 500
+
+
+def shard_url(app, index):
+    """Database URL of shard index: SHARD_URL_TEMPLATE ({n} = index), or the
+    main SQLite file's name with -shard<n> appended"""
+    template = app.config.get("SHARD_URL_TEMPLATE")
+    if not template:
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        if not is_sqlite_file(uri):
+            raise ShardingError("SHARD_URL_TEMPLATE is required unless the main database is a SQLite file")
+        root, ext = os.path.splitext(uri)
+        template = root + "-shard{n}" + (ext or ".db")
+    return template.format(n=index)
+
+
+def shard_binds(app):
+    """SQLALCHEMY_BINDS entries for the configured shards"""
+    count = int(app.config.get("SHARD_COUNT", 1))
+    if count <= 1:
+        return {}
+    binds = {}
+    for index in range(count):
+        url = shard_url(app, index)
+        options = {"url": url}
+        if is_sqlite_file(url) and app.config.get("SQLITE_PROFILE", "production") == "production":
+            options.update(sqlite_engine_options(app))
+        binds[shard_key(index)] = options
+    return binds
+
+
+def _layout_row(engine):
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(ShardLayout.__tablename__):
+            return None
+        return conn.execute(select(ShardLayout.shards, ShardLayout.rebalancing_to)
+                            .where(ShardLayout.id == 1)).first()
+
+
+def layout(engine):
+    """Shard count recorded in the main database, or None if never recorded"""
+    row = _layout_row(engine)
+    return row.shards if row else None
+
+
+def record_layout(engine, shards, rebalancing_to=None):
+    stmt = upsert(ShardLayout).values(id=1, shards=shards, rebalancing_to=rebalancing_to, updated_at=time.time())
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"shards": shards, "rebalancing_to": rebalancing_to, "updated_at": stmt.excluded.updated_at},
+        ))
+
+
+def _has_user_data(engine):
+    with engine.connect() as conn:
+        for name in ("expense", "budget"):
+            table = db.metadata.tables[name]
+            if inspect(conn).has_table(name) and conn.execute(select(table.c.id).limit(1)).first():
+                return True
+    return False
+
+
+def check_layout(app):
+    """Boot-time check that the data is where SHARD_COUNT says it is.
+    A database that never recorded a layout holds everything in the main file."""
+    configured = int(app.config.get("SHARD_COUNT", 1))
+    recorded = layout(db.engine)
+    if recorded is None:
+        if configured <= 1:
+            return
+        if _has_user_data(db.engine):
+            raise ShardingError(f"The main database still holds per-user data; "
+                                f"run python -m backend.sharding rebalance --shards {configured}")
+        with write_transaction():
+            record_layout(db.engine, configured)
+        return
+    if recorded != max(configured, 1):
+        raise ShardingError(f"Data is spread over {recorded} shard(s) but SHARD_COUNT is {configured}; "
+                            f"run python -m backend.sharding rebalance --shards {configured}")
+
+
+class _Locations:
+    """Engines for every place per-user rows can be: None is the main database"""
+
+    def __init__(self, app):
+        self.app = app
+        self._engines = {None: db.engine}
+
+    def engine(self, index):
+        if index not in self._engines:
+            self._engines[index] = create_engine(shard_url(self.app, index))
+        return self._engines[index]
+
+    def dispose(self):
+        for index, engine in self._engines.items():
+            if index is not None:
+                engine.dispose()
+
+
+def _target(user_id, shards):
+    return user_id % shards if shards > 1 else None
+
+
+def _move_users(table, source, destination, user_ids):
+    """Copy these users' rows of one table to destination, then drop them at source.
+    The destination is cleared first, so a move interrupted between the two
+    steps is simply redone. Rows keep their ids, which split shares point at;
+    every database allocates from its own id block (backend.db.shard_row_id)."""
+    with source.connect() as conn:
+        rows = [dict(r) for r in conn.execute(select(table).where(table.c.user_id.in_(user_ids))).mappings()]
+    with destination.begin() as conn:
+        conn.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+        if rows:
+            conn.execute(table.insert(), rows)
+    with source.begin() as conn:
+        conn.execute(delete(table).where(table.c.user_id.in_(user_ids)))
+    return len(rows)
+
+
+def rebalance(app, shards, log=print):
+    """Move every user's rows to shard user_id % shards (or back into the main
+    database for shards=1) and record the new layout. Run with the app stopped."""
+    if migrate.schema_version(db.engine) != migrate.SCHEMA_VERSION:
+        raise ShardingError("Run python -m backend.migrate before rebalancing")
+    row = _layout_row(db.engine)
+    current = row.shards if row else 1
+    # Rows may also sit where an interrupted earlier rebalance was taking them
+    counts = {current, shards, (row.rebalancing_to if row else None) or 1}
+    sources = {_target(i, count) for count in counts for i in range(count)}
+    record_layout(db.engine, current, rebalancing_to=shards)
+    locations = _Locations(app)
+    moved = 0
+    try:
+        for index in range(shards if shards > 1 else 0):
+            engine = locations.engine(index)
+            migrate.create_shard_tables(engine)
+            migrate.stamp(engine)
+
+        for source_index in sorted(sources, key=_order):
+            source = locations.engine(source_index)
+            if not inspect(source).has_table("expense"):
+                continue
+            for name in sorted(SHARDED_TABLES):
+                table = db.metadata.tables[name]
+                with source.connect() as conn:
+                    user_ids = conn.execute(select(table.c.user_id).distinct()).scalars().all()
+                by_target = {}
+                for user_id in user_ids:
+                    target = _target(user_id, shards)
+                    if target != source_index:
+                        by_target.setdefault(target, []).append(user_id)
+                for target in sorted(by_target, key=_order):
+                    ids = by_target[target]
+                    for start in range(0, len(ids), MOVE_CHUNK_SIZE):
+                        chunk = ids[start:start + MOVE_CHUNK_SIZE]
+                        count = _move_users(table, source, locations.engine(target), chunk)
+                        moved += count
+                        log(f"  {name}: {count} rows of {len(chunk)} users "
+                            f"{_label(source_index)} -> {_label(target)}")
+        record_layout(db.engine, shards)
+    finally:
+        locations.dispose()
+    log(f"✅ Data spread over {shards} shard(s); {moved} rows moved")
+    return moved
+
+
+def _order(index):
+    return -1 if index is None else index
+
+
+def _label(index):
+    return "main" if index is None else f"shard{index}"
+
+
+def status(app):
+    """Rows per table in the main database and each configured shard"""
+    recorded = layout(db.engine) or 1
+    locations = _Locations(app)
+    report = {"layout": recorded, "locations": {}}
+    try:
+        for index in [None] + list(range(recorded if recorded > 1 else 0)):
+            engine = locations.engine(index)
+            counts = {}
+            with engine.connect() as conn:
+                for name in sorted(SHARDED_TABLES):
+                    if inspect(conn).has_table(name):
+                        counts[name] = conn.execute(select(func.count()).select_from(db.metadata.tables[name])).scalar()
+            report["locations"][_label(index)] = counts
+    finally:
+        locations.dispose()
+    return report
+
+
+if __name__ == "__main__":
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description="Spread per-user tables over SQLite shard files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    move = sub.add_parser("rebalance", help="Move rows so user_id % SHARDS picks their shard")
+    move.add_argument("--shards", type=int, required=True, help="New shard count (1 = main database only)")
+    sub.add_parser("status", help="Show the recorded layout and rows per location")
+    args = parser.parse_args()
+
+    # Neither command may trip the boot-time layout check it exists to fix
+    app = create_app({"SCHEMA_MIGRATE": "off", "SHARD_COUNT": 1, "OUTBOX_WORKERS": 0})
+    with app.app_context():
+        if args.command == "rebalance":
+            rebalance(app, max(args.shards, 1))
+        else:
+            s = status(app)
+            print(f"Layout: {s['layout']} shard(s)")
+            for name, counts in s["locations"].items():
+                print(f"  {name}: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
@@ -0,0 +1,23 @@
+# tokens.py
+import os
+
+import jwt
+from dotenv import load_dotenv
+from flask import current_app
+
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY", "secret123")
+
+
+def issue_token(user):
+    """Access token for a user. With AUTH_CLAIMS_IN_TOKEN the name and email ride
+    along so token_required can skip the user lookup entirely."""
+    payload = {"user_id": user.id}
+    if current_app.config.get("AUTH_CLAIMS_IN_TOKEN"):
+        payload["name"] = user.name
+        payload["email"] = user.email
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def decode_token(token):
+    return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
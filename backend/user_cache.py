@@ -0,0 +1,93 @@
+# user_cache.py
+# Per-process cache of the few User fields request handlers need, so
+# token_required does not hit the database on every authenticated request.
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event
+
+from backend.db import db
+from backend.models import User
+
+AuthUser = namedtuple("AuthUser", ["id", "name", "email"])
+
+
+class UserCache:
+    """LRU cache with a TTL; entries are dropped when the User row changes"""
+
+    def __init__(self, ttl=60, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # user_id -> (expires_at, AuthUser)
+        self._lock = threading.Lock()
+
+    def configure(self, ttl, maxsize):
+        with self._lock:
+            self.ttl = ttl
+            self.maxsize = maxsize
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get(self, user_id, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is None or self.maxsize <= 0:
+            return user
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size, "maxsize": self.maxsize, "ttl": self.ttl,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+
+def load_auth_user(user_id):
+    row = db.session.query(User.id, User.name, User.email).filter(User.id == user_id).first()
+    return AuthUser(*row) if row else None
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+
+def init_app(app):
+    user_cache.configure(
+        ttl=float(app.config.get("USER_CACHE_TTL", 60)),
+        maxsize=int(app.config.get("USER_CACHE_SIZE", 10000)),
+    )
@@ -0,0 +1,143 @@
+# user_resolver.py
+# Resolves lists of email addresses to users in a few chunked IN queries
+# instead of one query per address. Results, including "no such user", are
+# cached briefly per process so repeated group lists stay cheap.
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, func, inspect
+
+from backend.db import db
+from backend.models import User
+
+# Stays below SQLite's historical 999 bound-parameter limit
+IN_CHUNK_SIZE = 900
+
+ResolvedUser = namedtuple("ResolvedUser", ["id", "name", "email"])
+_MISSING = object()
+
+
+def normalize_email(address):
+    """Canonical lookup form of an address, or None if it cannot be one"""
+    if not isinstance(address, str):
+        return None
+    address = address.strip().lower()
+    if not address or "@" not in address:
+        return None
+    return address
+
+
+def unique_addresses(addresses):
+    """Normalized addresses in first-seen order, without duplicates or junk"""
+    seen = {}
+    for address in addresses:
+        email = normalize_email(address)
+        if email is not None:
+            seen.setdefault(email, None)
+    return list(seen)
+
+
+class UserResolver:
+    """email -> ResolvedUser (or None) with a TTL'd LRU covering both outcomes"""
+
+    def __init__(self, ttl=30, maxsize=50000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self._entries = OrderedDict()  # normalized email -> (expires_at, ResolvedUser or None)
+        self._lock = threading.Lock()
+
+    def configure(self, ttl, maxsize):
+        with self._lock:
+            self.ttl = ttl
+            self.maxsize = maxsize
+            self._entries.clear()
+            self.hits = self.misses = self.queries = 0
+
+    def resolve(self, addresses):
+        """Map every normalizable address to its ResolvedUser or None.
+        Keys are normalized emails; unusable addresses are left out."""
+        wanted = unique_addresses(addresses)
+        result = {}
+        now = time.monotonic()
+        with self._lock:
+            for email in wanted:
+                entry = self._entries.get(email, _MISSING)
+                if entry is not _MISSING and entry[0] > now:
+                    self._entries.move_to_end(email)
+                    result[email] = entry[1]
+            self.hits += len(result)
+            self.misses += len(wanted) - len(result)
+
+        pending = [email for email in wanted if email not in result]
+        if not pending:
+            return result
+
+        found = self._load(pending)
+        with self._lock:
+            for email in pending:
+                user = found.get(email)
+                result[email] = user
+                if self.maxsize > 0:
+                    self._entries[email] = (now + self.ttl, user)
+                    self._entries.move_to_end(email)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def _load(self, emails):
+        # Stored addresses keep the case they signed up with; ix_user_email_lower
+        # serves lower(email) lookups
+        found = {}
+        for start in range(0, len(emails), IN_CHUNK_SIZE):
+            chunk = emails[start:start + IN_CHUNK_SIZE]
+            self.queries += 1
+            rows = db.session.query(User.id, User.name, User.email) \
+                .filter(func.lower(User.email).in_(chunk)).order_by(User.id).all()
+            for row in rows:
+                found.setdefault(normalize_email(row.email), ResolvedUser(*row))
+        return found
+
+    def invalidate(self, email):
+        email = normalize_email(email)
+        if email is not None:
+            with self._lock:
+                self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size, "maxsize": self.maxsize, "ttl": self.ttl,
+            "hits": self.hits, "misses": self.misses, "queries": self.queries,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_resolver = UserResolver()
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_email(mapper, connection, target):
+    user_resolver.invalidate(target.email)
+    # An update may have changed the address itself
+    history = inspect(target).attrs.email.history
+    for old in history.deleted or ():
+        user_resolver.invalidate(old)
+
+
+def init_app(app):
+    user_resolver.configure(
+        ttl=float(app.config.get("EMAIL_CACHE_TTL", 30)),
+        maxsize=int(app.config.get("EMAIL_CACHE_SIZE", 50000)),
+    )
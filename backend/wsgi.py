@@ -1,4 +1,6 @@
 # wsgi.py
+# Built once per process; with gunicorn --preload that is once, before fork
+# (see gunicorn.conf.py).
 from backend.app import create_app
 
-app = create_app()
\ No newline at end of file
+app = create_app()
@@ -0,0 +1,163 @@
+# archive.py
+# Hot-table size and request latency before and after archiving old months:
+#
+#   python -m benchmarks.archive --users 1000 --months 48 --per-month 20 \
+#       --keep-months 12 --output archive.json
+#
+# A fresh database gets --months of history ending this month for every user,
+# then each read path is timed on random users (--samples requests each) with
+# the full history hot, and again after backend.archive moved everything
+# older than --keep-months out and the file was VACUUMed. Both databases are
+# VACUUMed before measuring, so file sizes compare like for like.
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import warnings
+from datetime import date
+
+import jwt
+
+from backend import archive, rollup
+from backend.app import create_app
+from backend.db import db
+from backend.forecast import shift_month
+from backend.models import Budget, Expense, User
+from backend.reports import month_range
+from backend.tokens import SECRET_KEY
+from benchmarks.seed import CATEGORIES, _insert
+
+
+def _config(uri):
+    return {"SQLALCHEMY_DATABASE_URI": uri, "OUTBOX_WORKERS": 0, "RATE_LIMIT_STORE": "off",
+            "PROPAGATE_EXCEPTIONS": False}
+
+
+def prepare(app, users, months, per_month, seed=42):
+    rng = random.Random(seed)
+    current = date.today().strftime("%Y-%m")
+    history = month_range(shift_month(current, -(months - 1)), current)
+    with app.app_context():
+        _insert(User.__table__, ({"id": i, "name": f"User {i}", "email": f"user{i}@bench.example.com",
+                                  "password": "-"} for i in range(1, users + 1)))
+        _insert(Budget.__table__, ({"user_id": i, "category": c, "month": current, "amount": 1e6,
+                                    "low_budget_percent": 10} for i in range(1, users + 1) for c in CATEGORIES))
+        _insert(Expense.__table__, (
+            {"user_id": i, "category": rng.choice(CATEGORIES), "amount": round(rng.uniform(1, 200), 2),
+             "date": date(int(m[:4]), int(m[5:]), rng.randint(1, 28))}
+            for m in history for i in range(1, users + 1) for _ in range(per_month)
+        ))
+        rollup.rebuild()
+
+
+def vacuum(app):
+    with app.app_context():
+        db.session.remove()
+        raw = db.engine.raw_connection()
+        try:
+            raw.cursor().execute("VACUUM")
+            raw.cursor().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            raw.close()
+
+
+def paths(months):
+    current = date.today().strftime("%Y-%m")
+    recent = shift_month(current, -11)
+    return {
+        "list_page": "/users/expenses?limit=50",
+        "list_month": f"/users/expenses?month={current}&limit=200",
+        "report_month": f"/users/reports?month={current}",
+        "report_range": f"/users/reports?from={shift_month(current, -(months - 1))}&to={current}",
+        "forecast": f"/users/forecast?month={current}",
+        "export_recent": f"/users/expenses/export?format=csv&from={recent}&to={current}",
+        "export_all": "/users/expenses/export?format=csv",
+    }
+
+
+def measure(app, users, months, samples, seed=7):
+    client = app.test_client()
+    rng = random.Random(seed)
+    result = {}
+    for name, path in paths(months).items():
+        timings = []
+        for _ in range(samples + 1):
+            user_id = rng.randint(1, users)
+            token = jwt.encode({"user_id": user_id}, SECRET_KEY, algorithm="HS256")
+            started = time.perf_counter()
+            res = client.get(path, headers={"Authorization": f"Bearer {token}"})
+            res.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+            assert res.status_code == 200, (path, res.status_code)
+        timings.pop(0)  # warm-up
+        result[name] = round(statistics.median(timings), 2)
+
+    with app.app_context():
+        started = time.perf_counter()
+        rollup.verify()
+        result["rollup_verify_full_scan"] = round((time.perf_counter() - started) * 1000, 2)
+        result["hot_rows"] = db.session.query(db.func.count(Expense.id)).scalar()
+        db.session.remove()
+    return result
+
+
+def run(users, months, per_month, keep_months, samples, log=print):
+    with tempfile.TemporaryDirectory(prefix="expense-archive-") as tmp:
+        db_path = os.path.join(tmp, "expenses.db")
+        app = create_app(_config(f"sqlite:///{db_path}"))
+        log(f"Seeding {users} users x {months} months x {per_month} expenses...")
+        prepare(app, users, months, per_month)
+        vacuum(app)
+        before = measure(app, users, months, samples)
+        before["db_bytes"] = os.path.getsize(db_path)
+
+        root = archive.archive_dir(app)
+        with app.app_context():
+            started = time.perf_counter()
+            summary = archive.run(root, keep_months, log=log)
+            seconds = time.perf_counter() - started
+            archived_bytes = archive.status(root)["archive_bytes"]
+        vacuum(app)
+        after = measure(app, users, months, samples)
+        after["db_bytes"] = os.path.getsize(db_path)
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        "dataset": {"users": users, "months": months, "per_month": per_month, "keep_months": keep_months},
+        "archive": {**summary, "seconds": round(seconds, 2), "archive_bytes": archived_bytes},
+        "before": before,
+        "after": after,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the effect of archiving old months")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=48, help="Months of history per user")
+    parser.add_argument("--per-month", type=int, default=20, help="Expenses per user per month")
+    parser.add_argument("--keep-months", type=int, default=12)
+    parser.add_argument("--samples", type=int, default=50, help="Requests per read path")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    r = run(args.users, args.months, args.per_month, args.keep_months, args.samples)
+    a = r["archive"]
+    print(f"Archived {a['rows']} expenses in {a['months']} user-months in {a['seconds']:.1f}s "
+          f"({a['archive_bytes'] / 1e6:.1f} MB of archive files)")
+    print(f"{'':<24}{'before':>12}{'after':>12}")
+    for key in r["before"]:
+        print(f"{key:<24}{r['before'][key]:>12}{r['after'][key]:>12}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(r, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# cold_start.py
+# Measures cold start to first request in fresh interpreters:
+#
+#   python -m benchmarks.cold_start --runs 5 --output cold_start.json
+#
+# "current" boots against a database already at SCHEMA_VERSION (the normal
+# worker boot: one version check); "fresh" boots against an empty file and so
+# pays for the full migration. Each phase is timed inside the child:
+# interpreter start + imports, create_app, and the first request.
+# "preloaded" forks workers from an app built once in this process, the way
+# gunicorn --preload does, and times fork to first response.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from backend.app import create_app
+imported = time.perf_counter()
+app = create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1], "OUTBOX_WORKERS": 0})
+created = time.perf_counter()
+status = app.test_client().get("/internal/stats").status_code
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (served - created) * 1000, "status": status}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def boot(uri):
+    """Boot one child process; returns its phase timings plus total wall time"""
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, uri], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def preloaded(uri, runs):
+    """Fork-to-first-response for workers forked from one prebuilt app"""
+    from backend.app import create_app
+    from backend.db import db
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "OUTBOX_WORKERS": 0})
+    samples = []
+    for _ in range(runs):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            # Same as gunicorn.conf.py's post_fork
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+            app.test_client().get("/internal/stats")
+            os.write(write_fd, str(time.perf_counter()).encode())
+            os._exit(0)
+        os.close(write_fd)
+        served = float(os.read(read_fd, 64))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        ms = (served - started) * 1000
+        samples.append({"import_ms": 0.0, "create_app_ms": 0.0, "first_request_ms": ms, "total_ms": ms})
+    return samples
+
+
+def summarize(samples):
+    return {key: round(statistics.median(s[key] for s in samples), 2)
+            for key in ("import_ms", "create_app_ms", "first_request_ms", "total_ms")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold start to first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="expense-cold-") as tmp:
+        current = f"sqlite:///{os.path.join(tmp, 'current.db')}"
+        boot(current)  # migrates it once
+        results["current"] = summarize([boot(current) for _ in range(args.runs)])
+        results["fresh"] = summarize([boot(f"sqlite:///{os.path.join(tmp, f'fresh{i}.db')}")
+                                      for i in range(args.runs)])
+        if hasattr(os, "fork"):
+            results["preloaded"] = summarize(preloaded(current, args.runs))
+
+    for name, r in results.items():
+        print(f"{name:<8} total={r['total_ms']:.0f}ms  import={r['import_ms']:.0f}ms  "
+              f"create_app={r['create_app_ms']:.1f}ms  first_request={r['first_request_ms']:.1f}ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# run.py
+# Backend benchmark runner:
+#
+#   python -m benchmarks.run --users 10000 --expenses 1000000 --budgets 50000 \
+#       --output results.json --baseline previous.json
+#
+# Seeds a SQLite file (reused across runs when the seed arguments match), then
+# drives each scenario through the Flask test client at every --threads level
+# and records throughput, p50/p95/p99 latency and SQL statements per request.
+# Outgoing mail goes to a local SMTP sink, so no network is needed. With
+# --baseline, scenarios whose p95 or throughput got worse by more than
+# --threshold are reported and the exit status is 1.
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import jwt
+
+from backend.app import create_app
+from backend.db import db
+from backend.tokens import SECRET_KEY
+from benchmarks import seed as seeding
+
+DEFAULT_THRESHOLD = 0.15
+
+
+class Scenario:
+    def __init__(self, name, method, rule, build, requests):
+        self.name = name
+        self.method = method
+        self.rule = rule
+        self.build = build  # (rng, dataset) -> (path, user_id or None, json body or None)
+        self.requests = requests
+
+
+def _user(rng, dataset):
+    return rng.randint(1, dataset["users"])
+
+
+def _budget_key(rng, dataset, user_id):
+    per_user = max(1, dataset["budgets"] // dataset["users"])
+    return rng.choice(seeding.budget_keys(user_id, per_user))
+
+
+def _add_expense(rng, dataset):
+    user_id = _user(rng, dataset)
+    category, month = _budget_key(rng, dataset, user_id)
+    body = {"category": category, "amount": round(rng.uniform(1, 50), 2), "date": f"{month}-{rng.randint(1, 28):02d}",
+            "split_emails": [seeding.user_email(_user(rng, dataset)) for _ in range(2)]}
+    return "/users/expenses", user_id, body
+
+
+def _report_month(rng, dataset):
+    user_id = _user(rng, dataset)
+    return f"/users/reports?month={_budget_key(rng, dataset, user_id)[1]}", user_id, None
+
+
+def _report_year(rng, dataset):
+    return "/users/reports?year=2025", _user(rng, dataset), None
+
+
+def _list_expenses(rng, dataset):
+    return "/users/expenses?limit=50", _user(rng, dataset), None
+
+
+def _login(rng, dataset):
+    return "/auth/login", None, {"email": seeding.user_email(_user(rng, dataset)), "password": seeding.PASSWORD}
+
+
+def _verify_emails(rng, dataset):
+    # Three in four addresses belong to real users
+    emails = [seeding.user_email(_user(rng, dataset)) if rng.random() < 0.75 else f"nobody{i}@example.com"
+              for i in range(20)]
+    return "/users/verify_emails", _user(rng, dataset), {"emails": emails}
+
+
+SCENARIOS = [
+    Scenario("add_expense", "POST", "/users/expenses", _add_expense, 1000),
+    Scenario("report_month", "GET", "/users/reports", _report_month, 1000),
+    Scenario("report_year", "GET", "/users/reports", _report_year, 1000),
+    Scenario("list_expenses", "GET", "/users/expenses", _list_expenses, 1000),
+    Scenario("verify_emails", "POST", "/users/verify_emails", _verify_emails, 1000),
+    # bcrypt dominates; fewer requests keep the run time reasonable
+    Scenario("login", "POST", "/auth/login", _login, 100),
+]
+
+
+class SinkHandler:
+    def __init__(self):
+        self.count = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.count += 1
+        return "250 OK"
+
+
+def start_mail_sink():
+    """Local SMTP server that accepts and discards everything, or None without aiosmtpd"""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        return None, None
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    handler = SinkHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller, handler
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _sql_totals(app, scenario):
+    series = app.extensions["metrics"].statements.series.get((scenario.rule, scenario.method))
+    return (series[-2], series[-1]) if series else (0, 0)
+
+
+def run_scenario(app, scenario, dataset, threads, requests, seed=0):
+    """Issue `requests` requests over `threads` threads and summarize the latencies"""
+    tokens = {}
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def headers_for(user_id):
+        if user_id is None:
+            return {}
+        token = tokens.get(user_id)
+        if token is None:
+            token = tokens[user_id] = jwt.encode({"user_id": user_id}, SECRET_KEY, algorithm="HS256")
+        return {"Authorization": f"Bearer {token}"}
+
+    def worker(index, count):
+        rng = random.Random(f"{seed}:{scenario.name}:{threads}:{index}")
+        client = app.test_client()
+        local, failed = [], []
+        for _ in range(count):
+            path, user_id, body = scenario.build(rng, dataset)
+            started = time.perf_counter()
+            res = client.open(path, method=scenario.method, json=body, headers=headers_for(user_id))
+            local.append(time.perf_counter() - started)
+            # A budget that is already spent legitimately answers 400 on add_expense
+            if res.status_code >= 500:
+                failed.append(res.status_code)
+        with lock:
+            latencies.extend(local)
+            errors.extend(failed)
+
+    sql_before = _sql_totals(app, scenario)
+    shares = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+    pool = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(shares)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    sql_after = _sql_totals(app, scenario)
+
+    latencies.sort()
+    statements = sql_after[0] - sql_before[0]
+    counted = sql_after[1] - sql_before[1]
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "sql_per_request": round(statements / counted, 2) if counted else None,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """List of regressions between two result documents (same scenario and thread count)"""
+    regressions = []
+    for name, levels in results["scenarios"].items():
+        for threads, current in levels.items():
+            previous = baseline.get("scenarios", {}).get(name, {}).get(threads)
+            if not previous:
+                continue
+            if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append({"scenario": name, "threads": threads, "metric": "p95_ms",
+                                    "baseline": previous["p95_ms"], "current": current["p95_ms"]})
+            if current["throughput"] < previous["throughput"] * (1 - threshold):
+                regressions.append({"scenario": name, "threads": threads, "metric": "throughput",
+                                    "baseline": previous["throughput"], "current": current["throughput"]})
+    return regressions
+
+
+def prepare_database(db_path, dataset, reseed=False, log=print):
+    """Create and seed db_path unless a matching seeded copy is already there"""
+    if not reseed and seeding.load_manifest(db_path) == dataset:
+        log(f"Reusing seeded database {db_path}")
+        return
+    for suffix in ("", "-wal", "-shm", ".json"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    log(f"Seeding {db_path}...")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}", "OUTBOX_WORKERS": 0})
+    started = time.perf_counter()
+    with app.app_context():
+        seeding.seed(**dataset, log=log)
+        db.session.remove()
+        db.engine.dispose()
+    log(f"Seeded in {time.perf_counter() - started:.1f}s")
+    seeding.write_manifest(db_path, dataset)
+
+
+def run(db_path, dataset, scenarios, thread_levels, requests=None, warmup=20, log=print):
+    controller, sink = start_mail_sink()
+    config = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "BCRYPT_ROUNDS": dataset["rounds"],
+        "PROPAGATE_EXCEPTIONS": False,
+        "RATE_LIMIT_STORE": "off",  # measure the app, not the limiter
+    }
+    if controller:
+        config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=controller.port, MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_DEFAULT_SENDER="bench@example.com")
+    else:
+        log("aiosmtpd not installed; mail delivery is suppressed")
+        config["MAIL_SUPPRESS_SEND"] = True
+    app = create_app(config)
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            count = requests or scenario.requests
+            if warmup:
+                run_scenario(app, scenario, dataset, 1, min(warmup, count), seed="warmup")
+            levels = results[scenario.name] = {}
+            for threads in thread_levels:
+                summary = run_scenario(app, scenario, dataset, threads, count, seed=dataset["seed"])
+                levels[str(threads)] = summary
+                log(f"{scenario.name:<15} threads={threads:<3} {summary['throughput']:>8.1f} req/s  "
+                    f"p50={summary['p50_ms']:.2f}ms p95={summary['p95_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms  "
+                    f"sql/req={summary['sql_per_request']}  errors={summary['errors']}")
+    finally:
+        app.extensions["outbox"].stop()
+        app.extensions["passwords"].shutdown()
+        if controller:
+            controller.stop()
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": dataset,
+            "emails_delivered": sink.count if sink else None,
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend against a seeded SQLite database")
+    parser.add_argument("--db", help="SQLite file to seed/reuse (default: a temporary file)")
+    parser.add_argument("--reseed", action="store_true", help="Seed again even if --db matches")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--expenses", type=int, default=1000000)
+    parser.add_argument("--budgets", type=int, default=50000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", help="Comma-separated subset of: " + ", ".join(s.name for s in SCENARIOS))
+    parser.add_argument("--threads", default="1,8", help="Comma-separated thread counts")
+    parser.add_argument("--requests", type=int, help="Requests per scenario and thread level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown before flagging (default 0.15)")
+    args = parser.parse_args(argv)
+    # The default development SECRET_KEY would otherwise warn on every token
+    warnings.filterwarnings("ignore", module="jwt")
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        wanted = args.scenarios.split(",")
+        unknown = set(wanted) - {s.name for s in SCENARIOS}
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [s for s in SCENARIOS if s.name in wanted]
+    thread_levels = [int(t) for t in args.threads.split(",")]
+    dataset = {"users": args.users, "expenses": args.expenses, "budgets": args.budgets,
+               "rounds": args.bcrypt_rounds, "seed": args.seed}
+
+    tmp_dir = tempfile.TemporaryDirectory(prefix="expense-bench-")
+    db_path = os.path.abspath(args.db or os.path.join(tmp_dir.name, "bench.db"))
+    try:
+        prepare_database(db_path, dataset, reseed=args.reseed)
+        # Writes go to a scratch copy so a reused seed stays identical between runs
+        work_path = os.path.join(tmp_dir.name, "work.db")
+        shutil.copyfile(db_path, work_path)
+        results = run(work_path, dataset, scenarios, thread_levels, requests=args.requests, warmup=args.warmup)
+    finally:
+        tmp_dir.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"❌ {r['scenario']} threads={r['threads']}: {r['metric']} "
+                  f"{r['baseline']} -> {r['current']}")
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# seed.py
+# Deterministic synthetic dataset for the benchmarks. Everything is derived from
+# the seed and the three sizes, so two runs with the same arguments produce the
+# same database. Rows go in through executemany batches and the spend rollup is
+# rebuilt once at the end, the same way a bulk import would leave it.
+import json
+import os
+import random
+from datetime import date
+
+import bcrypt
+
+from backend.db import db
+from backend.models import Budget, Expense, User
+from backend import rollup
+
+CATEGORIES = ["Food", "Rent", "Travel", "Utilities", "Health", "Shopping", "Fun", "Education"]
+MONTHS = [f"2025-{m:02d}" for m in range(1, 13)]
+PASSWORD = "bench-password"
+BATCH_SIZE = 20000
+
+
+def user_email(user_id):
+    return f"user{user_id}@bench.example.com"
+
+
+def budget_keys(user_id, per_user):
+    """The (category, month) pairs a user has budgets for, spread over the year"""
+    keys = []
+    for i in range(per_user):
+        category = CATEGORIES[(user_id + i) % len(CATEGORIES)]
+        month = MONTHS[(i // len(CATEGORIES) + user_id) % len(MONTHS)]
+        keys.append((category, month))
+    return keys
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(table, rows):
+    count = 0
+    for batch in _batches(rows):
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def seed(users=10000, expenses=1000000, budgets=50000, rounds=12, seed=42, log=print):
+    """Fill the bound (empty) database. Users are numbered 1..users."""
+    rng = random.Random(seed)
+    per_user = max(1, budgets // users)
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+    n = _insert(User.__table__, ({"id": i, "name": f"User {i}", "email": user_email(i), "password": hashed}
+                                 for i in range(1, users + 1)))
+    log(f"  {n} users")
+
+    n = _insert(Budget.__table__, ({"user_id": i, "category": c, "month": m,
+                                    "amount": float(rng.randrange(50000, 200000)), "low_budget_percent": 10}
+                                   for i in range(1, users + 1) for c, m in budget_keys(i, per_user)))
+    log(f"  {n} budgets")
+
+    def expense_rows():
+        for k in range(expenses):
+            user_id = k % users + 1
+            category, month = budget_keys(user_id, per_user)[rng.randrange(per_user)]
+            day = date(int(month[:4]), int(month[5:]), rng.randint(1, 28))
+            yield {"user_id": user_id, "category": category, "amount": round(rng.uniform(1, 200), 2),
+                   "date": day}
+
+    n = _insert(Expense.__table__, expense_rows())
+    log(f"  {n} expenses")
+
+    log(f"  {rollup.rebuild()} rollup rows")
+    db.session.commit()
+    return {"users": users, "expenses": expenses, "budgets": budgets, "rounds": rounds, "seed": seed}
+
+
+def load_manifest(db_path):
+    path = db_path + ".json"
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(db_path, manifest):
+    with open(db_path + ".json", "w") as f:
+        json.dump(manifest, f, indent=2)
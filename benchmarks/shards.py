@@ -0,0 +1,131 @@
+# shards.py
+# Write throughput against the number of shard files:
+#
+#   python -m benchmarks.shards --shards 1 2 4 --processes 4 --threads 2 \
+#       --requests 300 --output shards.json
+#
+# For each shard count a fresh database gets --users users with one large
+# budget each, then --processes forked workers (each its own app, like
+# gunicorn workers) post add_expense for random users from --threads threads.
+# Throughput is counted from the first worker's start to the last one's end.
+# Shards only pay off once the single file lock is the bottleneck: worker
+# processes on several cores, or slow commits (--synchronous FULL).
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import warnings
+
+import jwt
+
+from backend.app import create_app
+from backend.db import db, user_shard
+from backend.models import Budget, User
+from backend.tokens import SECRET_KEY
+from backend import rollup
+
+MONTH = "2025-03"
+
+
+def _config(uri, shards, synchronous):
+    return {"SQLALCHEMY_DATABASE_URI": uri, "SHARD_COUNT": shards, "SQLITE_SYNCHRONOUS": synchronous,
+            "OUTBOX_WORKERS": 0, "PROPAGATE_EXCEPTIONS": False, "RATE_LIMIT_STORE": "off"}
+
+
+def prepare(uri, shards, users, synchronous="NORMAL"):
+    app = create_app(_config(uri, shards, synchronous))
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {"id": i, "name": f"User {i}", "email": f"user{i}@bench.example.com", "password": "-"}
+            for i in range(1, users + 1)
+        ])
+        db.session.commit()
+        for i in range(1, users + 1):
+            with user_shard(i):
+                db.session.add(Budget(user_id=i, category="Food", month=MONTH, amount=1e12, low_budget_percent=1))
+                rollup.ensure_row(i, "Food", MONTH)
+                db.session.commit()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _worker(uri, shards, synchronous, users, threads, requests, seed, results):
+    warnings.simplefilter("ignore")
+    app = create_app(_config(uri, shards, synchronous))
+    tokens = {i: "Bearer " + jwt.encode({"user_id": i}, SECRET_KEY, algorithm="HS256") for i in range(1, users + 1)}
+    statuses = []
+
+    def post(thread_seed):
+        rng = random.Random(thread_seed)
+        client = app.test_client()
+        for _ in range(requests):
+            user_id = rng.randint(1, users)
+            res = client.post("/users/expenses", headers={"Authorization": tokens[user_id]},
+                              json={"category": "Food", "amount": 1, "date": f"{MONTH}-{rng.randint(1, 28):02d}"})
+            statuses.append(res.status_code)
+
+    workers = [threading.Thread(target=post, args=(seed * 1000 + t,)) for t in range(threads)]
+    started = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    results.put((statuses, started, time.time()))
+
+
+def run_count(shards, processes, threads, requests, users, synchronous="NORMAL"):
+    with tempfile.TemporaryDirectory(prefix="expense-shards-") as tmp:
+        uri = f"sqlite:///{os.path.join(tmp, 'expenses.db')}"
+        prepare(uri, shards, users, synchronous)
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(uri, shards, synchronous, users, threads, requests, p, results))
+                 for p in range(processes)]
+        for p in procs:
+            p.start()
+        outcomes = [results.get(timeout=600) for _ in procs]
+        for p in procs:
+            p.join()
+    statuses = [s for outcome in outcomes for s in outcome[0]]
+    elapsed = max(o[2] for o in outcomes) - min(o[1] for o in outcomes)
+    return {
+        "shards": shards,
+        "requests": len(statuses),
+        "errors": len(statuses) - statuses.count(200),
+        "seconds": round(elapsed, 3),
+        "writes_per_second": round(statuses.count(200) / elapsed, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure add_expense throughput per shard count")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=300, help="Per thread")
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLITE_SYNCHRONOUS; FULL fsyncs every commit")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore")
+
+    results = []
+    for shards in args.shards:
+        r = run_count(shards, args.processes, args.threads, args.requests, args.users, args.synchronous)
+        results.append(r)
+        print(f"shards={r['shards']:<3} {r['writes_per_second']:>8.1f} writes/s  "
+              f"{r['errors']} errors  ({r['requests']} requests in {r['seconds']:.1f}s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "processes": args.processes, "threads": args.threads,
+                       "synchronous": args.synchronous, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
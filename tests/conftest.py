@@ -0,0 +1,40 @@
+import bcrypt
+import jwt
+import pytest
+
+from backend.app import create_app, SECRET_KEY
+from backend.db import db
+from backend.models import User
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "OUTBOX_WORKERS": 0,
+        "BCRYPT_ROUNDS": 4,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'expenses.db'}",
+    })
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user and return (user_id, auth headers)"""
+    def _make(email="user@example.com", name="User", password="secret"):
+        with app.app_context():
+            hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8")
+            user = User(name=name, email=email, password=hashed)
+            db.session.add(user)
+            db.session.commit()
+            token = jwt.encode({"user_id": user.id}, SECRET_KEY, algorithm="HS256")
+            return user.id, {"Authorization": f"Bearer {token}"}
+    return _make
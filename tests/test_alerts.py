@@ -0,0 +1,87 @@
+from datetime import date
+
+from backend import alerts
+from backend.db import db
+from backend.models import AlertState, Budget, EmailOutbox, Expense
+from backend import rollup
+
+
+def _subjects(app):
+    with app.app_context():
+        return [r.subject for r in EmailOutbox.query.order_by(EmailOutbox.id)]
+
+
+def test_low_budget_warning_is_sent_once(app, client, make_user):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    statuses = [
+        client.post("/users/expenses", json={"category": "Food", "amount": amount, "date": "2025-03-02"},
+                    headers=headers).get_json()["status"]
+        for amount in (80, 11, 2, 3)
+    ]
+    assert statuses == ["success", "warning_90", "warning_90", "warning_90"]
+    assert _subjects(app) == ["[Expense Tracker] Low Budget Alert (Food)"]
+
+
+def test_rejected_expenses_alert_once(app, client, make_user):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    statuses = [
+        client.post("/users/expenses", json={"category": "Food", "amount": 150, "date": "2025-03-02"},
+                    headers=headers).get_json()["status"]
+        for _ in range(3)
+    ]
+    assert statuses == ["exceeded"] * 3
+    assert _subjects(app) == ["⚠️ Budget Exceeded — Food (2025-03)"]
+
+
+def test_real_overspend_alerts_after_a_rejected_expense(app, client, make_user):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    client.post("/users/expenses", json={"category": "Food", "amount": 150, "date": "2025-03-02"}, headers=headers)
+    # Imports are not capped by the budget; this one really takes spend to 110
+    client.post("/users/expenses/import", data="date,category,amount\n2025-03-03,Food,110\n", headers=headers,
+                content_type="text/csv")
+    assert _subjects(app) == ["⚠️ Budget Exceeded — Food (2025-03)", "[Expense Tracker] Budget Exceeded (Food)"]
+    with app.app_context():
+        assert {s.kind for s in AlertState.query.all()} == {alerts.REJECTED_EXPENSE, alerts.OVER_BUDGET}
+
+
+def test_low_budget_percent_moves_the_threshold(app, client, make_user, monkeypatch):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Fun", "month": "2025-03", "amount": 100,
+                                        "low_budget_percent": 50}, headers=headers)
+    res = client.post("/users/expenses", json={"category": "Fun", "amount": 60, "date": "2025-03-02"}, headers=headers)
+    assert res.get_json()["status"] == "warning_90"
+
+    monkeypatch.setenv("DEFAULT_LOW_BUDGET_PERCENT", "30")
+    assert alerts.classify(100, None, 69) == "ok"
+    assert alerts.classify(100, None, 70) == alerts.LOW_BUDGET
+    assert alerts.classify(100, 5, 70) == "ok"
+    assert alerts.classify(100, None, 101) == alerts.OVER_BUDGET
+
+
+def test_sweep_month_fires_each_threshold_once(app, make_user):
+    alice, _ = make_user("alice@example.com", "Alice")
+    bob, _ = make_user("bob@example.com", "Bob")
+    carol, _ = make_user("carol@example.com", "Carol")
+    with app.app_context():
+        for user_id in (alice, bob, carol):
+            db.session.add(Budget(user_id=user_id, category="Food", month="2025-03", amount=100))
+        db.session.add(Budget(user_id=alice, category="Food", month="2025-04", amount=100))
+        for user_id, amount in ((alice, 95), (bob, 150), (carol, 10)):
+            db.session.add(Expense(user_id=user_id, category="Food", amount=amount, date=date(2025, 3, 1)))
+        db.session.commit()
+        rollup.rebuild()
+        db.session.commit()
+
+        assert alerts.sweep_month("2025-03", notify=False)["queued"] == 0
+        summary = alerts.sweep_month("2025-03")
+        assert (summary["budgets"], summary["low_budget"], summary["over_budget"], summary["queued"]) == (3, 1, 1, 2)
+        assert {(s.user_id, s.kind) for s in AlertState.query.all()} == {(alice, "low_budget"), (bob, "over_budget")}
+
+        # Neither a second sweep nor the incremental path repeats them
+        assert alerts.sweep_month("2025-03")["queued"] == 0
+        assert alerts.check_budget(alice, "Food", "2025-03")["status"] == "low_budget"
+        db.session.commit()
+        assert EmailOutbox.query.count() == 2
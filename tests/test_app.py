@@ -1,16 +1,3 @@
-import pytest
-from backend.app import create_app
-
-@pytest.fixture
-def app():
-    app = create_app()
-    app.config["TESTING"] = True
-    return app
-
-@pytest.fixture
-def client(app):
-    return app.test_client()
-
 def test_home(client):
     # Just test if /test-email route works
     response = client.get("/test-email")
@@ -0,0 +1,101 @@
+import os
+import random
+from datetime import date
+
+import pytest
+
+from backend import archive, rollup
+from backend.db import db
+from backend.models import ArchivedMonth, Budget, Expense
+from backend.reports import month_range
+
+TODAY = date(2025, 6, 15)
+MONTHS = month_range("2023-01", "2025-06")
+
+
+def _seed(app, user_id, per_month=20):
+    rng = random.Random(user_id)
+    with app.app_context():
+        db.session.execute(Expense.__table__.insert(), [
+            {"user_id": user_id, "category": rng.choice(["Food", "Rent", "Fun"]),
+             "amount": round(rng.uniform(1, 100), 2), "date": date(int(m[:4]), int(m[5:]), rng.randint(1, 28))}
+            for m in MONTHS for _ in range(per_month)
+        ])
+        db.session.add(Budget(user_id=user_id, category="Food", month="2025-06", amount=10000))
+        rollup.rebuild()
+
+
+def _snapshot(client, headers):
+    report = client.get("/users/reports?from=2023-01&to=2025-06", headers=headers).get_json()
+    export = client.get("/users/expenses/export?format=csv", headers=headers).get_data(as_text=True)
+    food = client.get("/users/expenses/export?format=ndjson&from=2024-11&to=2025-02&category=Food",
+                      headers=headers).get_data(as_text=True)
+    return report, export, food
+
+
+def test_archive_moves_old_months_out_and_reads_them_back(app, client, make_user, tmp_path):
+    alice, headers = make_user("alice@example.com")
+    bob, _ = make_user("bob@example.com")
+    _seed(app, alice)
+    _seed(app, bob)
+    before = _snapshot(client, headers)
+    root = str(tmp_path / "archive")
+
+    with app.app_context():
+        summary = archive.run(root, keep_months=6, today=TODAY, log=lambda *a: None)
+        assert summary["cutoff"] == "2025-01"
+        assert (summary["months"], summary["rows"]) == (2 * 24, 2 * 24 * 20)
+        assert db.session.query(db.func.min(Expense.date)).scalar() >= date(2025, 1, 1)
+        assert Expense.query.count() == 2 * 6 * 20
+        # The summaries keep the rollup reproducible from what is left
+        assert rollup.verify() == []
+        rollup.rebuild()
+        assert rollup.verify() == []
+        status = archive.status(root)
+        assert status["archived_rows"] == 2 * 24 * 20 and status["archive_bytes"] > 0
+
+    app.config["ARCHIVE_DIR"] = root
+    assert _snapshot(client, headers) == before
+    # The listing pages through hot rows only, and its count agrees
+    page = client.get("/users/expenses?count=true&from=2023-01&to=2023-12", headers=headers).get_json()
+    assert (page["items"], page["total_count"]) == ([], 0)
+    page = client.get("/users/expenses?count=true&limit=200", headers=headers).get_json()
+    assert page["total_count"] == len(page["items"]) == 6 * 20
+    assert len(os.listdir(os.path.join(root, str(alice)))) == 24
+
+    # Nothing left to do on a second run
+    with app.app_context():
+        assert archive.run(root, keep_months=6, today=TODAY, log=lambda *a: None)["rows"] == 0
+
+
+def test_late_expenses_are_merged_into_the_existing_archive(app, client, make_user, tmp_path):
+    alice, headers = make_user("alice@example.com")
+    _seed(app, alice, per_month=3)
+    root = str(tmp_path / "archive")
+    app.config["ARCHIVE_DIR"] = root
+    with app.app_context():
+        archive.run(root, keep_months=6, today=TODAY, log=lambda *a: None)
+        old_path = db.session.get(ArchivedMonth, (alice, "2024-03")).path
+
+    # A back-dated expense lands in the hot table for an archived month
+    client.post("/users/budgets", json={"category": "Food", "month": "2024-03", "amount": 1e6}, headers=headers)
+    res = client.post("/users/expenses", json={"category": "Food", "amount": 7.5, "date": "2024-03-31"},
+                      headers=headers)
+    assert res.status_code == 200
+    export = client.get("/users/expenses/export?format=csv&month=2024-03", headers=headers).get_data(as_text=True)
+    assert export.strip().splitlines()[-1].endswith(",2024-03-31,Food,7.5")
+
+    with app.app_context():
+        assert archive.run(root, keep_months=6, today=TODAY, log=lambda *a: None)["rows"] == 1
+        entry = db.session.get(ArchivedMonth, (alice, "2024-03"))
+        assert entry.rows == 4 and entry.path != old_path
+        assert not os.path.exists(os.path.join(root, old_path))
+        assert rollup.verify() == []
+    again = client.get("/users/expenses/export?format=csv&month=2024-03", headers=headers).get_data(as_text=True)
+    assert again == export
+
+
+def test_forecast_history_stays_hot():
+    with pytest.raises(ValueError):
+        archive.cutoff_month(archive.MIN_KEEP_MONTHS - 1, TODAY)
+    assert archive.cutoff_month(archive.MIN_KEEP_MONTHS, TODAY) == "2025-03"
@@ -0,0 +1,58 @@
+from backend.db import db
+from backend.models import Budget, Expense, SpendRollup, User
+from benchmarks import seed as seeding
+from benchmarks.archive import run as run_archive
+from benchmarks.run import SCENARIOS, compare, percentile, run_scenario
+from benchmarks.shards import run_count
+
+DATASET = {"users": 20, "expenses": 400, "budgets": 60, "rounds": 4, "seed": 7}
+
+
+def test_seed_is_deterministic_and_consistent(app):
+    with app.app_context():
+        seeding.seed(**DATASET, log=lambda msg: None)
+        assert User.query.count() == 20
+        assert Budget.query.count() == 60
+        assert Expense.query.count() == 400
+        assert db.session.query(db.func.sum(SpendRollup.count)).scalar() == 400
+        first = [(e.user_id, e.category, e.amount, e.date) for e in Expense.query.order_by(Expense.id).limit(50)]
+
+    # Every seeded expense falls inside one of its user's budgets
+    keys = {(u, c, m) for u in range(1, 21) for c, m in seeding.budget_keys(u, 3)}
+    assert all((u, c, d.isoformat()[:7]) in keys for u, c, _, d in first)
+
+
+def test_scenarios_run_without_errors(app):
+    with app.app_context():
+        seeding.seed(**DATASET, log=lambda msg: None)
+    app.config["MAIL_SUPPRESS_SEND"] = True
+    for scenario in SCENARIOS:
+        summary = run_scenario(app, scenario, DATASET, threads=2, requests=10)
+        assert summary["requests"] == 10
+        assert summary["errors"] == 0, scenario.name
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+        assert summary["sql_per_request"] > 0
+
+
+def test_percentile_and_regression_flags():
+    values = sorted(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+
+    baseline = {"scenarios": {"login": {"1": {"p95_ms": 10.0, "throughput": 100.0}}}}
+    current = {"scenarios": {"login": {"1": {"p95_ms": 11.0, "throughput": 80.0}},
+                             "new_scenario": {"1": {"p95_ms": 1.0, "throughput": 1.0}}}}
+    regressions = compare(current, baseline, threshold=0.15)
+    assert [(r["scenario"], r["metric"]) for r in regressions] == [("login", "throughput")]
+
+
+def test_shard_benchmark_spreads_writes():
+    for shards in (1, 2):
+        result = run_count(shards, processes=2, threads=1, requests=5, users=4)
+        assert result["requests"] == 10
+        assert result["errors"] == 0
+
+
+def test_archive_benchmark_shrinks_the_hot_table():
+    result = run_archive(users=5, months=8, per_month=3, keep_months=4, samples=2, log=lambda *a: None)
+    assert result["archive"]["rows"] == 5 * 4 * 3
+    assert (result["before"]["hot_rows"], result["after"]["hot_rows"]) == (5 * 8 * 3, 5 * 4 * 3)
@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+
+import jwt
+import pytest
+
+from backend.app import create_app
+from backend.tokens import SECRET_KEY
+
+PROCESSES = 6
+THREADS = 6
+WRITES = 10
+
+
+def _worker(uri, profile, user_id, results):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SQLITE_PROFILE": profile,
+                      "OUTBOX_WORKERS": 0, "PROPAGATE_EXCEPTIONS": False})
+    headers = {"Authorization": "Bearer " + jwt.encode({"user_id": user_id}, SECRET_KEY, algorithm="HS256")}
+    statuses = []
+
+    def post_expenses():
+        client = app.test_client()
+        for _ in range(WRITES):
+            res = client.post("/users/expenses", json={"category": "Food", "amount": 1, "date": "2025-03-01"},
+                              headers=headers)
+            statuses.append(res.status_code)
+
+    threads = [threading.Thread(target=post_expenses) for _ in range(THREADS)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((statuses, started, time.time()))
+
+
+def _stress(tmp_path, profile):
+    uri = f"sqlite:///{tmp_path / f'{profile}.db'}"
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "SQLITE_PROFILE": profile, "OUTBOX_WORKERS": 0,
+                      "BCRYPT_ROUNDS": 4})
+    client = app.test_client()
+    res = client.post("/auth/signup", json={"name": "S", "email": "s@example.com", "password": "pw"})
+    user_id = res.get_json()["user_id"]
+    token = res.get_json()["access_token"]
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 1e9},
+                headers={"Authorization": f"Bearer {token}"})
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(uri, profile, user_id, results)) for _ in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    outcomes = [results.get(timeout=120) for _ in procs]
+    for p in procs:
+        p.join()
+    statuses = [s for outcome in outcomes for s in outcome[0]]
+    elapsed = max(o[2] for o in outcomes) - min(o[1] for o in outcomes)
+
+    report = client.get("/users/reports?month=2025-03", headers={"Authorization": f"Bearer {token}"}).get_json()
+    return statuses, report["total"], elapsed
+
+
+def test_concurrent_writers_do_not_hit_lock_errors(tmp_path):
+    statuses, total, elapsed = _stress(tmp_path, "production")
+    expected = PROCESSES * THREADS * WRITES
+    print(f"\nproduction profile: {statuses.count(200)}/{expected} ok, "
+          f"{expected / elapsed:.0f} writes/s")
+    assert statuses.count(200) == expected
+    assert total == expected
+
+
+@pytest.mark.skipif(not os.getenv("STRESS_BASELINE"), reason="set STRESS_BASELINE=1 to compare")
+def test_default_profile_baseline(tmp_path):
+    # Same load without the profile; lock failures show up here as 500s
+    statuses, total, elapsed = _stress(tmp_path, "default")
+    expected = PROCESSES * THREADS * WRITES
+    print(f"\ndefault profile: {statuses.count(200)}/{expected} ok, "
+          f"{expected - statuses.count(200)} failed, {expected / elapsed:.0f} writes/s")
+
+
+@pytest.mark.parametrize("profile", ["production", "default"])
+def test_concurrent_expenses_never_overspend(tmp_path, profile):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'budget.db'}", "SQLITE_PROFILE": profile,
+                      "OUTBOX_WORKERS": 0, "BCRYPT_ROUNDS": 4, "PROPAGATE_EXCEPTIONS": False,
+                      "RATE_LIMIT_STORE": "off"})
+    client = app.test_client()
+    token = client.post("/auth/signup", json={"name": "S", "email": "s@example.com", "password": "pw"}) \
+        .get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+
+    statuses = []
+
+    def spend():
+        local = app.test_client()
+        for _ in range(25):
+            res = local.post("/users/expenses", json={"category": "Food", "amount": 1, "date": "2025-03-01"},
+                             headers=headers)
+            statuses.append(res.status_code)
+
+    threads = [threading.Thread(target=spend) for _ in range(8)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+
+    report = client.get("/users/reports?month=2025-03", headers=headers).get_json()
+    print(f"\n{profile} profile: {statuses.count(200)} accepted, {statuses.count(400)} exceeded, "
+          f"{len(statuses) / elapsed:.0f} req/s")
+    assert report["total"] <= 100
+    assert report["total"] == statuses.count(200)
+    if profile == "production":
+        assert statuses.count(200) == 100
+        assert statuses.count(400) == 100
+
+
+def test_password_hashing_does_not_hold_the_write_lock(app, client, make_user):
+    make_user(email="a@example.com", password="pw")
+    hasher = app.extensions["passwords"]
+    run = hasher._run
+    outside = []
+
+    def probe(op, fn, *args):
+        # Another process writing while bcrypt runs must not find the file locked
+        conn = sqlite3.connect(app.config["SQLALCHEMY_DATABASE_URI"][len("sqlite:///"):], timeout=0,
+                               isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+            outside.append("ok")
+        except sqlite3.OperationalError as e:
+            outside.append(str(e))
+        finally:
+            conn.close()
+        return run(op, fn, *args)
+
+    hasher._run = probe
+    assert client.post("/auth/login", json={"email": "a@example.com", "password": "pw"}).status_code == 200
+    assert client.post("/auth/signup", json={"name": "B", "email": "b@example.com", "password": "pw"}) \
+        .status_code == 200
+    assert client.post("/auth/signup", json={"name": "B", "email": "b@example.com", "password": "pw"}) \
+        .status_code == 400
+    assert outside == ["ok", "ok"]
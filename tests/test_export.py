@@ -0,0 +1,58 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+
+from sqlalchemy import text
+
+from backend.db import db
+from backend.export import after_key, expense_filters, iter_expense_chunks
+from backend.models import Expense
+
+
+def _seed(app, user_id):
+    with app.app_context():
+        db.session.execute(Expense.__table__.insert(), [
+            {"user_id": user_id, "category": "Food" if i % 2 else "Rent", "amount": float(i),
+             "date": date(2025, 1 + i % 3, 1 + i % 5)}
+            for i in range(30)
+        ])
+        db.session.commit()
+
+
+def test_keyset_chunks_cover_every_row_in_order(app, make_user):
+    user_id, _ = make_user()
+    _seed(app, user_id)
+    with app.app_context():
+        chunks = list(iter_expense_chunks(expense_filters(user_id), chunk_size=7))
+        assert [len(c) for c in chunks] == [7, 7, 7, 7, 2]
+        keys = [(r.date, r.id) for c in chunks for r in c]
+        assert keys == sorted(keys) and len(set(keys)) == 30
+
+        query = Expense.query.filter(*expense_filters(user_id), after_key(date(2025, 2, 1), 5)) \
+            .order_by(Expense.date, Expense.id).limit(7).statement
+        sql = str(query.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(r[-1] for r in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert "USING INDEX ix_expense_user_date" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_export_csv_with_filters(app, client, make_user):
+    user_id, headers = make_user()
+    _seed(app, user_id)
+    res = client.get("/users/expenses/export?month=2025-02&category=Food", headers=headers)
+    assert res.status_code == 200 and res.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert rows and all(r["category"] == "Food" and r["date"].startswith("2025-02") for r in rows)
+
+
+def test_export_ndjson_gzip(app, client, make_user):
+    user_id, headers = make_user()
+    _seed(app, user_id)
+    res = client.get("/users/expenses/export?format=ndjson",
+                     headers={**headers, "Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(res.get_data()).decode().splitlines()
+    assert len(lines) == 30
+    assert set(json.loads(lines[0])) == {"id", "date", "category", "amount"}
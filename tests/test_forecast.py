@@ -0,0 +1,87 @@
+from datetime import date
+
+import numpy as np
+
+from backend import alerts, forecast
+from backend.models import AlertState, EmailOutbox
+
+PRIOR = ("2025-01", "2025-02", "2025-03")
+
+
+def _budget(client, headers, category, month, amount):
+    client.post("/users/budgets", json={"category": category, "month": month, "amount": amount}, headers=headers)
+
+
+def _expense(client, headers, category, day, amount):
+    res = client.post("/users/expenses", json={"category": category, "amount": amount, "date": day}, headers=headers)
+    assert res.status_code == 200
+
+
+def _history(client, headers):
+    """Food: 10 a day on days 1-28; Rent: 900 on the 1st"""
+    for month in PRIOR + ("2025-04",):
+        _budget(client, headers, "Food", month, 1000)
+        _budget(client, headers, "Rent", month, 1000)
+    for month in PRIOR:
+        for day in range(1, 29):
+            _expense(client, headers, "Food", f"{month}-{day:02d}", 10)
+        _expense(client, headers, "Rent", f"{month}-01", 900)
+
+
+def test_project_blends_run_rate_and_history():
+    daily = np.zeros((2, 2, forecast.MAX_DAYS))
+    daily[0, 1, :10] = 10         # no history: run rate only
+    daily[1, 0, :30] = 5          # 150 last month, 50 of it after day 20
+    daily[1, 1, :20] = 6          # 120 by day 20 this month
+    result = forecast.project(daily, "2025-08", date(2025, 8, 20))
+    assert result["spent"].tolist() == [100.0, 120.0]
+    assert np.isnan(result["seasonal"][0])
+    assert result["forecast"][0] == result["run_rate"][0] == 155.0
+    assert result["seasonal"][1] == 170.0
+    # 20 of 31 days gone: that share of the run rate (66 more), the rest history (50 more)
+    assert round(result["forecast"][1], 6) == round(120 + 20 / 31 * 66 + 11 / 31 * 50, 6)
+
+    # Before the month starts only history counts; after it ends, only what was spent
+    assert forecast.project(daily, "2025-08", date(2025, 7, 1))["forecast"].tolist() == [0.0, 150.0]
+    assert forecast.project(daily, "2025-08", date(2025, 9, 1))["forecast"].tolist() == [100.0, 120.0]
+
+
+def test_forecast_endpoint(client, make_user):
+    _, headers = make_user()
+    _history(client, headers)
+    for day in range(1, 11):
+        _expense(client, headers, "Food", f"2025-04-{day:02d}", 30)
+    _expense(client, headers, "Rent", "2025-04-01", 900)
+
+    res = client.get("/users/forecast?month=2025-04&as_of=2025-04-10", headers=headers)
+    body = res.get_json()
+    food, rent = body["categories"]["Food"], body["categories"]["Rent"]
+    assert (food["spent"], food["run_rate"]) == (300.0, 900.0)
+    # History spends about 183 after the 10th; the 1/3 elapsed weights run rate
+    assert food["seasonal"] == 483.33
+    assert food["forecast"] == 622.22 and food["status"] == "ok"
+    # Rent's history keeps the projection from tripling the one-off payment
+    assert (rent["forecast"], rent["status"]) == (1500.0, "low_budget")
+    assert body["spent"] == 1200.0 and body["budget"] == 2000.0
+
+    assert client.get("/users/forecast?month=2025-13", headers=headers).status_code == 400
+    assert client.get("/users/forecast?month=2025-09&as_of=2025-09-01", headers=headers).get_json()["categories"] == {}
+
+
+def test_sweep_warns_when_on_pace_to_exceed(app, client, make_user):
+    alice, headers = make_user("alice@example.com", "Alice")
+    _history(client, headers)
+    for day in range(1, 6):
+        _expense(client, headers, "Food", f"2025-04-{day:02d}", 120)
+
+    with app.app_context():
+        as_of = date(2025, 4, 5)
+        summary = alerts.sweep_month("2025-04", as_of=as_of)
+        assert (summary["budgets"], summary[alerts.FORECAST_OVER], summary["queued"]) == (2, 1, 1)
+        fired = AlertState.query.filter_by(month="2025-04").all()
+        assert [(s.category, s.kind) for s in fired] == [("Food", alerts.FORECAST_OVER)]
+        assert alerts.sweep_month("2025-04", as_of=as_of)["queued"] == 0
+
+        check = alerts.check_budget(alice, "Food", "2025-04", as_of=as_of)
+        assert check["status"] == alerts.FORECAST_OVER and check["forecast"] > 1000
+        assert EmailOutbox.query.filter(EmailOutbox.subject.like("%On Pace%")).count() == 1
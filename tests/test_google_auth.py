@@ -0,0 +1,146 @@
+import datetime
+import time
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from backend import auth
+from backend.app import create_app
+from backend.db import db
+from backend.models import User
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def _signing_key(kid):
+    """A local RSA key and its self-signed certificate standing in for Google's"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()).not_valid_before(now) \
+        .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class FakeGoogle:
+    def __init__(self):
+        self.keys = {}
+        self.calls = 0
+        self.max_age = 3600
+        self.down = False
+
+    def add_key(self, kid):
+        self.keys[kid] = _signing_key(kid)
+
+    def fetch(self, url):
+        self.calls += 1
+        if self.down:
+            raise OSError("network unreachable")
+        return {kid: cert for kid, (_, cert) in self.keys.items()}, self.max_age
+
+    def id_token(self, kid, email="g@example.com", **claims):
+        now = int(time.time())
+        payload = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234", "email": email,
+                   "email_verified": True, "name": "Gina", "iat": now, "exp": now + 600, **claims}
+        return jwt.encode(payload, self.keys[kid][0], algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def google(app):
+    fake = FakeGoogle()
+    fake.add_key("k1")
+    app.config["GOOGLE_CLIENT_ID"] = CLIENT_ID
+    cache = app.extensions["google_certs"] = auth.CertificateCache(fetch=fake.fetch, min_refetch_interval=0)
+    yield fake
+    cache.stop()
+
+
+def test_google_sign_in_creates_user_and_issues_token(app, client, google):
+    res = client.post("/auth/google", json={"token": google.id_token("k1")})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["email"] == "g@example.com"
+    headers = {"Authorization": f"Bearer {body['access_token']}"}
+    assert client.get("/users/expenses", headers=headers).status_code == 200
+
+    # Second sign-in: same user, no new certificate fetch
+    again = client.post("/auth/google", json={"token": google.id_token("k1")}).get_json()
+    assert again["user_id"] == body["user_id"]
+    assert google.calls == 1
+    with app.app_context():
+        assert User.query.filter_by(email="g@example.com").one().password == auth.UNUSABLE_PASSWORD
+    # Google-only accounts cannot log in with a password
+    assert client.post("/auth/login", json={"email": "g@example.com", "password": "!google"}).status_code == 401
+
+
+def test_existing_user_is_matched_by_email(client, make_user, google):
+    user_id, _ = make_user("g@example.com", "Gina")
+    body = client.post("/auth/google", json={"token": google.id_token("k1")}).get_json()
+    assert body["user_id"] == user_id
+
+
+def test_invalid_tokens_are_rejected(app, client, google):
+    bad = [
+        google.id_token("k1", aud="someone-else"),
+        google.id_token("k1", iss="https://evil.example.com"),
+        google.id_token("k1", email_verified=False),
+        google.id_token("k1", exp=int(time.time()) - 60),
+        google.id_token("k1")[:-4] + "AAAA",
+        "not a token",
+    ]
+    for token in bad:
+        assert client.post("/auth/google", json={"token": token}).status_code == 400
+    with app.app_context():
+        assert User.query.count() == 0
+
+
+def test_rotated_key_triggers_one_refresh(client, google):
+    assert client.post("/auth/google", json={"token": google.id_token("k1")}).status_code == 200
+    google.add_key("k2")
+    assert client.post("/auth/google", json={"token": google.id_token("k2")}).status_code == 200
+    assert google.calls == 2
+
+    # An outage keeps the last certificates in service, even past their expiry
+    google.max_age = 0
+    cache = auth.CertificateCache(fetch=google.fetch)
+    cache.refresh()
+    google.down = True
+    assert set(cache.get()) == {"k1", "k2"}
+    assert cache.stats()["failures"] >= 1
+    cache.stop()
+
+
+def test_background_refresh_before_expiry():
+    google = FakeGoogle()
+    google.add_key("k1")
+    google.max_age = 0.2
+    cache = auth.CertificateCache(fetch=google.fetch, refresh_margin=0.1)
+    cache.get()
+    deadline = time.time() + 2
+    while google.calls < 3 and time.time() < deadline:
+        time.sleep(0.02)
+    cache.stop()
+    assert google.calls >= 3
+
+
+def test_unconfigured_or_unreachable(tmp_path):
+    app = create_app({"TESTING": True, "OUTBOX_WORKERS": 0,
+                      "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'expenses.db'}"})
+    client = app.test_client()
+    assert client.post("/auth/google", json={"token": "x"}).status_code == 503
+
+    google = FakeGoogle()
+    google.add_key("k1")
+    google.down = True
+    app.config["GOOGLE_CLIENT_ID"] = CLIENT_ID
+    app.extensions["google_certs"] = auth.CertificateCache(fetch=google.fetch)
+    res = client.post("/auth/google", json={"token": google.id_token("k1")})
+    assert res.status_code == 503 and res.headers["Retry-After"]
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,68 @@
+import json
+
+from backend import rollup
+from backend.models import EmailOutbox, Expense
+
+
+def test_csv_import_batches_and_reports_errors(app, client, make_user):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    body = "date,category,amount,note\n" + "".join(
+        f"2025-03-{day:02d},Food,10,lunch\n" for day in range(1, 10)
+    ) + "2025-03-40,Food,1,\n2025-02-01,Rent,abc,\n2025-02-01,Rent,800,\n"
+
+    res = client.post("/users/expenses/import?batch_size=4", data=body, headers=headers, content_type="text/csv")
+    assert res.status_code == 200
+    summary = res.get_json()
+    assert summary["inserted"] == 10
+    assert summary["rejected"] == 2
+    assert [e["row"] for e in summary["errors"]] == [10, 11]
+    assert summary["budgets"]["2025-03"]["Food"]["status"] == "low_budget"
+    assert summary["budgets"]["2025-02"]["Rent"]["status"] == "no_budget"
+
+    with app.app_context():
+        assert Expense.query.count() == 10
+        assert rollup.spent(1, "Food", "2025-03") == 90
+        assert rollup.verify() == []
+        # Food is low in the last batch only; the alert is queued once
+        assert EmailOutbox.query.count() == 1
+
+
+def test_ndjson_import(app, client, make_user):
+    _, headers = make_user()
+    lines = [json.dumps({"date": "2024-12-31", "category": "Gifts", "amount": 25.5}), "", "not json", "[1]"]
+    res = client.post("/users/expenses/import?notify=false", data="\n".join(lines), headers=headers,
+                      content_type="application/x-ndjson")
+    summary = res.get_json()
+    assert summary["inserted"] == 1
+    assert [e["error"] for e in summary["errors"]] == ["Invalid JSON", "Each line must be a JSON object"]
+
+
+def test_import_rejects_unknown_format(client, make_user):
+    _, headers = make_user()
+    res = client.post("/users/expenses/import", data="x", headers=headers, content_type="text/plain")
+    assert res.status_code == 400
+    res = client.post("/users/expenses/import", data="a,b\n1,2\n", headers=headers, content_type="text/csv")
+    assert res.status_code == 400
+
+
+def test_import_rejects_non_finite_amounts(app, client, make_user):
+    _, headers = make_user()
+    body = "date,category,amount\n2025-03-01,Food,nan\n2025-03-01,Food,inf\n2025-03-01,Food,-Infinity\n" \
+           "2025-03-01,Food,5\n"
+    res = client.post("/users/expenses/import?notify=false", data=body, headers=headers, content_type="text/csv")
+    assert res.status_code == 200
+    summary = res.get_json()
+    assert (summary["inserted"], summary["rejected"]) == (1, 3)
+    assert {e["error"] for e in summary["errors"]} == {"Invalid amount"}
+
+
+def test_import_rejects_undecodable_bodies(client, make_user):
+    _, headers = make_user()
+    res = client.post("/users/expenses/import", data=b"date,category,amount\n2025-03-01,Caf\xe9,5\n",
+                      headers=headers, content_type="text/csv")
+    assert res.status_code == 400
+    # Past csv.field_size_limit(), which csv reports as csv.Error
+    res = client.post("/users/expenses/import", data="date,category,amount\n2025-03-01,\"" + "x" * 200000,
+                      headers=headers, content_type="text/csv")
+    assert res.status_code == 400
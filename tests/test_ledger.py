@@ -0,0 +1,93 @@
+import random
+
+from backend import ledger
+from backend.db import db
+from backend.models import Balance, SplitShare, User
+
+
+def _spend(client, headers, amount, split_emails, category="Food"):
+    client.post("/users/budgets", json={"category": category, "month": "2025-03", "amount": 1e6}, headers=headers)
+    res = client.post("/users/expenses", json={"category": category, "amount": amount, "date": "2025-03-02",
+                                               "split_emails": split_emails}, headers=headers)
+    assert res.status_code == 200
+    return res.get_json()["expense_id"]
+
+
+def _cleared(positions, transfers):
+    left = dict(positions)
+    for debtor, creditor, amount in transfers:
+        left[debtor] += amount
+        left[creditor] -= amount
+    return all(abs(v) < 0.01 * len(positions) for v in left.values())
+
+
+def test_shares_move_pair_balances(app, client, make_user):
+    alice, alice_headers = make_user("alice@example.com", "Alice")
+    bob, bob_headers = make_user("bob@example.com", "Bob")
+    carol, _ = make_user("carol@example.com", "Carol")
+
+    expense_id = _spend(client, alice_headers, 90, ["bob@example.com", "Carol@example.com", "stranger@example.com"])
+    _spend(client, bob_headers, 40, ["alice@example.com"])
+
+    with app.app_context():
+        shares = SplitShare.query.order_by(SplitShare.id).all()
+        # Unregistered addresses count towards the split but owe nothing on record
+        assert [(s.expense_id, s.payer_id, s.debtor_id, s.amount) for s in shares][:2] == [
+            (expense_id, alice, bob, 22.5), (expense_id, alice, carol, 22.5)]
+        # One row per pair, netted as shares arrive
+        assert Balance.query.count() == 2
+
+    body = client.get("/users/balances", headers=alice_headers).get_json()
+    assert [(i["name"], i["amount"]) for i in body["items"]] == [("Carol", 22.5), ("Bob", 2.5)]
+    assert (body["owed_to_you"], body["you_owe"]) == (25.0, 0)
+    body = client.get("/users/balances", headers=bob_headers).get_json()
+    assert [(i["email"], i["amount"]) for i in body["items"]] == [("alice@example.com", -2.5)]
+
+
+def test_settle_endpoint(client, make_user):
+    _, alice_headers = make_user("alice@example.com", "Alice")
+    _, bob_headers = make_user("bob@example.com", "Bob")
+    make_user("carol@example.com", "Carol")
+    _spend(client, alice_headers, 30, ["bob@example.com", "carol@example.com"])
+    _spend(client, bob_headers, 60, ["carol@example.com"])
+
+    # Carol owes 10 to Alice and 30 to Bob, Bob owes Alice 10: Carol can pay both directly
+    res = client.post("/users/settle", json={"members": ["bob@example.com", "carol@example.com", "x@example.com"]},
+                      headers=alice_headers)
+    body = res.get_json()
+    assert sorted((t["from"], t["to"], t["amount"]) for t in body["transfers"]) == [
+        ("carol@example.com", "alice@example.com", 20.0), ("carol@example.com", "bob@example.com", 20.0)]
+    assert body["unknown"] == ["x@example.com"]
+
+    # Debts to people outside the group are left alone
+    body = client.post("/users/settle", json={"members": ["bob@example.com"]}, headers=alice_headers).get_json()
+    assert [(t["from"], t["amount"]) for t in body["transfers"]] == [("bob@example.com", 10.0)]
+    assert client.post("/users/settle", json={"members": "bob"}, headers=alice_headers).status_code == 400
+
+
+def test_large_group_settles_in_fewer_transfers_than_members(app):
+    rng = random.Random(7)
+    members = 300
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {"id": i, "name": f"M{i}", "email": f"m{i}@example.com", "password": "-"} for i in range(1, members + 1)
+        ])
+        for expense_id in range(1, 2001):
+            payer = rng.randint(1, members)
+            debtors = rng.sample(range(1, members + 1), 10)
+            ledger.record_shares(payer, expense_id, {d: round(rng.uniform(1, 50), 2) for d in debtors})
+        db.session.commit()
+
+        positions = ledger.net_positions(range(1, members + 1))
+        assert abs(sum(positions.values())) < 1e-6
+        # The pair table holds the same totals the share history adds up to
+        expected = dict.fromkeys(range(1, members + 1), 0.0)
+        for share in SplitShare.query:
+            expected[share.payer_id] += share.amount
+            expected[share.debtor_id] -= share.amount
+        assert all(abs(positions[u] - expected[u]) < 1e-6 for u in expected)
+
+        transfers = ledger.settle(positions)
+        assert len(transfers) <= members - 1
+        assert _cleared(positions, transfers)
+        assert all(amount > 0 for _, _, amount in transfers)
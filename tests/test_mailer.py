@@ -0,0 +1,91 @@
+import socket
+import time
+
+import pytest
+
+from backend.db import db
+from backend.mailer import enqueue_email, queue_depth
+from backend.models import EmailOutbox
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    port = _free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def _point_at(app, port):
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=port, MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_DEFAULT_SENDER="tracker@example.com")
+
+
+def test_drain_reuses_one_connection(app, smtp_server):
+    handler, port = smtp_server
+    _point_at(app, port)
+    with app.app_context():
+        enqueue_email([f"user{i}@example.com" for i in range(25)], "Hello", html="<p>hi</p>")
+        db.session.commit()
+        assert queue_depth()["pending"] == 25
+
+        assert app.extensions["outbox"].drain() == 25
+        assert queue_depth() == {"pending": 0, "sending": 0, "failed": 0}
+
+    assert len(handler.messages) == 25
+    assert len(handler.sessions) == 1
+
+
+def test_failed_delivery_backs_off(app):
+    _point_at(app, _free_port())
+    with app.app_context():
+        enqueue_email(["a@example.com", "b@example.com"], "Hello", body="hi")
+        db.session.commit()
+
+        app.extensions["outbox"].drain()
+        rows = EmailOutbox.query.all()
+        assert [r.attempts for r in rows] == [1, 1]
+        assert all(r.status == "pending" and r.next_attempt_at > time.time() for r in rows)
+        # Nothing is due yet, so a second pass leaves the rows alone
+        assert app.extensions["outbox"].drain() == 0
+
+
+def test_worker_pool_delivers_after_commit(app, client, smtp_server, make_user):
+    handler, port = smtp_server
+    _point_at(app, port)
+    app.extensions["outbox"].workers = 2
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    res = client.post("/users/expenses", json={
+        "category": "Food", "amount": 10, "date": "2025-03-04",
+        "split_emails": [f"friend{i}@example.com" for i in range(20)],
+    }, headers=headers)
+    assert res.status_code == 200
+
+    deadline = time.time() + 5
+    while len(handler.messages) < 20 and time.time() < deadline:
+        time.sleep(0.05)
+    app.extensions["outbox"].stop()
+    assert len(handler.messages) == 20
+    assert client.get("/internal/stats").get_json()["outbox"]["pending"] == 0
@@ -0,0 +1,39 @@
+import logging
+import re
+
+from backend.app import create_app
+
+
+def _value(text, pattern):
+    match = re.search(pattern + r" ([0-9.e+-]+)$", text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_exposes_per_route_stats(app, client, make_user):
+    _, headers = make_user()
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    client.post("/users/expenses", json={"category": "Food", "amount": 95, "date": "2025-03-02",
+                                         "split_emails": ["a@example.com", "b@example.com"]}, headers=headers)
+    client.post("/auth/login", json={"email": "user@example.com", "password": "secret"})
+
+    text = client.get("/metrics").get_data(as_text=True)
+    route = 'endpoint="/users/expenses",method="POST"'
+    assert _value(text, rf"http_request_duration_seconds_count\{{{route}\}}") == 1
+    assert _value(text, rf"http_request_sql_statements_sum\{{{route}\}}") >= 3
+    assert _value(text, rf"http_request_db_seconds_total\{{{route}\}}") > 0
+    # 90% warning plus two split notices
+    assert _value(text, rf"http_request_emails_enqueued_total\{{{route}\}}") == 3
+    assert _value(text, r'http_request_bcrypt_seconds_total\{endpoint="/auth/login",method="POST"\}') > 0
+    assert _value(text, r'http_requests_total\{endpoint="/users/expenses",method="POST",status="200"\}') == 1
+    assert _value(text, r"outbox_pending") == 3
+
+
+def test_slow_request_log_lists_statements(app, client, make_user, caplog):
+    # Same database as the fixture app, with every request counted as slow
+    slow_app = create_app({"TESTING": True, "OUTBOX_WORKERS": 0, "SLOW_REQUEST_MS": 0,
+                           "SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"]})
+    _, headers = make_user()
+    with caplog.at_level(logging.WARNING, logger="backend.slow_requests"):
+        slow_app.test_client().get("/users/reports?month=2025-03", headers=headers)
+    assert "Slow request GET /users/reports" in caplog.text
+    assert "SELECT" in caplog.text
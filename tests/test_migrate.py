@@ -0,0 +1,114 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from sqlalchemy import text
+
+from backend.app import create_app
+from backend.db import db
+from backend import migrate
+from backend.migrate import SCHEMA_VERSION, MigrationError, schema_version, upgrade
+from backend.models import Budget, Expense
+from backend import rollup
+
+# Schema as shipped before Expense.date became a DATE column
+LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, email VARCHAR(100) NOT NULL,
+    password VARCHAR(200) NOT NULL, PRIMARY KEY (id), UNIQUE (email));
+CREATE TABLE budget (id INTEGER NOT NULL, user_id INTEGER NOT NULL, category VARCHAR(50) NOT NULL,
+    month VARCHAR(7) NOT NULL, amount FLOAT NOT NULL, low_budget_percent INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id));
+CREATE TABLE expense (id INTEGER NOT NULL, user_id INTEGER NOT NULL, category VARCHAR(50) NOT NULL,
+    amount FLOAT NOT NULL, date VARCHAR(10) NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES user (id));
+"""
+
+EXPENSE_QUERY = ("SELECT SUM(amount) FROM expense WHERE user_id = 1 AND category = 'Food' "
+                 "AND date >= '2025-03-01' AND date < '2025-04-01'")
+BUDGET_QUERY = "SELECT * FROM budget WHERE user_id = 1 AND month = '2025-03' AND category = 'Food'"
+
+
+def _plan(sql):
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return " | ".join(r[-1] for r in rows)
+
+
+def test_upgrade_legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO user VALUES (1, 'A', 'a@example.com', 'x')")
+    conn.executemany("INSERT INTO budget VALUES (?, 1, 'Food', '2025-03', ?, NULL)", [(1, 100), (2, 200)])
+    conn.executemany("INSERT INTO expense VALUES (?, 1, 'Food', 5.0, ?)",
+                     [(i, f"2025-3-{i % 28 + 1}") for i in range(1, 51)])
+    conn.commit()
+    conn.close()
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "SCHEMA_MIGRATE": "off"})
+    with app.app_context():
+        assert "SCAN expense" in _plan(EXPENSE_QUERY)
+        assert "SCAN budget" in _plan(BUDGET_QUERY)
+
+        upgrade(batch_size=7, log=lambda msg: None)
+        # Fresh connections: pysqlite's statement cache keeps the EXPLAINs
+        # prepared against the old schema
+        db.session.remove()
+        db.engine.dispose()
+
+        assert "USING INDEX ix_expense_user_category_date" in _plan(EXPENSE_QUERY)
+        assert "USING INDEX ix_budget_user_month_category" in _plan(BUDGET_QUERY)
+
+        assert Expense.query.count() == 50
+        assert db.session.get(Expense, 1).date == date(2025, 3, 2)
+        assert [b.amount for b in Budget.query.all()] == [100]
+        assert rollup.spent(1, "Food", "2025-03") == 250
+        assert rollup.verify() == []
+
+        # Re-running is a no-op
+        upgrade(log=lambda msg: None)
+        assert Expense.query.count() == 50
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO expense VALUES (1, 1, 'Food', 5.0, '2025-3-1')")
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def test_boot_upgrades_once_then_only_checks(tmp_path, monkeypatch):
+    uri = _legacy_db(tmp_path)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, "OUTBOX_WORKERS": 0})
+    with app.app_context():
+        assert schema_version(db.engine) == SCHEMA_VERSION
+        assert db.session.get(Expense, 1).date == date(2025, 3, 1)
+        db.engine.dispose()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("schema work on a current database")
+    monkeypatch.setattr(migrate, "upgrade", fail)
+    monkeypatch.setattr(db, "create_all", fail)
+    create_app({"SQLALCHEMY_DATABASE_URI": uri, "OUTBOX_WORKERS": 0})
+
+
+def test_check_mode_refuses_outdated_schema(tmp_path):
+    with pytest.raises(MigrationError):
+        create_app({"SQLALCHEMY_DATABASE_URI": _legacy_db(tmp_path), "SCHEMA_MIGRATE": "check"})
+
+
+def test_block_ids_are_bigint_outside_sqlite():
+    from sqlalchemy.dialects import postgresql, sqlite
+    from sqlalchemy.schema import CreateTable
+
+    for table, column in migrate.ROW_ID_COLUMNS:
+        col = db.metadata.tables[table].c[column]
+        assert col.type.compile(dialect=postgresql.dialect()) == "BIGINT"
+        assert col.type.compile(dialect=sqlite.dialect()) == "INTEGER"
+    # Still the rowid alias in SQLite
+    assert "id INTEGER NOT NULL" in str(CreateTable(Expense.__table__).compile(dialect=sqlite.dialect()))
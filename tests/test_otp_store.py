@@ -0,0 +1,90 @@
+import re
+import time
+
+import pytest
+
+from backend import otp_store as otp
+from backend.models import EmailOutbox, OtpEntry
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, app):
+    options = {"ttl": 60, "max_attempts": 3, "resend_interval": 30}
+    if request.param == "memory":
+        yield otp.MemoryOTPStore(**options)
+    else:
+        with app.app_context():
+            yield otp.SQLiteOTPStore(**options)
+
+
+def test_attempts_lock_the_code(store):
+    store.issue("a@example.com", "123456")
+    assert store.verify("a@example.com", "000000") == otp.INVALID
+    assert store.verify("a@example.com", "000000") == otp.INVALID
+    assert store.verify("a@example.com", "000000") == otp.LOCKED
+    assert store.verify("a@example.com", "123456") == otp.MISSING
+
+
+def test_resend_is_throttled(store):
+    store.issue("a@example.com", "123456")
+    with pytest.raises(otp.OTPThrottled):
+        store.issue("a@example.com", "654321")
+    assert store.verify("a@example.com", "123456") == otp.OK
+    store.discard("a@example.com")
+    assert store.verify("a@example.com", "123456") == otp.MISSING
+
+
+def test_expired_entries_are_swept_in_bulk(store):
+    store.ttl = -1
+    for i in range(5):
+        store.issue(f"user{i}@example.com", "123456")
+    store.ttl = 60
+    store.issue("fresh@example.com", "123456")
+    store.sweep()
+    # Swept rather than merely reported as expired on read
+    assert all(store.verify(f"user{i}@example.com", "123456") == otp.MISSING for i in range(5))
+    assert store.verify("fresh@example.com", "123456") == otp.OK
+
+
+def test_memory_heap_skips_reissued_codes():
+    store = otp.MemoryOTPStore(ttl=0.05, resend_interval=0)
+    store.issue("a@example.com", "111111")
+    store.ttl = 60
+    time.sleep(0.06)
+    store.issue("a@example.com", "222222")
+    assert store.sweep() == 0 and len(store) == 1
+
+
+def test_incomplete_store_fails_when_built():
+    class NoSweep(otp.OTPStore):
+        def issue(self, email, code):
+            pass
+
+        def verify(self, email, code):
+            return otp.MISSING
+
+        def discard(self, email):
+            pass
+
+    with pytest.raises(TypeError, match="sweep"):
+        NoSweep()
+
+
+def test_signup_flow_is_shared_across_app_instances(app, client):
+    assert client.post("/auth/signup/request", json={"email": "new@example.com"}).status_code == 200
+    assert client.post("/auth/signup/request", json={"email": "new@example.com"}).status_code == 429
+
+    with app.app_context():
+        html = EmailOutbox.query.one().html
+        assert OtpEntry.query.count() == 1
+    code = re.search(r">(\d{6})<", html).group(1)
+
+    # A second app on the same database stands in for another gunicorn worker
+    from backend.app import create_app
+    other = create_app({**{k: app.config[k] for k in ("SQLALCHEMY_DATABASE_URI", "OUTBOX_WORKERS", "BCRYPT_ROUNDS")}})
+    res = other.test_client().post("/auth/signup/verify", json={
+        "name": "New", "email": "new@example.com", "password": "pw", "otp": code,
+    })
+    assert res.status_code == 200 and res.get_json()["access_token"]
+    with app.app_context():
+        assert OtpEntry.query.count() == 0
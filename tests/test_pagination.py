@@ -0,0 +1,51 @@
+from datetime import date
+
+from backend import rollup
+from backend.db import db
+from backend.models import Budget, Expense
+
+
+def _walk(client, url, headers):
+    items, cursor = [], None
+    while True:
+        page = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers).get_json()
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items
+
+
+def test_expense_pages_follow_cursor(app, client, make_user):
+    user_id, headers = make_user()
+    with app.app_context():
+        db.session.execute(Expense.__table__.insert(), [
+            {"user_id": user_id, "category": "Food" if i % 3 else "Fuel", "amount": 1.0,
+             "date": date(2025, 1 + i % 4, 10)} for i in range(45)
+        ])
+        db.session.commit()
+        rollup.rebuild()
+
+    items = _walk(client, "/users/expenses?limit=10", headers)
+    assert len(items) == 45
+    assert [(i["date"], i["id"]) for i in items] == sorted((i["date"], i["id"]) for i in items)
+
+    page = client.get("/users/expenses?from=2025-02&to=2025-03&category=Food&count=true&limit=500",
+                      headers=headers).get_json()
+    assert page["total_count"] == len(page["items"]) == 15
+    assert page["next_cursor"] is None
+
+    assert client.get("/users/expenses?cursor=garbage", headers=headers).status_code == 400
+
+
+def test_budget_pages(app, client, make_user):
+    user_id, headers = make_user()
+    with app.app_context():
+        db.session.add_all([Budget(user_id=user_id, category=f"C{i}", month=f"2025-0{1 + i % 3}", amount=10)
+                            for i in range(7)])
+        db.session.commit()
+
+    items = _walk(client, "/users/budgets?limit=3", headers)
+    assert [(b["month"], b["category"]) for b in items] == sorted((b["month"], b["category"]) for b in items)
+    assert len(items) == 7
+    page = client.get("/users/budgets?month=2025-02&count=true", headers=headers).get_json()
+    assert page["total_count"] == 2
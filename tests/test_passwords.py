@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from backend.passwords import HashingBusy, PasswordHasher
+
+
+def test_saturated_executor_rejects():
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=0, wait_timeout=0, retry_after=3)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=hasher._run, args=("hash", block))
+    holder.start()
+    started.wait(5)
+    with pytest.raises(HashingBusy) as exc:
+        hasher.hash("pw")
+    assert exc.value.retry_after == 3
+    release.set()
+    holder.join()
+
+    assert hasher.check("pw", hasher.hash("pw"))
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_login_returns_503_when_busy(app, client, make_user):
+    make_user(email="a@example.com", password="pw")
+
+    def busy(*args):
+        raise HashingBusy(7)
+
+    app.extensions["passwords"]._run = busy
+    res = client.post("/auth/login", json={"email": "a@example.com", "password": "pw"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "7"
+
+
+def test_login_rehashes_when_cost_changes(app, client, make_user):
+    from backend.db import db
+    from backend.models import User
+
+    user_id, _ = make_user(email="a@example.com", password="pw")
+    app.extensions["passwords"].rounds = 5
+    assert client.post("/auth/login", json={"email": "a@example.com", "password": "pw"}).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, user_id).password.startswith("$2b$05$")
+    assert client.post("/auth/login", json={"email": "a@example.com", "password": "pw"}).status_code == 200
+    assert client.get("/internal/stats").get_json()["passwords"]["check"]["count"] == 2
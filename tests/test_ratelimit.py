@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from backend import ratelimit
+from backend.app import create_app
+from backend.db import db
+
+
+def _app(tmp_path, **config):
+    return create_app({
+        "TESTING": True,
+        "OUTBOX_WORKERS": 0,
+        "BCRYPT_ROUNDS": 4,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'expenses.db'}",
+        **config,
+    })
+
+
+def _signup(client, n):
+    body = client.post("/auth/signup", json={"name": f"U{n}", "email": f"u{n}@example.com", "password": "pw"},
+                       environ_base={"REMOTE_ADDR": f"10.0.0.{n}"}).get_json()
+    return {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def test_parse_rules():
+    assert ratelimit.parse_rules("login=ip:20/60; add_expense=user:5/1,ip:100/60;export_expenses=") == {
+        "login": [("ip", 20, 60.0)],
+        "add_expense": [("user", 5, 1.0), ("ip", 100, 60.0)],
+        "export_expenses": [],
+    }
+    with pytest.raises(ValueError):
+        ratelimit.parse_rules("login=email:1/60")
+
+
+def test_memory_bucket_refills():
+    store = ratelimit.MemoryBucketStore()
+    store.take("k", 2, 0.1)
+    store.take("k", 2, 0.1)
+    with pytest.raises(ratelimit.RateLimited) as e:
+        store.take("k", 2, 0.1)
+    assert e.value.retry_after >= 1
+    time.sleep(0.06)
+    store.take("k", 2, 0.1)
+
+
+def test_incomplete_store_fails_when_built():
+    class NoLen(ratelimit.BucketStore):
+        def take(self, key, capacity, period):
+            pass
+
+    with pytest.raises(TypeError, match="__len__"):
+        NoLen()
+
+
+def test_login_is_limited_per_ip_before_bcrypt(tmp_path):
+    app = _app(tmp_path, RATE_LIMITS="login=ip:2/60")
+    client = app.test_client()
+    _signup(client, 1)
+    login = {"email": "u1@example.com", "password": "wrong"}
+    assert [client.post("/auth/login", json=login).status_code for _ in range(3)] == [401, 401, 429]
+
+    hashed = app.extensions["passwords"].stats()
+    res = client.post("/auth/login", json=login)
+    assert res.status_code == 429 and int(res.headers["Retry-After"]) >= 1
+    assert app.extensions["passwords"].stats() == hashed
+    # Another address has its own bucket
+    assert client.post("/auth/login", json=login, environ_base={"REMOTE_ADDR": "10.9.9.9"}).status_code == 401
+    assert app.extensions["ratelimit"].stats()["limited"] == 2
+
+
+def test_expenses_are_limited_per_user(tmp_path):
+    app = _app(tmp_path, RATE_LIMITS="add_expense=user:3/60")
+    client = app.test_client()
+    alice, bob = _signup(client, 1), _signup(client, 2)
+    for headers in (alice, bob):
+        client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 1000}, headers=headers)
+    expense = {"category": "Food", "amount": 1, "date": "2025-03-02"}
+
+    # Same address, different users
+    statuses = [client.post("/users/expenses", json=expense, headers=alice).status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    assert client.post("/users/expenses", json=expense, headers=bob).status_code == 200
+    # Other routes are unaffected
+    assert client.get("/users/expenses", headers=alice).status_code == 200
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    config = {"RATE_LIMIT_STORE": "sqlite", "RATE_LIMITS": "signup_plain=ip:3/600"}
+    first, second = _app(tmp_path, **config), _app(tmp_path, **config)
+    body = {"name": "A", "email": "a@example.com", "password": "pw"}
+    statuses = [app.test_client().post("/auth/signup", json=body).status_code for app in (first, second) * 2]
+    assert statuses == [200, 400, 400, 429]
+    assert (tmp_path / "expenses-ratelimit.db").exists()
+    with first.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_load_shedding_answers_503_before_any_work(tmp_path):
+    app = _app(tmp_path, MAX_IN_FLIGHT=1)
+    client = app.test_client()
+    headers = _signup(client, 1)
+    limiter = app.extensions["ratelimit"]
+
+    assert limiter.enter()  # a request already being served
+    res = client.get("/users/expenses", headers=headers)
+    assert res.status_code == 503 and res.headers["Retry-After"] == "1"
+    assert client.get("/metrics").status_code == 200
+    limiter.leave()
+
+    assert client.get("/users/expenses", headers=headers).status_code == 200
+    assert limiter.stats()["shed"] == 1 and limiter.stats()["in_flight"] == 0
+
+
+def test_spoofed_forwarded_for_shares_the_proxy_hop_bucket(tmp_path):
+    app = _app(tmp_path, RATE_LIMITS="login=ip:2/60", RATE_LIMIT_FORWARDED_FOR=True)
+    client = app.test_client()
+    login = {"email": "u1@example.com", "password": "wrong"}
+
+    def attempt(forwarded_for):
+        return client.post("/auth/login", json=login, headers={"X-Forwarded-For": forwarded_for}).status_code
+
+    # The proxy appends the real client last; a made-up prefix does not buy a new bucket
+    assert [attempt(f"192.0.2.{n}, 203.0.113.7") for n in range(3)] == [401, 401, 429]
+    assert attempt("203.0.113.8") == 401
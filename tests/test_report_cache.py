@@ -0,0 +1,73 @@
+from backend.report_cache import ReportCache, report_cache
+
+
+def _setup(client, headers):
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    client.post("/users/expenses", json={"category": "Food", "amount": 10, "date": "2025-03-02"}, headers=headers)
+
+
+def test_unchanged_report_is_cached_and_not_modified(app, client, make_user):
+    _, headers = make_user()
+    _setup(client, headers)
+
+    first = client.get("/users/reports?month=2025-03", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.get_json()["total"] == 10
+    assert client.get("/users/reports?month=2025-03", headers=headers).get_json() == first.get_json()
+
+    res = client.get("/users/reports?month=2025-03", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+
+    stats = client.get("/internal/stats").get_json()["report_cache"]
+    assert (stats["misses"], stats["hits"], stats["not_modified"]) == (1, 1, 1)
+
+
+def test_writes_change_the_version(app, client, make_user):
+    _, headers = make_user()
+    _setup(client, headers)
+    etag = client.get("/users/reports?year=2025", headers=headers).headers["ETag"]
+
+    client.post("/users/expenses", json={"category": "Food", "amount": 5, "date": "2025-03-03"}, headers=headers)
+    res = client.get("/users/reports?year=2025", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    assert res.get_json()["total"][2] == 15
+
+    etag = res.headers["ETag"]
+    client.post("/users/budgets", json={"category": "Rent", "month": "2025-04", "amount": 500}, headers=headers)
+    res = client.get("/users/reports?year=2025", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+    assert "Rent" in res.get_json()["categories"]
+
+    etag = res.headers["ETag"]
+    csv = "date,category,amount\n2025-03-04,Food,1\n"
+    client.post("/users/expenses/import", data=csv, content_type="text/csv", headers=headers)
+    assert client.get("/users/reports?year=2025", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_versions_are_per_user(app, client, make_user):
+    _, alice = make_user("alice@example.com")
+    _, bob = make_user("bob@example.com")
+    _setup(client, alice)
+    etag = client.get("/users/reports?month=2025-03", headers=bob).headers["ETag"]
+    _setup(client, alice)
+    assert client.get("/users/reports?month=2025-03", headers={**bob, "If-None-Match": etag}).status_code == 304
+    assert report_cache.stats()["size"] == 1
+
+
+def test_lru_bound_and_stale_versions():
+    cache = ReportCache(maxsize=2)
+    builds = []
+
+    def builder(name):
+        return lambda: builds.append(name) or name
+
+    cache.get(1, "a", 0, builder("a0"))
+    cache.get(1, "b", 0, builder("b0"))
+    cache.get(1, "a", 0, builder("a0"))
+    cache.get(1, "c", 0, builder("c0"))  # evicts b
+    cache.get(1, "b", 0, builder("b0"))
+    cache.get(1, "c", 1, builder("c1"))  # newer version replaces c0
+    assert builds == ["a0", "b0", "c0", "b0", "c1"]
+    assert cache.stats()["evictions"] == 2
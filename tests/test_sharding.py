@@ -0,0 +1,194 @@
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from backend import alerts, sharding
+from backend.app import create_app
+from backend.db import db, ID_BLOCK, ShardingError, user_shard
+from backend.models import Expense, SplitShare, User
+
+SHARDS = 3
+
+
+def _app(tmp_path, shards, **config):
+    return create_app({
+        "TESTING": True,
+        "OUTBOX_WORKERS": 0,
+        "BCRYPT_ROUNDS": 4,
+        "SHARD_COUNT": shards,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'expenses.db'}",
+        **config,
+    })
+
+
+def _close(app):
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _signup(client, n):
+    body = client.post("/auth/signup", json={"name": f"U{n}", "email": f"u{n}@example.com",
+                                             "password": "pw"}).get_json()
+    return body["user_id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def _spend(client, headers, amount):
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    return client.post("/users/expenses", json={"category": "Food", "amount": amount, "date": "2025-03-02"},
+                       headers=headers)
+
+
+def _expense_owners(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(r[0] for r in conn.execute("SELECT user_id FROM expense"))
+
+
+def test_rows_live_on_the_owners_shard(tmp_path):
+    app = _app(tmp_path, SHARDS)
+    client = app.test_client()
+    users = [_signup(client, n) for n in range(1, 6)]
+    for user_id, headers in users:
+        assert _spend(client, headers, 95).status_code == 200
+        report = client.get("/users/reports?month=2025-03", headers=headers).get_json()
+        assert report["total"] == 95.0
+        items = client.get("/users/expenses", headers=headers).get_json()["items"]
+        assert [i["amount"] for i in items] == [95.0]
+    _close(app)
+
+    assert _expense_owners(tmp_path / "expenses.db") == []
+    for index in range(SHARDS):
+        owners = _expense_owners(tmp_path / f"expenses-shard{index}.db")
+        assert owners == sorted(u for u, _ in users if u % SHARDS == index)
+
+
+def test_jobs_must_pick_a_shard(tmp_path):
+    app = _app(tmp_path, SHARDS)
+    client = app.test_client()
+    user_id, headers = _signup(client, 1)
+    _spend(client, headers, 95)
+    with app.app_context():
+        with pytest.raises(ShardingError):
+            Expense.query.all()
+        with user_shard(user_id):
+            assert [e.amount for e in Expense.query.all()] == [95.0]
+            expense, user = Expense.__table__, User.__table__
+            with pytest.raises(ShardingError):
+                db.session.execute(select(expense.c.id, user.c.email).join(user, user.c.id == expense.c.user_id))
+        # Central tables need no shard
+        assert User.query.count() == 1
+
+        summary = alerts.sweep_month("2025-03", notify=False)
+    assert summary["budgets"] == 1 and summary[alerts.LOW_BUDGET] == 1
+    _close(app)
+
+
+def test_rebalance_splits_and_merges_a_database(tmp_path):
+    app = _app(tmp_path, 1)
+    client = app.test_client()
+    users = [_signup(client, n) for n in range(1, 8)]
+    for user_id, headers in users:
+        _spend(client, headers, user_id)
+    _close(app)
+
+    # Existing data in the main file: sharded boot refuses until it is moved
+    with pytest.raises(ShardingError):
+        _app(tmp_path, SHARDS)
+
+    app = _app(tmp_path, 1)
+    with app.app_context():
+        moved = sharding.rebalance(app, SHARDS, log=lambda *a: None)
+        assert moved > 0
+        assert sharding.layout(db.engine) == SHARDS
+    _close(app)
+
+    with pytest.raises(ShardingError):
+        _app(tmp_path, 2)
+
+    app = _app(tmp_path, SHARDS)
+    client = app.test_client()
+    for user_id, headers in users:
+        report = client.get("/users/reports?month=2025-03", headers=headers).get_json()
+        assert report["total"] == float(user_id)
+        # The rollup moved along with the rows, so the budget still binds
+        assert _spend(client, headers, 100).get_json()["status"] == "exceeded"
+    with app.app_context():
+        sharding.rebalance(app, 1, log=lambda *a: None)
+    _close(app)
+
+    assert _expense_owners(tmp_path / "expenses.db") == [u for u, _ in users]
+    app = _app(tmp_path, 1)
+    client = app.test_client()
+    for user_id, headers in users:
+        assert client.get("/users/reports?month=2025-03", headers=headers).get_json()["total"] == float(user_id)
+    _close(app)
+
+
+def _split(client, headers, amount, email):
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 100}, headers=headers)
+    res = client.post("/users/expenses", json={"category": "Food", "amount": amount, "date": "2025-03-02",
+                                               "split_emails": [email]}, headers=headers)
+    assert res.status_code == 200
+
+
+def _check_shares(app):
+    """Every split share still names its payer's expense; returns the share count"""
+    with app.app_context():
+        shares = db.session.query(SplitShare.payer_id, SplitShare.expense_id, SplitShare.amount).all()
+        for payer_id, expense_id, amount in shares:
+            with user_shard(payer_id):
+                expense = db.session.execute(select(Expense.user_id, Expense.amount)
+                                             .where(Expense.id == expense_id)).one()
+                assert (expense.user_id, expense.amount / 2) == (payer_id, amount)
+        db.session.commit()
+    _close(app)
+    return len(shares)
+
+
+def test_rebalance_keeps_split_shares_pointing_at_their_expenses(tmp_path):
+    app = _app(tmp_path, 1)
+    client = app.test_client()
+    users = [_signup(client, n) for n in range(1, 6)]
+
+    def split_all(client, amount):
+        for n, (user_id, headers) in enumerate(users, start=1):
+            _split(client, headers, amount + user_id, f"u{n % len(users) + 1}@example.com")
+
+    split_all(client, 0)
+    _close(app)
+
+    # Split into shards, let each one allocate ids of its own, then merge them
+    previous = 1
+    for rounds, shards in enumerate((SHARDS, 2, 1), start=2):
+        app = _app(tmp_path, previous)
+        with app.app_context():
+            sharding.rebalance(app, shards, log=lambda *a: None)
+        _close(app)
+        app = _app(tmp_path, shards)
+        split_all(app.test_client(), rounds)
+        assert _check_shares(app) == len(users) * rounds
+        previous = shards
+
+
+def test_row_ids_are_reserved_in_the_block(tmp_path):
+    app = _app(tmp_path, SHARDS)
+    client = app.test_client()
+    user_id, headers = _signup(client, 1)
+    _spend(client, headers, 1)
+    # Another worker reserving a range meanwhile only moves the counter on
+    shard_file = tmp_path / f"expenses-shard{user_id % SHARDS}.db"
+    with sqlite3.connect(shard_file) as conn:
+        conn.execute("UPDATE id_block SET high = high + 10 WHERE name = 'expense'")
+    with app.app_context(), user_shard(user_id):
+        db.session.add_all([Expense(user_id=user_id, category="Food", amount=1, date=date(2025, 3, 3))
+                            for _ in range(3)])
+        db.session.commit()
+        ids = [e.id for e in Expense.query.order_by(Expense.id)]
+    with sqlite3.connect(shard_file) as conn:
+        high = conn.execute("SELECT high FROM id_block WHERE name = 'expense'").fetchone()[0]
+    low = (user_id % SHARDS + 1) * ID_BLOCK
+    assert ids == [low + 1, low + 12, low + 13, low + 14] and high == low + 14
+    _close(app)
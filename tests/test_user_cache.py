@@ -0,0 +1,46 @@
+from backend.db import db
+from backend.models import User
+from backend.user_cache import AuthUser, UserCache, user_cache
+
+
+def test_lru_eviction_and_ttl():
+    cache = UserCache(ttl=60, maxsize=2)
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return AuthUser(user_id, "n", f"{user_id}@example.com")
+
+    for user_id in (1, 2, 1, 3, 1, 2):
+        cache.get(user_id, loader)
+    # 2 was least recently used when 3 arrived, so it had to be reloaded
+    assert loads == [1, 2, 3, 2]
+    assert cache.stats()["evictions"] == 2
+
+    expiring = UserCache(ttl=0, maxsize=2)
+    expiring.get(5, loader)
+    expiring.get(5, loader)
+    assert loads[-2:] == [5, 5]
+
+
+def test_token_required_uses_cache_and_invalidates(app, client, make_user):
+    user_id, headers = make_user()
+    for _ in range(3):
+        assert client.get("/users/budgets", headers=headers).status_code == 200
+    stats = user_cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 2)
+
+    with app.app_context():
+        db.session.get(User, user_id).name = "Renamed"
+        db.session.commit()
+    client.get("/users/budgets", headers=headers)
+    assert user_cache.stats()["misses"] == 2
+    assert client.get("/internal/stats").get_json()["user_cache"]["hits"] == 2
+
+
+def test_claims_in_token_skip_lookup(app, client):
+    app.config["AUTH_CLAIMS_IN_TOKEN"] = True
+    res = client.post("/auth/signup", json={"name": "C", "email": "c@example.com", "password": "pw"})
+    token = res.get_json()["access_token"]
+    client.get("/users/budgets", headers={"Authorization": f"Bearer {token}"})
+    assert user_cache.stats()["misses"] == 0
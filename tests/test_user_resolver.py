@@ -0,0 +1,66 @@
+from backend.db import db
+from backend.models import EmailOutbox, User
+from backend.user_resolver import IN_CHUNK_SIZE, user_resolver
+
+
+def _add_users(app, count):
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {"name": f"Member {i}", "email": f"Member{i}@Example.com", "password": "x"} for i in range(count)
+        ])
+        db.session.commit()
+
+
+def test_verify_emails_resolves_in_chunks(app, client, make_user):
+    _, headers = make_user()
+    _add_users(app, 1500)
+    emails = [f"  member{i}@example.COM " for i in range(1500)] + [f"ghost{i}@example.com" for i in range(500)]
+    emails += ["not-an-email", 42]
+
+    res = client.post("/users/verify_emails", json={"emails": emails}, headers=headers)
+    body = res.get_json()
+    assert len(body["verified"]) == 1500
+    assert body["verified"][0]["email"] == "  member0@example.COM "
+    assert len(body["invalid"]) == 502
+    # 2000 distinct addresses, queried IN_CHUNK_SIZE at a time
+    assert user_resolver.stats()["queries"] == -(-2000 // IN_CHUNK_SIZE)
+
+    # Repeats (hits and misses alike) are served from the cache
+    client.post("/users/verify_emails", json={"emails": emails}, headers=headers)
+    stats = user_resolver.stats()
+    assert stats["queries"] == 3
+    assert stats["hits"] == 2000
+
+
+def test_lookup_uses_lower_email_index(app):
+    with app.app_context():
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM user WHERE lower(email) IN ('a@example.com', 'b@example.com')"
+        )).fetchall()
+    assert any("ix_user_email_lower" in row[-1] for row in plan)
+
+
+def test_new_user_clears_negative_entry(app, client, make_user):
+    _, headers = make_user()
+    payload = {"emails": ["late@example.com"]}
+    assert client.post("/users/verify_emails", json=payload, headers=headers).get_json()["invalid"] == ["late@example.com"]
+    make_user(email="late@example.com", name="Late")
+    verified = client.post("/users/verify_emails", json=payload, headers=headers).get_json()["verified"]
+    assert [v["email"] for v in verified] == ["late@example.com"]
+
+
+def test_split_notices_are_deduplicated_and_personalized(app, client, make_user):
+    _, headers = make_user()
+    make_user(email="friend@example.com", name="Friend")
+    client.post("/users/budgets", json={"category": "Food", "month": "2025-03", "amount": 1000}, headers=headers)
+    res = client.post("/users/expenses", json={
+        "category": "Food", "amount": 30, "date": "2025-03-02",
+        "split_emails": ["Friend@example.com", "friend@example.com ", "stranger@example.com", ""],
+    }, headers=headers)
+    assert res.status_code == 200
+
+    with app.app_context():
+        rows = {r.recipient: r.html for r in EmailOutbox.query.all()}
+    assert set(rows) == {"friend@example.com", "stranger@example.com"}
+    assert "Hi Friend," in rows["friend@example.com"]
+    assert "You owe: <strong>10.0</strong>" in rows["stranger@example.com"]